@@ -0,0 +1,40 @@
+"""
+Benchmarks for near-duplicate detection: MinHash signatures of extracted text and lookups in
+an index that already holds tens of thousands of papers
+"""
+import random
+
+import pytest
+
+from dedup import NUM_PERM, NearDuplicateIndex, minhash_signature
+from pdf_handler import read_pdf_content
+from benchmarks.conftest import PDF_PAGES
+
+INDEXED_PAPERS = 20000
+
+
+@pytest.fixture(scope='module')
+def large_index(tmp_path_factory):
+    """已收录 INDEXED_PAPERS 篇论文 (随机签名) 的索引"""
+    index = NearDuplicateIndex(str(tmp_path_factory.mktemp('dedup') / 'index.sqlite3'))
+    rng = random.Random(0)
+    for number in range(INDEXED_PAPERS):
+        index.match_and_add(f"doc{number}", [rng.getrandbits(64) for _ in range(NUM_PERM)], f"paper_{number}.pdf")
+    yield index
+    index.close()
+
+
+@pytest.mark.parametrize('pages', PDF_PAGES)
+def bench_minhash_signature(benchmark, synthetic_pdfs, pages):
+    content = read_pdf_content(synthetic_pdfs[pages])
+    signature = benchmark(minhash_signature, content)
+    assert len(signature) == NUM_PERM
+
+
+def bench_query_large_index(benchmark, synthetic_pdfs, large_index):
+    signature = minhash_signature(read_pdf_content(synthetic_pdfs[50]))
+    large_index.match_and_add('paper_50', signature, 'paper_50.pdf')
+    # 另一份页数稍多的版本，与已收录的版本近似重复
+    near_duplicate = minhash_signature(read_pdf_content(synthetic_pdfs[50]) + "\nPage 51 appendix")
+    matches = benchmark(large_index.query, near_duplicate, 'other')
+    assert [match['doc_hash'] for match in matches] == ['paper_50']
@@ -0,0 +1,27 @@
+"""
+Benchmarks for saving generated images of different sizes and for image cache hits
+"""
+import pytest
+
+from image_generator import ImageCache, generate_and_save_image, save_image
+from benchmarks.fixtures import make_image_bytes
+
+
+@pytest.mark.parametrize('width,height', [(512, 288), (1440, 768), (2752, 1536)])
+def bench_save_image(benchmark, tmp_path, width, height):
+    image_data = make_image_bytes(width, height)
+    path = benchmark(save_image, image_data, 'poster', str(tmp_path))
+    assert path.endswith('poster.png')
+
+
+def bench_image_cache_hit(benchmark, tmp_path):
+    cache = ImageCache(str(tmp_path / 'cache'))
+    source = save_image(make_image_bytes(1440, 768), 'source', str(tmp_path))
+    cache.put('nano-banana', 'poster prompt', source)
+
+    # 命中缓存时不会用到 client
+    path = benchmark(
+        generate_and_save_image, 'poster prompt', 'poster', model_name='nano-banana',
+        output_dir=str(tmp_path / 'out'), client=object(), cache=cache
+    )
+    assert path.endswith('poster.png')
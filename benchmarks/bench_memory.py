@@ -0,0 +1,68 @@
+"""
+Memory benchmarks for the stages that hold whole documents or images in memory
+
+Peak and retained allocations are saved with the results (extra_info), and each benchmark
+fails when a stage needs more than a fixed multiple of its input size.
+"""
+import os
+
+import pytest
+
+from memprofile import MemoryProfiler, use_profiler
+from pdf_handler import read_pdf_content, encode_pdf_to_base64
+from image_generator import extract_image_from_response, save_image
+from benchmarks.conftest import PDF_PAGES
+from benchmarks.fixtures import make_image_bytes, make_image_response
+
+MB = 1024 * 1024
+
+
+def measure(benchmark, func, *args):
+    """
+    Run a memory_stage-decorated function under a MemoryProfiler and record its largest peak
+
+    Returns:
+        tuple: (result of the last call, the stage record with the largest traced peak)
+    """
+    func(*args)  # 预热：第一次调用包含模块导入的分配
+    profiler = MemoryProfiler("bench")
+
+    def run():
+        with use_profiler(profiler):
+            return func(*args)
+
+    result = benchmark.pedantic(run, rounds=3, iterations=1)
+    record = max(profiler.records, key=lambda r: r['traced_peak'])
+    benchmark.extra_info['traced_peak'] = record['traced_peak']
+    benchmark.extra_info['retained'] = record['retained']
+    if record['rss_before'] is not None and record['rss_peak'] is not None:
+        benchmark.extra_info['rss_growth'] = record['rss_peak'] - record['rss_before']
+    return result, record
+
+
+@pytest.mark.parametrize('pages', PDF_PAGES)
+def bench_read_pdf_content_memory(benchmark, synthetic_pdfs, pages):
+    content, record = measure(benchmark, read_pdf_content, synthetic_pdfs[pages])
+    assert record['traced_peak'] < 5 * len(content) + MB
+
+
+@pytest.mark.parametrize('pages', PDF_PAGES)
+def bench_encode_pdf_to_base64_memory(benchmark, synthetic_pdfs, pages):
+    _, record = measure(benchmark, encode_pdf_to_base64, synthetic_pdfs[pages])
+    # 文件内容、base64 字节和解码后的字符串同时存在
+    assert record['traced_peak'] < 4 * os.path.getsize(synthetic_pdfs[pages]) + MB
+
+
+@pytest.mark.parametrize('width,height', [(512, 288), (2752, 1536)])
+def bench_extract_image_memory(benchmark, width, height):
+    response = make_image_response(width, height, filler=1_000_000)
+    _, record = measure(benchmark, extract_image_from_response, response)
+    assert record['traced_peak'] < 4 * len(response) + MB
+
+
+@pytest.mark.parametrize('width,height', [(512, 288), (2752, 1536)])
+def bench_save_image_memory(benchmark, tmp_path, width, height):
+    image_data = make_image_bytes(width, height)
+    _, record = measure(benchmark, save_image, image_data, 'poster', str(tmp_path))
+    # PIL 的像素缓冲区在 C 中分配，tracemalloc 统计不到，只记录在 rss_growth 中
+    assert record['traced_peak'] < 2 * len(image_data) + MB
@@ -0,0 +1,36 @@
+"""
+Benchmarks for parsing large LLM and image model responses
+"""
+import pytest
+
+from code_parser import extract_code_blocks, extract_last_code_block
+from image_generator import extract_image_from_response
+from benchmarks.fixtures import make_llm_response, make_image_response
+from fake_api import DEFAULT_IMAGE_PROMPT
+
+RESPONSE_SIZES = (10_000, 100_000, 1_000_000)
+
+
+@pytest.mark.parametrize('size', RESPONSE_SIZES)
+def bench_extract_code_blocks(benchmark, size):
+    response = make_llm_response(size, code_blocks=5)
+    blocks = benchmark(extract_code_blocks, response)
+    assert len(blocks) == 5
+
+
+@pytest.mark.parametrize('size', RESPONSE_SIZES)
+def bench_extract_last_code_block(benchmark, size):
+    response = make_llm_response(size)
+    assert benchmark(extract_last_code_block, response) == DEFAULT_IMAGE_PROMPT
+
+
+@pytest.mark.parametrize('width,height', [(512, 288), (1024, 576), (2048, 1152)])
+def bench_extract_image_base64(benchmark, width, height):
+    response = make_image_response(width, height)
+    assert benchmark(extract_image_from_response, response).startswith(b'\x89PNG')
+
+
+def bench_extract_image_no_image(benchmark):
+    # 最坏情况：大段文本中没有任何图像，所有正则都要扫描全文
+    response = make_llm_response(1_000_000)
+    assert benchmark(extract_image_from_response, response) is None
@@ -0,0 +1,25 @@
+"""
+Benchmarks for pdf_handler on synthetic PDFs of 5, 50 and 500 pages
+"""
+import pytest
+
+from pdf_handler import read_pdf_content, get_pdf_info, encode_pdf_to_base64
+from benchmarks.conftest import PDF_PAGES
+
+
+@pytest.mark.parametrize('pages', PDF_PAGES)
+def bench_read_pdf_content(benchmark, synthetic_pdfs, pages):
+    content = benchmark(read_pdf_content, synthetic_pdfs[pages])
+    assert f"Page {pages}" in content
+
+
+@pytest.mark.parametrize('pages', PDF_PAGES)
+def bench_get_pdf_info(benchmark, synthetic_pdfs, pages):
+    info = benchmark(get_pdf_info, synthetic_pdfs[pages])
+    assert info['pages'] == pages
+
+
+@pytest.mark.parametrize('pages', PDF_PAGES)
+def bench_encode_pdf_to_base64(benchmark, synthetic_pdfs, pages):
+    encoded = benchmark(encode_pdf_to_base64, synthetic_pdfs[pages])
+    assert encoded.startswith('JVBERi0')
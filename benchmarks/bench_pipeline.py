@@ -0,0 +1,25 @@
+"""
+End-to-end benchmark of one paper (the same stages as the GUI job) against the local fake endpoint
+"""
+import pytest
+
+from llm_client import LLMClient
+from pipeline import extract_pdf, generate_from_content
+from config import PROMPT_TEMPLATES
+
+
+@pytest.mark.parametrize('pages', (5, 50))
+def bench_end_to_end(benchmark, synthetic_pdfs, fake_api, tmp_path, pages):
+    prompt = next(iter(PROMPT_TEMPLATES.values()))
+
+    def run():
+        client = LLMClient(api_key='benchmark', base_url=fake_api.base_url)
+        pdf_content = extract_pdf(synthetic_pdfs[pages])
+        return generate_from_content(
+            client, pdf_content, prompt,
+            model_name='fake-analysis', nanobanana_model='nano-banana',
+            filename='poster', output_dir=str(tmp_path)
+        )
+
+    result = benchmark(run)
+    assert result['image_path'].endswith('poster.png')
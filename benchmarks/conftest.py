@@ -0,0 +1,40 @@
+"""
+Shared fixtures for the benchmark suite
+"""
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 基准测试测量真实的图像请求，不使用也不写入用户的图像缓存
+os.environ['IMAGE_CACHE_MAX_MB'] = '0'
+
+from benchmarks.fixtures import make_pdf
+from fake_api import FakeAPIServer
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'pytest')
+PDF_PAGES = (5, 50, 500)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # 不论从哪个目录运行，结果都保存在 benchmarks/results/pytest
+    if config.getoption('benchmark_storage', None) == 'file://./.benchmarks':
+        config.option.benchmark_storage = 'file://' + RESULTS_DIR
+
+
+@pytest.fixture(scope='session')
+def synthetic_pdfs(tmp_path_factory):
+    """5、50、500 页的合成 PDF，按页数索引"""
+    directory = tmp_path_factory.mktemp('pdfs')
+    return {pages: make_pdf(str(directory / f'paper_{pages}.pdf'), pages) for pages in PDF_PAGES}
+
+
+@pytest.fixture(scope='session')
+def fake_api():
+    """本地模拟接口，不产生网络延迟"""
+    with FakeAPIServer() as server:
+        yield server
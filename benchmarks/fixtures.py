@@ -0,0 +1,123 @@
+"""
+Synthetic inputs for the benchmarks and the load tester
+"""
+import base64
+import random
+
+from fake_api import DEFAULT_IMAGE_PROMPT, make_png
+
+WORDS = (
+    "model data training results method baseline dataset accuracy network learning "
+    "experiment analysis performance sample proposed approach significant evaluation "
+    "feature representation inference benchmark protein cell clinical patients cohort"
+).split()
+
+
+def make_pdf(path, pages, lines_per_page=40, seed=0):
+    """
+    Write a text-only PDF with the given number of pages
+
+    Args:
+        path (str): Destination file
+        pages (int): Number of pages
+        lines_per_page (int): Text lines per page (~80 characters each)
+        seed (int): Seed for the random filler text
+
+    Returns:
+        str: The path written
+    """
+    rng = random.Random(seed)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{4 + 2 * i} 0 R" for i in range(pages)), pages),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page in range(pages):
+        lines = [f"Page {page + 1}"]
+        lines += [" ".join(rng.choice(WORDS) for _ in range(11)) for _ in range(lines_per_page)]
+        text = " T* ".join(f"({line}) Tj" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 50 760 Td {text} ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * page} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    for offset in offsets:
+        data += f"{offset:010d} 00000 n \n".encode('latin-1')
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1')
+
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def make_llm_response(size, code_blocks=3, seed=0):
+    """
+    Build an LLM-style Markdown response of roughly the given size
+
+    Args:
+        size (int): Approximate length in characters
+        code_blocks (int): Number of fenced code blocks spread through the text
+        seed (int): Seed for the random filler text
+
+    Returns:
+        str: Response text whose last code block is DEFAULT_IMAGE_PROMPT
+    """
+    rng = random.Random(seed)
+    filler_size = max(0, size // max(1, code_blocks) - len(DEFAULT_IMAGE_PROMPT))
+    parts = []
+    for index in range(code_blocks):
+        words = []
+        length = 0
+        while length < filler_size:
+            word = rng.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        parts.append("- " + " ".join(words))
+        block = DEFAULT_IMAGE_PROMPT if index == code_blocks - 1 else f"draft prompt {index}"
+        parts.append(f"```\n{block}\n```")
+    return "\n\n".join(parts)
+
+
+def make_image_response(width, height, filler=0):
+    """
+    Build an image model response with an inline base64 PNG
+
+    Args:
+        width (int): Image width
+        height (int): Image height
+        filler (int): Characters of text placed before the image
+
+    Returns:
+        str: Markdown response containing a data URI
+    """
+    encoded = base64.b64encode(make_png(width, height)).decode('ascii')
+    return f"{'x' * filler}\n![poster](data:image/png;base64,{encoded})"
+
+
+def make_image_bytes(width, height):
+    """
+    Build PNG bytes with noisy content so the encoder does real work
+
+    Args:
+        width (int): Image width
+        height (int): Image height
+
+    Returns:
+        bytes: PNG file content
+    """
+    from io import BytesIO
+    from PIL import Image
+
+    image = Image.effect_noise((width, height), 64).convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准测试
+用 `python -X importtime` 测量导入入口模块的耗时，并把结果追加到
+benchmarks/results/importtime.jsonl，便于比较不同版本的冷启动速度:
+
+    python benchmarks/importtime.py
+    python benchmarks/importtime.py --module cli --runs 10
+    python benchmarks/importtime.py --python dist/PDF2Image.app/Contents/MacOS/python
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(REPO_DIR, 'benchmarks', 'results', 'importtime.jsonl')
+
+# 这些模块应在首次使用时才导入，启动时出现即视为回退
+LAZY_MODULES = ('openai', 'PyPDF2', 'PIL', 'requests')
+
+
+def run_importtime(python, module):
+    """
+    Import a module in a fresh interpreter with -X importtime
+
+    Args:
+        python (str): Interpreter to run
+        module (str): Module to import
+
+    Returns:
+        tuple: (total import time in ms, wall time in ms, {module: (self_us, cumulative_us)})
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    modules = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+        # 只累加顶层导入，嵌套导入已包含在其 cumulative 中
+        if not name.startswith('  '):
+            total_us += int(cumulative_us)
+    return total_us / 1000, wall_ms, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量入口模块的导入耗时")
+    parser.add_argument('--module', default='main', help="要导入的模块 (默认: main)")
+    parser.add_argument('--runs', type=int, default=5, help="重复次数，取中位数 (默认: 5)")
+    parser.add_argument('--python', default=sys.executable, help="使用的解释器，例如 py2app 包内的 python")
+    parser.add_argument('--top', type=int, default=10, help="显示自身耗时最多的模块数")
+    parser.add_argument('--no-save', action='store_true', help="不把结果写入 results/importtime.jsonl")
+    args = parser.parse_args(argv)
+
+    runs = [run_importtime(args.python, args.module) for _ in range(args.runs)]
+    import_ms = statistics.median(run[0] for run in runs)
+    wall_ms = statistics.median(run[1] for run in runs)
+    modules = runs[-1][2]
+    eager = [name for name in LAZY_MODULES if name in modules]
+
+    print(f"import {args.module}: {import_ms:.1f} ms (进程总耗时 {wall_ms:.1f} ms, {args.runs} 次中位数)")
+    print(f"自身耗时最多的 {args.top} 个模块:")
+    for name, (self_us, cumulative_us) in sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  (累计 {cumulative_us / 1000:8.1f} ms)  {name}")
+
+    previous = None
+    if os.path.exists(RESULTS_PATH):
+        with open(RESULTS_PATH, 'r', encoding='utf-8') as f:
+            history = [json.loads(line) for line in f if line.strip()]
+        matching = [record for record in history if record['module'] == args.module]
+        previous = matching[-1] if matching else None
+    if previous:
+        delta = import_ms - previous['import_ms']
+        print(f"与上次记录 ({previous['commit'] or '未知版本'}) 相比: {delta:+.1f} ms")
+
+    if not args.no_save:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True
+        ).stdout.strip()
+        record = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': commit or None,
+            'python': args.python,
+            'module': args.module,
+            'import_ms': round(import_ms, 1),
+            'wall_ms': round(wall_ms, 1),
+            'eager_modules': eager
+        }
+        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+        with open(RESULTS_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    if eager:
+        print(f"✗ 启动时导入了应延迟加载的模块: {', '.join(eager)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Headless command line interface for PDF to Image Generator
+不依赖 Qt，可用于批量处理整个目录中的 PDF，例如:
+
+    python -m cli batch ./papers --jobs 8
+    python -m cli batch ./papers --estimate
+    python -m cli serve --port 8080 --workers 8
+    python -m cli enqueue ./papers && python -m cli worker --concurrency 4
+    python -m cli watch /shared/papers --jobs 2
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from collections import Counter
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import API_KEY, BASE_URL, MODEL_NAME, NANO_BANANA_MODEL, PROMPT_TEMPLATES, DEDUP_THRESHOLD
+from dedup import NearDuplicateIndex
+from job_store import JobStore
+from log_setup import setup_logging, shutdown_logging
+from memprofile import MemoryProfiler, use_profiler
+from model_router import is_auto
+from pipeline import estimate_batch, find_pdfs, run_batch, run_worker
+from token_estimator import format_estimate, summarize_estimates
+from tracing import Tracer, use_tracer
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers
+
+    Args:
+        values (list): Samples
+        pct (float): Percentile between 0 and 100
+
+    Returns:
+        float: The percentile value, or 0.0 for an empty list
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def format_stats(values):
+    """把一组耗时格式化为 p50/p95/max 摘要"""
+    if not values:
+        return "n/a"
+    return (f"p50 {percentile(values, 50):.2f}s  p95 {percentile(values, 95):.2f}s  "
+            f"max {max(values):.2f}s")
+
+
+def print_batch_summary(records, elapsed):
+    """打印批处理的吞吐量与延迟摘要"""
+    succeeded = [r for r in records if 'error' not in r]
+    failed = [r for r in records if 'error' in r]
+    throughput = len(succeeded) / elapsed * 60 if elapsed > 0 else 0.0
+
+    print("=" * 50)
+    print(f"处理完成: {len(succeeded)} 成功, {len(failed)} 失败, 共 {len(records)} 个PDF")
+    print(f"总耗时: {elapsed:.1f}s, 吞吐量: {throughput:.2f} 篇/分钟")
+    print(f"PDF提取:  {format_stats([r['extract_s'] for r in records if 'extract_s' in r])}")
+    print(f"LLM+图像: {format_stats([r['network_s'] for r in records if 'network_s' in r])}")
+    print(f"端到端:   {format_stats([r['latency_s'] for r in succeeded])}")
+    estimates = [r['estimate'] for r in records if 'estimate' in r]
+    if estimates:
+        print(f"已发送:   {format_estimate(summarize_estimates(estimates), latency=False)}")
+    usages = [r['usage'] for r in records if r.get('usage')]
+    if usages:
+        prompt_tokens = sum(usage.get('prompt_tokens') or 0 for usage in usages)
+        cached_tokens = sum(usage.get('cached_tokens') or 0 for usage in usages)
+        share = cached_tokens / prompt_tokens if prompt_tokens else 0.0
+        print(f"提示词缓存: 命中 {cached_tokens:,} / {prompt_tokens:,} 输入 tokens ({share:.0%})")
+    models = Counter(r['model'] for r in records if r.get('model') and not r.get('resumed'))
+    if len(models) > 1:
+        print(f"分析模型: {', '.join(f'{model} {count} 篇' for model, count in models.most_common())}")
+    duplicates = [r for r in records if 'duplicate_of' in r]
+    if duplicates:
+        reused = sum(1 for r in duplicates if r.get('reused_llm'))
+        print(f"近似重复: {len(duplicates)} 篇，其中 {reused} 篇复用了之前的大语言模型响应")
+    for record in failed:
+        print(f"✗ {record['pdf']}: {record['error']}")
+
+
+def print_estimates(records, show_model=False):
+    """打印每个 PDF 的预估 tokens、费用和耗时，以及合计；自动选择模型时显示选中的模型"""
+    for record in records:
+        if 'error' in record:
+            print(f"✗ {record['pdf']}: {record['error']}")
+            continue
+        marker = "⚠" if record['estimate']['over_limit'] else "•"
+        model = f" [{record['model']}]" if show_model else ""
+        print(f"{marker} {record['pdf']}{model}: {format_estimate(record['estimate'])}")
+    estimates = [r['estimate'] for r in records if 'estimate' in r]
+    summary = summarize_estimates(estimates)
+    print("=" * 50)
+    print(f"合计 {summary['count']} 个PDF: {format_estimate(summary)}")
+    if summary['latency_s'] is not None:
+        print("  (预计耗时为串行总和，并发处理时会更短)")
+    if summary['over_limit']:
+        print(f"⚠ {summary['over_limit']} 个PDF可能超出模型上下文长度，建议先删减内容或换用上下文更长的模型")
+
+
+def resolve_prompt(args):
+    """根据命令行参数确定提示词和模板名称"""
+    if args.prompt_file:
+        with open(args.prompt_file, 'r', encoding='utf-8') as f:
+            return f.read(), os.path.splitext(os.path.basename(args.prompt_file))[0]
+    if args.template not in PROMPT_TEMPLATES:
+        raise SystemExit(f"未知的提示词模板: {args.template}，可选: {', '.join(PROMPT_TEMPLATES)}")
+    return PROMPT_TEMPLATES[args.template], args.template
+
+
+def cmd_batch(args):
+    """batch 子命令：处理目录中的所有 PDF"""
+    pdf_paths = find_pdfs(args.directory, recursive=args.recursive)
+    if not pdf_paths:
+        print(f"✗ 目录中没有找到PDF文件: {args.directory}")
+        return 1
+    if args.estimate:
+        prompt, template_name = resolve_prompt(args)
+        print(f"预估 {len(pdf_paths)} 个PDF (模型: {args.model}, 模板: {template_name})，不会调用接口")
+        records = estimate_batch(
+            pdf_paths,
+            prompt,
+            model_name=args.model,
+            nanobanana_model=args.image_model,
+            extract_jobs=args.extract_jobs,
+            store=None if args.no_resume else JobStore(args.store)
+        )
+        print_estimates(records, show_model=is_auto(args.model))
+        return 0 if all('error' not in r for r in records) else 1
+    if not args.api_key:
+        print("✗ 错误: 请设置 POE_API_KEY 环境变量或使用 --api-key")
+        return 1
+
+    prompt, template_name = resolve_prompt(args)
+    store = None if args.no_resume else JobStore(args.store)
+    dedup_index = None
+    if args.dedup or args.reuse_duplicates:
+        dedup_index = NearDuplicateIndex(args.dedup_index, threshold=args.dedup_threshold)
+        if args.reuse_duplicates and store is None:
+            print("⚠ --no-resume 时没有保存的响应可复用，只标记近似重复的论文")
+    print(f"开始批量处理 {len(pdf_paths)} 个PDF (并发: {args.jobs}, 模板: {template_name})")
+
+    tracer = Tracer("batch") if args.trace else None
+    profiler = MemoryProfiler("batch") if args.memprofile else None
+    if profiler is not None and args.jobs > 1:
+        print("⚠ 内存分析时并发的论文会互相计入对方的内存占用，建议使用 --jobs 1")
+    start = time.perf_counter()
+    with use_tracer(tracer), use_profiler(profiler):
+        records = run_batch(
+            pdf_paths,
+            prompt,
+            template_name=template_name,
+            api_key=args.api_key,
+            base_url=args.base_url,
+            model_name=args.model,
+            nanobanana_model=args.image_model,
+            jobs=args.jobs,
+            extract_jobs=args.extract_jobs,
+            log=print,
+            store=store,
+            regenerate=args.regenerate,
+            dedup_index=dedup_index,
+            reuse_duplicates=args.reuse_duplicates
+        )
+    print_batch_summary(records, time.perf_counter() - start)
+    if tracer is not None:
+        print("耗时统计:")
+        for line in tracer.format_summary():
+            print(f"  {line}")
+        print(f"Trace 文件 (chrome://tracing): {tracer.export_chrome_trace(args.trace)}")
+    if profiler is not None:
+        print("内存统计:")
+        for line in profiler.format_summary():
+            print(f"  {line}")
+        print(f"内存报告: {profiler.write_report(args.memprofile)}")
+    return 0 if all('error' not in r for r in records) else 1
+
+
+def cmd_serve(args):
+    """serve 子命令：以 HTTP 服务的方式运行流程，供团队共用"""
+    from aiohttp import web
+    from server import JobManager, create_app
+
+    fake_server = None
+    if args.fake:
+        from fake_api import FakeAPIServer
+        fake_server = FakeAPIServer(latency=args.fake_latency, image_models=(args.image_model,)).start()
+        args.base_url = fake_server.base_url
+        args.api_key = args.api_key or 'fake'
+        # 模拟接口不需要真实密钥，请求不带密钥时使用 'fake'
+        args.share_key = True
+        print(f"使用本地模拟接口: {args.base_url}")
+
+    manager = JobManager(
+        api_key=args.api_key,
+        base_url=args.base_url,
+        model_name=args.model,
+        nanobanana_model=args.image_model,
+        store=None if args.no_resume else JobStore(args.store),
+        workers=args.workers,
+        per_key=args.per_key,
+        max_queue=args.max_queue,
+        share_key=args.share_key
+    )
+    print(f"服务地址: http://{args.host}:{args.port} (并发: {args.workers}, 每个密钥: {args.per_key}, "
+          f"最大排队: {args.max_queue})")
+    try:
+        web.run_app(create_app(manager), host=args.host, port=args.port, print=None)
+    finally:
+        if fake_server is not None:
+            fake_server.stop()
+    return 0
+
+
+def cmd_enqueue(args):
+    """enqueue 子命令：把 PDF 加入共享任务队列，由 worker 处理"""
+    from work_queue import open_queue
+
+    pdf_paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            pdf_paths.extend(find_pdfs(path, recursive=args.recursive))
+        else:
+            pdf_paths.append(path)
+    if not pdf_paths:
+        print("✗ 没有找到PDF文件")
+        return 1
+
+    prompt, template_name = resolve_prompt(args)
+    queue = open_queue(args.queue)
+    for path in pdf_paths:
+        # worker 可能运行在其他机器上，路径需位于共享存储中
+        queue.put({
+            'pdf': os.path.abspath(path),
+            'prompt': prompt,
+            'template': template_name,
+            'model': args.model,
+            'image_model': args.image_model
+        })
+    print(f"已加入队列 {len(pdf_paths)} 个PDF (模板: {template_name})")
+    print_queue_stats(queue.stats())
+    return 0
+
+
+def cmd_worker(args):
+    """worker 子命令：从共享任务队列领取并处理任务"""
+    from work_queue import open_queue
+
+    if not args.api_key:
+        print("✗ 错误: 请设置 POE_API_KEY 环境变量或使用 --api-key")
+        return 1
+    queue = open_queue(args.queue)
+    print(f"worker 已启动 (并发: {args.concurrency}, 租约: {args.lease}s)")
+    start = time.perf_counter()
+    try:
+        records = run_worker(
+            queue,
+            api_key=args.api_key,
+            base_url=args.base_url,
+            worker_id=args.worker_id,
+            concurrency=args.concurrency,
+            lease_s=args.lease,
+            exit_when_empty=args.exit_when_empty,
+            output_dir=args.output,
+            log=print,
+            store=None if args.no_resume else JobStore(args.store)
+        )
+    except KeyboardInterrupt:
+        print("worker 已停止，未完成的任务将在租约到期后交给其他 worker")
+        return 130
+    elapsed = time.perf_counter() - start
+    succeeded = [r for r in records if 'error' not in r]
+    print(f"本 worker 完成 {len(succeeded)}/{len(records)} 个任务，用时 {elapsed:.1f}s")
+    return 0 if len(succeeded) == len(records) else 1
+
+
+def cmd_watch(args):
+    """watch 子命令：监听文件夹，自动处理新放入的 PDF"""
+    from watcher import run_watch
+
+    if not os.path.isdir(args.directory):
+        print(f"✗ 目录不存在: {args.directory}")
+        return 1
+    if not args.api_key:
+        print("✗ 错误: 请设置 POE_API_KEY 环境变量或使用 --api-key")
+        return 1
+    prompt, template_name = resolve_prompt(args)
+    print(f"自动处理新放入的PDF (并发: {args.jobs}, 模板: {template_name})，按 Ctrl+C 停止")
+    try:
+        run_watch(
+            args.directory,
+            prompt,
+            template_name=template_name,
+            api_key=args.api_key,
+            base_url=args.base_url,
+            model_name=args.model,
+            nanobanana_model=args.image_model,
+            jobs=args.jobs,
+            recursive=args.recursive,
+            settle_s=args.settle,
+            poll_s=args.poll,
+            use_watchdog=not args.polling,
+            skip_existing=args.skip_existing,
+            output_dir=args.output,
+            log=print,
+            store=None if args.no_resume else JobStore(args.store)
+        )
+    except KeyboardInterrupt:
+        print("已停止监听")
+    return 0
+
+
+def print_queue_stats(counts):
+    print("队列状态: " + ", ".join(f"{status} {count}" for status, count in counts.items()))
+
+
+def cmd_queue_status(args):
+    """queue-status 子命令：显示共享任务队列的状态"""
+    from work_queue import open_queue
+
+    queue = open_queue(args.queue)
+    print_queue_stats(queue.stats())
+    if args.results:
+        for task in queue.results():
+            target = task['result']['image_path'] if task['result'] else task['error']
+            print(f"{task['status']:6s} {task['payload']['pdf']} -> {target} "
+                  f"(worker: {task['worker']}, 投递 {task['attempts']} 次)")
+    return 0
+
+
+def add_queue_arguments(parser):
+    """添加共享任务队列参数"""
+    parser.add_argument('--queue', default=None, help="任务队列 URL: sqlite:///路径 或 redis://主机:端口/库 "
+                                                      "(默认: WORK_QUEUE_URL)")
+
+
+def add_api_arguments(parser):
+    """添加所有子命令共用的 API 参数"""
+    parser.add_argument('--api-key', default=os.getenv('POE_API_KEY', API_KEY), help="API 密钥 (默认: POE_API_KEY)")
+    parser.add_argument('--base-url', default=BASE_URL, help="API 基础 URL")
+    parser.add_argument('--model', default=MODEL_NAME, help="用于分析 PDF 的大语言模型，auto 为按文档自动选择")
+    parser.add_argument('--image-model', default=NANO_BANANA_MODEL, help="用于生成图像的模型")
+
+
+def add_store_arguments(parser):
+    """添加断点续跑相关参数"""
+    parser.add_argument('--store', default=None, help="任务数据库路径 (默认: JOB_STORE_PATH)")
+    parser.add_argument('--no-resume', action='store_true', help="不读取也不记录已完成的阶段")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli", description="PDF to Image Generator 命令行工具")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = subparsers.add_parser('batch', help="批量处理目录中的 PDF")
+    batch_parser.add_argument('directory', help="包含 PDF 文件的目录")
+    batch_parser.add_argument('--jobs', type=int, default=4, help="同时进行 LLM/图像请求的论文数 (默认: 4)")
+    batch_parser.add_argument('--extract-jobs', type=int, default=None, help="PDF 提取进程数 (默认: CPU 核数)")
+    batch_parser.add_argument('--recursive', action='store_true', help="递归扫描子目录")
+    batch_parser.add_argument('--template', default=list(PROMPT_TEMPLATES.keys())[0], help="提示词模板名称")
+    batch_parser.add_argument('--prompt-file', help="从文件读取自定义提示词（优先于 --template）")
+    batch_parser.add_argument('--trace', help="把各阶段耗时导出为 Chrome trace JSON 文件")
+    batch_parser.add_argument('--memprofile', help="记录各阶段的内存占用，并把报告写入此 JSON 文件（较慢）")
+    batch_parser.add_argument('--regenerate', action='store_true', help="重新生成图像，不使用已完成的结果和图像缓存")
+    batch_parser.add_argument('--estimate', action='store_true', help="只预估输入 tokens、费用和耗时，不调用接口")
+    batch_parser.add_argument('--dedup', action='store_true', help="标记与之前处理过的论文近似重复的 PDF")
+    batch_parser.add_argument('--reuse-duplicates', action='store_true',
+                              help="近似重复的 PDF 复用之前论文的大语言模型响应 (包含 --dedup)")
+    batch_parser.add_argument('--dedup-threshold', type=float, default=DEDUP_THRESHOLD,
+                              help=f"视为近似重复的最低相似度 (默认: {DEDUP_THRESHOLD})")
+    batch_parser.add_argument('--dedup-index', default=None, help="近似重复索引路径 (默认: DEDUP_INDEX_PATH)")
+    add_store_arguments(batch_parser)
+    add_api_arguments(batch_parser)
+    batch_parser.set_defaults(func=cmd_batch)
+
+    serve_parser = subparsers.add_parser('serve', help="以 HTTP 服务方式运行，供团队共用")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="监听地址 (默认: 127.0.0.1)")
+    serve_parser.add_argument('--port', type=int, default=8080, help="监听端口 (默认: 8080)")
+    serve_parser.add_argument('--workers', type=int, default=4, help="同时运行的任务数 (默认: 4)")
+    serve_parser.add_argument('--per-key', type=int, default=2, help="每个 API 密钥同时运行的任务数 (默认: 2)")
+    serve_parser.add_argument('--max-queue', type=int, default=32, help="排队任务数上限，超出时返回 429 (默认: 32)")
+    serve_parser.add_argument('--share-key', action='store_true',
+                              help="请求未带 Authorization 密钥时使用服务端的 --api-key；默认拒绝这类请求")
+    serve_parser.add_argument('--fake', action='store_true', help="启动本地模拟接口代替真实 API，用于本地测试")
+    serve_parser.add_argument('--fake-latency', type=float, default=0.5, help="模拟接口的请求延迟（秒）")
+    add_store_arguments(serve_parser)
+    add_api_arguments(serve_parser)
+    serve_parser.set_defaults(func=cmd_serve)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help="把 PDF 加入共享任务队列")
+    enqueue_parser.add_argument('paths', nargs='+', help="PDF 文件或包含 PDF 的目录")
+    enqueue_parser.add_argument('--recursive', action='store_true', help="递归扫描子目录")
+    enqueue_parser.add_argument('--template', default=list(PROMPT_TEMPLATES.keys())[0], help="提示词模板名称")
+    enqueue_parser.add_argument('--prompt-file', help="从文件读取自定义提示词（优先于 --template）")
+    enqueue_parser.add_argument('--model', default=MODEL_NAME, help="用于分析 PDF 的大语言模型，auto 为按文档自动选择")
+    enqueue_parser.add_argument('--image-model', default=NANO_BANANA_MODEL, help="用于生成图像的模型")
+    add_queue_arguments(enqueue_parser)
+    enqueue_parser.set_defaults(func=cmd_enqueue)
+
+    worker_parser = subparsers.add_parser('worker', help="从共享任务队列领取并处理任务")
+    worker_parser.add_argument('--concurrency', type=int, default=2, help="本 worker 同时处理的任务数 (默认: 2)")
+    worker_parser.add_argument('--lease', type=float, default=60, help="任务租约秒数，超时未续约会重新投递 (默认: 60)")
+    worker_parser.add_argument('--worker-id', help="worker 名称 (默认: 主机名:进程号)")
+    worker_parser.add_argument('--output', help="共享输出目录 (默认: output/)")
+    worker_parser.add_argument('--exit-when-empty', action='store_true', help="队列处理完后退出，而不是等待新任务")
+    add_queue_arguments(worker_parser)
+    add_store_arguments(worker_parser)
+    worker_parser.add_argument('--api-key', default=os.getenv('POE_API_KEY', API_KEY), help="API 密钥 (默认: POE_API_KEY)")
+    worker_parser.add_argument('--base-url', default=BASE_URL, help="API 基础 URL")
+    worker_parser.set_defaults(func=cmd_worker)
+
+    status_parser = subparsers.add_parser('queue-status', help="显示共享任务队列的状态")
+    status_parser.add_argument('--results', action='store_true', help="列出已完成和失败的任务")
+    add_queue_arguments(status_parser)
+    status_parser.set_defaults(func=cmd_queue_status)
+
+    watch_parser = subparsers.add_parser('watch', help="监听文件夹，自动处理新放入的 PDF")
+    watch_parser.add_argument('directory', help="要监听的文件夹")
+    watch_parser.add_argument('--jobs', type=int, default=2, help="同时处理的PDF数 (默认: 2)")
+    watch_parser.add_argument('--recursive', action='store_true', help="同时监听子目录")
+    watch_parser.add_argument('--template', default=list(PROMPT_TEMPLATES.keys())[0], help="提示词模板名称")
+    watch_parser.add_argument('--prompt-file', help="从文件读取自定义提示词（优先于 --template）")
+    watch_parser.add_argument('--settle', type=float, default=2.0, help="文件停止变化多少秒后才开始处理 (默认: 2)")
+    watch_parser.add_argument('--poll', type=float, default=1.0, help="检查正在写入的文件的间隔秒数 (默认: 1)")
+    watch_parser.add_argument('--polling', action='store_true', help="不使用 watchdog，定时扫描文件夹")
+    watch_parser.add_argument('--skip-existing', action='store_true', help="忽略启动时已在文件夹中的PDF")
+    watch_parser.add_argument('--output', help="输出目录 (默认: output/)")
+    add_store_arguments(watch_parser)
+    add_api_arguments(watch_parser)
+    watch_parser.set_defaults(func=cmd_watch)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    setup_logging(console=True)
+    try:
+        return args.func(args)
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,9 @@ Code Parser Module
 Parses code blocks from LLM responses
 """
 import re
+from log_setup import get_logger
+
+logger = get_logger(__name__)
 
 
 def extract_code_blocks(text):
@@ -29,7 +32,8 @@ def extract_code_blocks(text):
         # Remove leading/trailing empty lines
         cleaned_block = cleaned_block.strip()
         cleaned_blocks.append(cleaned_block)
-        
+    
+    logger.debug(f"找到 {len(cleaned_blocks)} 个代码块", extra={'blocks': len(cleaned_blocks), 'chars': len(text)})
     return cleaned_blocks
 
 
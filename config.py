@@ -6,17 +6,90 @@ import os
 # API Configuration - 从系统环境变量获取，如果没有则使用默认值
 API_KEY = os.getenv('POE_API_KEY', '')
 BASE_URL = os.getenv('BASE_URL', 'https://api.poe.com/v1')
-MODEL_NAME = os.getenv('MODEL_NAME', 'kimi-k2-thinking') # kimi-k2-thinking, gemini-3-pro, deepseek-v3.1
+MODEL_NAME = os.getenv('MODEL_NAME', 'auto') # auto, kimi-k2-thinking, gemini-3-pro, deepseek-v3.1
 NANO_BANANA_MODEL = os.getenv('NANO_BANANA_MODEL', 'nano-banana-pro')
+# 以流式方式接收分析模型的响应，可记录首字节时间 (TTFB)
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', '1') != '0'
+# 在分析请求中附带提示词缓存标记 (cache_control / prompt_cache_key)；部分接口会拒绝这些额外字段，默认关闭
+PROMPT_CACHE_HINTS = os.getenv('PROMPT_CACHE_HINTS', '0') != '0'
+
+# 各分析模型的上下文长度 (tokens)，未列出的模型使用 DEFAULT_CONTEXT_LIMIT
+MODEL_CONTEXT_LIMITS = {
+    'kimi-k2-thinking': 256000,
+    'gemini-3-pro': 1000000,
+    'deepseek-v3.1': 128000,
+}
+DEFAULT_CONTEXT_LIMIT = 128000
+
+# 分析模型设为 auto 时，按文档长度、各模型最近的耗时和失败率从候选模型中选择；填写具体模型名则固定使用该模型
+AUTO_MODEL = 'auto'
+MODEL_CANDIDATES = [
+    name.strip() for name in os.getenv('MODEL_CANDIDATES', 'kimi-k2-thinking,gemini-3-pro,deepseek-v3.1').split(',')
+    if name.strip()
+]
+# 最近失败率高于此值的模型不再选择 (除非没有其他可用模型)
+ROUTER_MAX_ERROR_RATE = float(os.getenv('ROUTER_MAX_ERROR_RATE', '0.5'))
+# 偶尔改用非最优的模型，使各模型的耗时记录保持更新
+ROUTER_EXPLORE_RATE = float(os.getenv('ROUTER_EXPLORE_RATE', '0.05'))
+
+# 预估费用用的参考价格 (美元)，请按服务商的实际价格修改
+# 分析模型: (每百万输入 tokens, 每百万输出 tokens)；图像模型: 每张图像
+MODEL_PRICING = {
+    'kimi-k2-thinking': (0.6, 2.5),
+    'gemini-3-pro': (2.0, 12.0),
+    'deepseek-v3.1': (0.3, 1.0),
+}
+IMAGE_PRICING = {
+    'nano-banana-pro': 0.134,
+}
 
 # File paths - 使用相对于当前脚本文件的路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(current_dir, 'output')
 TEMP_DIR = os.path.join(current_dir, 'temp')
+DATA_DIR = os.path.join(current_dir, 'data')
+TRACE_DIR = os.getenv('TRACE_DIR', os.path.join(current_dir, 'traces'))
+# 设为 1 时记录图形界面中每个任务各阶段的内存占用 (tracemalloc + RSS)，报告写入 TRACE_DIR；会明显降低处理速度
+MEMORY_PROFILE = os.getenv('MEMORY_PROFILE', '0') != '0'
+
+# 按图像提示词和模型缓存生成的图像，超过上限时删除最久未使用的图像，设为 0 关闭缓存
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(DATA_DIR, 'image_cache'))
+IMAGE_CACHE_MAX_MB = int(os.getenv('IMAGE_CACHE_MAX_MB', '1024'))
+
+# 多进程/多机 worker 共用的任务队列: sqlite:///路径 或 redis://主机:端口/库
+WORK_QUEUE_URL = os.getenv('WORK_QUEUE_URL', 'sqlite:///' + os.path.join(DATA_DIR, 'queue.sqlite3'))
+
+# 界面日志最多保留的行数，超出后丢弃最早的行
+LOG_VIEW_MAX_LINES = int(os.getenv('LOG_VIEW_MAX_LINES', '5000'))
+
+# 界面和终端显示的日志级别；JSONL 日志文件总是记录 DEBUG 及以上的全部日志
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# 结构化日志文件 (每行一个 JSON)，超过大小上限时轮转，设为空字符串关闭
+LOG_FILE = os.getenv('LOG_FILE', os.path.join(DATA_DIR, 'logs', 'pipeline.jsonl'))
+LOG_FILE_MAX_MB = int(os.getenv('LOG_FILE_MAX_MB', '10'))
+LOG_FILE_BACKUPS = int(os.getenv('LOG_FILE_BACKUPS', '5'))
+
+# 记录各处理阶段结果的 SQLite 数据库，用于断点续跑
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', os.path.join(DATA_DIR, 'jobs.sqlite3'))
+
+# 近似重复论文检测 (MinHash/LSH) 的索引文件，以及视为重复的最低相似度 (估计的 Jaccard 相似度)
+DEDUP_INDEX_PATH = os.getenv('DEDUP_INDEX_PATH', os.path.join(DATA_DIR, 'dedup.sqlite3'))
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.8'))
+
+
+def ensure_dir(path):
+    """
+    Create a directory on first use instead of at import time
+
+    Args:
+        path (str): Directory to create if it doesn't exist
+
+    Returns:
+        str: The same path
+    """
+    os.makedirs(path, exist_ok=True)
+    return path
 
-# Create directories if they don't exist
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs(TEMP_DIR, exist_ok=True)
 
 # Prompt templates
 PROMPT_TEMPLATES = {
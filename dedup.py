@@ -0,0 +1,274 @@
+"""
+Near-Duplicate Detection Module
+MinHash signatures of the extracted PDF text and a persistent LSH index, so a paper that is
+nearly identical to one processed before (preprint vs. camera-ready, re-exported copy) is found
+without comparing it against every earlier paper
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+
+from config import DEDUP_INDEX_PATH, DEDUP_THRESHOLD
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+# 文本太少 (扫描版、提取失败) 时不计算签名，否则所有空文档都会互相匹配
+MIN_SHINGLES = 20
+
+# 汉字逐字作为一个词，其余按字母数字串分词
+_TOKEN_PATTERN = re.compile(r'[㐀-䶿一-鿿]|[^\W_㐀-䶿一-鿿]+')
+
+
+def shingle_hashes(text, k=SHINGLE_SIZE):
+    """
+    64-bit hashes of the distinct k-word shingles of a text, ignoring case, punctuation and layout
+
+    Args:
+        text (str): Extracted PDF text
+        k (int): Words per shingle
+
+    Returns:
+        set: Shingle hashes
+    """
+    tokens = _TOKEN_PATTERN.findall((text or "").lower())
+    shingles = {" ".join(tokens[i:i + k]) for i in range(max(len(tokens) - k + 1, 0))}
+    return {
+        int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+        for shingle in shingles
+    }
+
+
+def minhash_signature(text, num_perm=NUM_PERM, k=SHINGLE_SIZE):
+    """
+    MinHash signature of a text
+
+    Uses one-permutation hashing: each shingle hash is assigned to one of num_perm bins by its
+    low bits and each bin keeps its minimum, which needs one hash per shingle instead of
+    num_perm. Empty bins borrow the value of the next non-empty bin (densification), so the
+    fraction of equal bins still estimates the Jaccard similarity of the shingle sets.
+
+    Args:
+        text (str): Extracted PDF text
+        num_perm (int): Signature length
+        k (int): Words per shingle
+
+    Returns:
+        list: num_perm unsigned 64-bit values, or None if the text has fewer than MIN_SHINGLES shingles
+    """
+    hashes = shingle_hashes(text, k)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    empty = 1 << 64
+    bins = [empty] * num_perm
+    for h in hashes:
+        index = h % num_perm
+        value = h // num_perm
+        if value < bins[index]:
+            bins[index] = value
+
+    # 空桶取右侧最近的非空桶的值，并按距离加上偏移，避免与该桶本身的值相同
+    offset = (1 << 64) // num_perm
+    signature = list(bins)
+    for index in range(num_perm):
+        if bins[index] != empty:
+            continue
+        for distance in range(1, num_perm):
+            borrowed = bins[(index + distance) % num_perm]
+            if borrowed != empty:
+                signature[index] = borrowed + distance * offset
+                break
+    return signature
+
+
+def signature_similarity(a, b):
+    """
+    Estimated Jaccard similarity of the texts behind two signatures
+
+    Args:
+        a (list): MinHash signature
+        b (list): MinHash signature of the same length
+
+    Returns:
+        float: Fraction of equal values, between 0 and 1
+    """
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def _integrate(func, start, end, steps=100):
+    width = (end - start) / steps
+    return sum(func(start + (i + 0.5) * width) for i in range(steps)) * width
+
+
+def lsh_parameters(threshold, num_perm=NUM_PERM):
+    """
+    Choose the number of bands and rows per band for a similarity threshold
+
+    Two documents become candidates when all rows of at least one band agree, which happens
+    with probability 1 - (1 - s^rows)^bands for similarity s. The split minimizing the area of
+    false positives below the threshold plus false negatives above it is chosen.
+
+    Args:
+        threshold (float): Similarity at which documents count as duplicates
+        num_perm (int): Signature length
+
+    Returns:
+        tuple: (bands, rows)
+    """
+    best = None
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        def probability(s):
+            return 1 - (1 - s ** rows) ** bands
+        false_positive = _integrate(probability, 0.0, threshold)
+        false_negative = _integrate(lambda s: 1 - probability(s), threshold, 1.0)
+        error = false_positive + false_negative
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateIndex:
+    def __init__(self, path=None, threshold=None, num_perm=NUM_PERM):
+        """
+        Open (and create if needed) the persistent LSH index of MinHash signatures
+
+        Each document is stored once with its signature and once per band under the hash of
+        that band, so a lookup reads a handful of index rows whatever the number of papers.
+
+        Args:
+            path (str): Path to the database file, defaults to DEDUP_INDEX_PATH
+            threshold (float): Minimum estimated similarity of a match, defaults to DEDUP_THRESHOLD
+            num_perm (int): Signature length
+        """
+        self.path = path or DEDUP_INDEX_PATH
+        self.threshold = DEDUP_THRESHOLD if threshold is None else threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = lsh_parameters(self.threshold, num_perm)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_hash TEXT PRIMARY KEY,
+                name TEXT,
+                signature BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        # 不同的阈值对应不同的分带方式，分带记录按 (bands, rows) 区分
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                layout TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                doc_hash TEXT NOT NULL,
+                PRIMARY KEY (layout, band, bucket, doc_hash)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+        self._layout = f"{num_perm}:{self.bands}x{self.rows}"
+        self._index_missing_buckets()
+
+    def _band_buckets(self, signature):
+        packed = array('Q', signature).tobytes()
+        width = self.rows * 8
+        return [
+            (band, int.from_bytes(hashlib.blake2b(packed[band * width:(band + 1) * width], digest_size=8).digest(),
+                                  'little', signed=True))
+            for band in range(self.bands)
+        ]
+
+    def _index_missing_buckets(self):
+        """阈值改变后，为已有文档补建新的分带记录"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_hash, signature FROM documents WHERE doc_hash NOT IN "
+                "(SELECT doc_hash FROM buckets WHERE layout = ? AND band = 0)", (self._layout,)
+            ).fetchall()
+            for doc_hash, blob in rows:
+                signature = array('Q', blob)
+                if len(signature) == self.num_perm:
+                    self._insert_buckets(doc_hash, signature)
+            self._conn.commit()
+
+    def _insert_buckets(self, doc_hash, signature):
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO buckets (layout, band, bucket, doc_hash) VALUES (?, ?, ?, ?)",
+            [(self._layout, band, bucket, doc_hash) for band, bucket in self._band_buckets(signature)]
+        )
+
+    def _query(self, signature, exclude=None):
+        candidates = set()
+        for band, bucket in self._band_buckets(signature):
+            candidates.update(row[0] for row in self._conn.execute(
+                "SELECT doc_hash FROM buckets WHERE layout = ? AND band = ? AND bucket = ?",
+                (self._layout, band, bucket)
+            ))
+        candidates.discard(exclude)
+        matches = []
+        for doc_hash in candidates:
+            name, blob = self._conn.execute(
+                "SELECT name, signature FROM documents WHERE doc_hash = ?", (doc_hash,)
+            ).fetchone()
+            similarity = signature_similarity(signature, array('Q', blob))
+            if similarity >= self.threshold:
+                matches.append({'doc_hash': doc_hash, 'name': name, 'similarity': similarity})
+        return sorted(matches, key=lambda match: match['similarity'], reverse=True)
+
+    def query(self, signature, exclude=None):
+        """
+        Find indexed documents similar to a signature
+
+        Args:
+            signature (list): MinHash signature from minhash_signature
+            exclude (str): Document hash to leave out (the document itself)
+
+        Returns:
+            list: doc_hash, name and estimated similarity of each match, most similar first
+        """
+        if signature is None:
+            return []
+        with self._lock:
+            return self._query(signature, exclude)
+
+    def match_and_add(self, doc_hash, signature, name=None):
+        """
+        Find the documents similar to this one, then add it to the index
+
+        Both steps happen under one lock, so of two near-duplicates processed at the same
+        time exactly one is reported as matching the other.
+
+        Args:
+            doc_hash (str): Hash of the PDF file content
+            signature (list): MinHash signature of its text, None skips the document
+            name (str): Name shown when later documents match this one
+
+        Returns:
+            list: Matches as returned by query
+        """
+        if signature is None:
+            return []
+        with self._lock:
+            matches = self._query(signature, exclude=doc_hash)
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO documents (doc_hash, name, signature, created_at) VALUES (?, ?, ?, ?)",
+                (doc_hash, name, array('Q', signature).tobytes(), time.time())
+            )
+            if cursor.rowcount:
+                self._insert_buckets(doc_hash, signature)
+            self._conn.commit()
+        return matches
+
+    def count(self):
+        """返回索引中的文档数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Fake API Module
+Local stand-in for the OpenAI-compatible chat completions endpoint, used by the
+benchmarks, the load tester and local testing of the service modes:
+
+    python fake_api.py --port 8765 --latency 0.5
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+import zlib
+import struct
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_IMAGE_PROMPT = (
+    "A professional wide scientific poster layout divided into three distinct vertical panels "
+    "(Left, Center, Right) on a clean white background. --ar 16:9"
+)
+
+
+def make_png(width, height, color=(120, 160, 200)):
+    """
+    Build a solid-color PNG without any imaging library
+
+    Args:
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+        color (tuple): RGB color
+
+    Returns:
+        bytes: PNG file content
+    """
+    def chunk(kind, data):
+        payload = kind + data
+        return struct.pack('>I', len(data)) + payload + struct.pack('>I', zlib.crc32(payload) & 0xffffffff)
+
+    row = b'\x00' + bytes(color) * width
+    raw = row * height
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(raw, 6))
+        + chunk(b'IEND', b'')
+    )
+
+
+class FakeAPIServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, image_latency=None, image_mode='base64',
+                 image_size=(1024, 576), error_rate=0.0, image_models=('nano-banana',), reject_stream_options=False,
+                 max_prompt_chars=None):
+        """
+        Configure the stand-in endpoint
+
+        Args:
+            host (str): Interface to bind
+            port (int): Port to bind, 0 picks a free port
+            latency (float): Seconds to wait before answering an analysis request
+            image_latency (float): Seconds to wait before answering an image request, defaults to latency
+            image_mode (str): 'base64' for inline data URIs, 'url' for a downloadable Markdown image link
+            image_size (tuple): Size of the generated PNG
+            error_rate (float): Fraction of requests answered with HTTP 500
+            image_models (tuple): Substrings of model names treated as image models
+            reject_stream_options (bool): Answer requests carrying stream_options with HTTP 400,
+                like OpenAI-compatible proxies that do not support it
+            max_prompt_chars (int): Answer requests whose messages are longer with an HTTP 400
+                context length error
+        """
+        self.latency = latency
+        self.image_latency = latency if image_latency is None else image_latency
+        self.image_mode = image_mode
+        self.error_rate = error_rate
+        self.image_models = image_models
+        self.reject_stream_options = reject_stream_options
+        self.max_prompt_chars = max_prompt_chars
+        self.image_bytes = make_png(*image_size)
+        self.request_count = 0
+        self.model_requests = Counter()  # 模型名 -> 收到的请求数
+        self._count_lock = threading.Lock()
+        self.prefixes = set()  # 请求过的消息前缀，用于模拟提示词缓存
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """OpenAI 兼容的 base URL，可直接传给 LLMClient"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def cached_prefix_chars(self, model, messages):
+        """模拟接口端的前缀缓存：返回之前请求过的最长完整消息前缀的长度，并记录本次请求的各个前缀"""
+        cached = 0
+        length = 0
+        digest = hashlib.sha256(model.encode('utf-8'))
+        with self._count_lock:
+            for message in messages:
+                text = json.dumps(message, sort_keys=True)
+                digest.update(text.encode('utf-8'))
+                length += len(json.dumps(message.get('content', '')))
+                key = digest.hexdigest()
+                if key in self.prefixes:
+                    cached = length
+                self.prefixes.add(key)
+        return cached
+
+    def is_image_model(self, model):
+        return any(name in (model or '') for name in self.image_models)
+
+    def reply_for(self, model):
+        """生成分析模型或图像模型的回复内容"""
+        if not self.is_image_model(model):
+            return f"**Summary:**\n- Problem, data, method, result\n\n```\n{DEFAULT_IMAGE_PROMPT}\n```"
+        if self.image_mode == 'url':
+            return f"![poster]({self.base_url[:-len('/v1')]}/images/poster.png)"
+        return f"![poster](data:image/png;base64,{base64.b64encode(self.image_bytes).decode('ascii')})"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_body(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith('/images/'):
+                    self.send_body(200, 'image/png', server.image_bytes)
+                else:
+                    self.send_body(404, 'application/json', b'{"error": "not found"}')
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                model = body.get('model', '')
+                with server._count_lock:
+                    server.request_count += 1
+                    server.model_requests[model] += 1
+                time.sleep(server.image_latency if server.is_image_model(model) else server.latency)
+
+                if server.reject_stream_options and 'stream_options' in body:
+                    self.send_body(400, 'application/json',
+                                   b'{"error": {"message": "Unrecognized request argument: stream_options"}}')
+                    return
+
+                messages = body.get('messages', [])
+                prompt_chars = sum(len(json.dumps(m.get('content', ''))) for m in messages)
+                if server.max_prompt_chars is not None and prompt_chars > server.max_prompt_chars:
+                    self.send_body(400, 'application/json',
+                                   b'{"error": {"message": "Maximum context length exceeded", '
+                                   b'"code": "context_length_exceeded"}}')
+                    return
+
+                if random.random() < server.error_rate:
+                    self.send_body(500, 'application/json', b'{"error": {"message": "injected failure"}}')
+                    return
+
+                content = server.reply_for(model)
+                usage = {
+                    'prompt_tokens': prompt_chars // 4,
+                    'completion_tokens': len(content) // 4,
+                    'total_tokens': (prompt_chars + len(content)) // 4,
+                    'prompt_tokens_details': {'cached_tokens': server.cached_prefix_chars(model, messages) // 4}
+                }
+                if body.get('stream'):
+                    self.send_stream(model, content, usage)
+                    return
+                response = {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': content},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': usage
+                }
+                self.send_body(200, 'application/json', json.dumps(response).encode('utf-8'))
+
+            def send_stream(self, model, content, usage):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                step = max(1, len(content) // 8)
+                for offset in range(0, len(content), step):
+                    chunk = {
+                        'id': 'chatcmpl-fake',
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': model,
+                        'choices': [{
+                            'index': 0,
+                            'delta': {'content': content[offset:offset + step]},
+                            'finish_reason': None
+                        }]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                final = {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [],
+                    'usage': usage
+                }
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+                self.close_connection = True
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容接口")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="分析模型请求的延迟（秒）")
+    parser.add_argument('--image-latency', type=float, default=None, help="图像模型请求的延迟（秒）")
+    parser.add_argument('--image-mode', choices=('base64', 'url'), default='base64')
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回 HTTP 500 的请求比例")
+    parser.add_argument('--reject-stream-options', action='store_true', help="像不支持 stream_options 的代理一样返回 HTTP 400")
+    parser.add_argument('--max-prompt-chars', type=int, default=None, help="消息超过该字符数时返回上下文超长的 HTTP 400")
+    args = parser.parse_args(argv)
+
+    server = FakeAPIServer(
+        args.host, args.port, args.latency, args.image_latency, args.image_mode, error_rate=args.error_rate,
+        reject_stream_options=args.reject_stream_options, max_prompt_chars=args.max_prompt_chars
+    )
+    print(f"Fake API listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
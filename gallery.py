@@ -0,0 +1,378 @@
+"""
+Gallery Module
+In-app browser for generated images: the output directory is indexed in the
+background and thumbnails are decoded only for the items that are on screen
+"""
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from PySide6.QtCore import (
+    Qt, QAbstractListModel, QModelIndex, QObject, QRunnable, QSize, QThreadPool, Signal, Slot
+)
+from PySide6.QtGui import QColor, QIcon, QImage, QImageReader, QPixmap
+from PySide6.QtWidgets import (
+    QComboBox, QHBoxLayout, QLabel, QListView, QPushButton, QVBoxLayout, QWidget
+)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+THUMBNAIL_SIZE = 192
+ALL_LABEL = "全部"
+UNKNOWN_LABEL = "未知"
+
+# 文件名末尾的时间戳和任务编号，例如 paper_20250101_120000_3
+_TIMESTAMP_SUFFIX = re.compile(r'_\d{8}_\d{6}(_\d+)?$')
+
+
+def open_path(path):
+    """用系统默认程序打开文件或目录"""
+    if sys.platform == "darwin":  # macOS
+        subprocess.Popen(["open", path])
+    elif sys.platform == "win32":  # Windows
+        subprocess.Popen(["explorer", path])
+    else:  # Linux
+        subprocess.Popen(["xdg-open", path])
+
+
+def paper_from_name(name):
+    """从输出文件或任务目录名推断论文名"""
+    return _TIMESTAMP_SUFFIX.sub('', os.path.splitext(name)[0]) or name
+
+
+def scan_outputs(output_dir):
+    """
+    Index generated images using the job.json manifests written by the pipeline
+
+    Args:
+        output_dir (str): Directory holding job directories and loose images
+
+    Returns:
+        list: Dicts with path, paper, template, model, image_model and mtime, newest first
+    """
+    entries = []
+    if not os.path.isdir(output_dir):
+        return entries
+
+    for item in os.scandir(output_dir):
+        if item.is_file() and item.name.lower().endswith(IMAGE_EXTENSIONS):
+            # 旧版本直接保存在输出目录中的图像，没有清单
+            entries.append({
+                'path': item.path,
+                'paper': paper_from_name(item.name),
+                'template': UNKNOWN_LABEL,
+                'model': UNKNOWN_LABEL,
+                'image_model': UNKNOWN_LABEL,
+                'mtime': item.stat().st_mtime
+            })
+        elif item.is_dir():
+            entries.extend(scan_job_dir(item.path))
+
+    entries.sort(key=lambda entry: entry['mtime'], reverse=True)
+    return entries
+
+
+def scan_job_dir(job_dir):
+    """
+    Index the images of one job directory
+
+    Args:
+        job_dir (str): Job directory created by create_job_dir
+
+    Returns:
+        list: Gallery entries for the images in the directory
+    """
+    manifest = {}
+    try:
+        with open(os.path.join(job_dir, 'job.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    # 清单中记录了每个模板对应的图像和实际使用的分析模型
+    templates = {}
+    for name, result in (manifest.get('templates') or {}).items():
+        if result.get('image'):
+            templates[os.path.normpath(os.path.join(job_dir, result['image']))] = (name, result.get('model'))
+
+    if manifest.get('pdf'):
+        paper = os.path.splitext(os.path.basename(manifest['pdf']))[0]
+    else:
+        paper = paper_from_name(os.path.basename(job_dir))
+
+    entries = []
+    for item in os.scandir(job_dir):
+        if not (item.is_file() and item.name.lower().endswith(IMAGE_EXTENSIONS)):
+            continue
+        template, model = templates.get(os.path.normpath(item.path), (os.path.splitext(item.name)[0], None))
+        entries.append({
+            'path': item.path,
+            'paper': paper,
+            'template': template,
+            'model': model or manifest.get('model') or UNKNOWN_LABEL,
+            'image_model': manifest.get('image_model') or UNKNOWN_LABEL,
+            'mtime': item.stat().st_mtime
+        })
+    return entries
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir, size=THUMBNAIL_SIZE):
+        """
+        On-disk thumbnail cache keyed by image path, modification time and size
+
+        Args:
+            cache_dir (str): Directory the thumbnails are stored in
+            size (int): Longest side of a thumbnail in pixels
+        """
+        self.cache_dir = cache_dir
+        self.size = size
+
+    def thumbnail_path(self, image_path):
+        stat = os.stat(image_path)
+        key = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.size}"
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name[:2], f"{name}.png")
+
+    def load(self, image_path):
+        """
+        Return the thumbnail, decoding and caching it on first use (safe to call from worker threads)
+
+        Args:
+            image_path (str): Path to the full-size image
+
+        Returns:
+            QImage: The thumbnail, a null image if the file can't be decoded
+        """
+        thumbnail_path = self.thumbnail_path(image_path)
+        if os.path.exists(thumbnail_path):
+            image = QImage(thumbnail_path)
+            if not image.isNull():
+                return image
+
+        reader = QImageReader(image_path)
+        original = reader.size()
+        if original.isValid():
+            # 让解码器直接按缩略图尺寸解码，JPEG 等格式无需解码整张图
+            reader.setScaledSize(original.scaled(self.size, self.size, Qt.AspectRatioMode.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            return image
+        if max(image.width(), image.height()) > self.size:
+            image = image.scaled(
+                self.size, self.size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+            )
+
+        os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+        # 先写临时文件再重命名，避免其他线程读到不完整的缩略图
+        temp_path = f"{thumbnail_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if image.save(temp_path, 'PNG'):
+            os.replace(temp_path, thumbnail_path)
+        return image
+
+
+class GallerySignals(QObject):
+    """后台任务信号"""
+    scanned = Signal(object)  # list of entries
+    thumbnail_ready = Signal(str, QImage)  # (path, image)
+
+
+class ScanJob(QRunnable):
+    """在后台扫描输出目录"""
+
+    def __init__(self, output_dir, signals):
+        super().__init__()
+        self.output_dir = output_dir
+        self.signals = signals
+
+    def run(self):
+        self.signals.scanned.emit(scan_outputs(self.output_dir))
+
+
+class ThumbnailJob(QRunnable):
+    """在后台生成单个缩略图"""
+
+    def __init__(self, cache, path, signals):
+        super().__init__()
+        self.cache = cache
+        self.path = path
+        self.signals = signals
+
+    def run(self):
+        try:
+            image = self.cache.load(self.path)
+        except OSError:
+            image = QImage()
+        self.signals.thumbnail_ready.emit(self.path, image)
+
+
+class GalleryModel(QAbstractListModel):
+    def __init__(self, cache, max_pixmaps=500, parent=None):
+        """
+        List model that requests a thumbnail only when the view paints an item
+
+        Args:
+            cache (ThumbnailCache): Thumbnail cache used by the worker threads
+            max_pixmaps (int): Number of decoded thumbnails kept in memory
+            parent (QObject): Parent object
+        """
+        super().__init__(parent)
+        self.cache = cache
+        self.max_pixmaps = max_pixmaps
+        self.entries = []
+        self.rows = {}  # path -> row
+        self.pixmaps = OrderedDict()  # path -> QPixmap，按最近使用排序
+        self.pending = set()
+        self.request_counter = 0
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(max(2, min(4, os.cpu_count() or 2)))
+        self.signals = GallerySignals()
+        self.signals.thumbnail_ready.connect(self.on_thumbnail_ready)
+
+        placeholder = QPixmap(cache.size, cache.size)
+        placeholder.fill(QColor("#ecf0f1"))
+        self.placeholder = QIcon(placeholder)
+
+    def set_entries(self, entries):
+        self.beginResetModel()
+        self.entries = entries
+        self.rows = {entry['path']: row for row, entry in enumerate(entries)}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{entry['paper']}\n{entry['template']}"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            created = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['mtime']))
+            return (f"{entry['path']}\n论文: {entry['paper']}\n模板: {entry['template']}\n"
+                    f"分析模型: {entry['model']}\n图像模型: {entry['image_model']}\n生成时间: {created}")
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.thumbnail(entry['path'])
+        if role == Qt.ItemDataRole.UserRole:
+            return entry['path']
+        return None
+
+    def thumbnail(self, path):
+        """返回已解码的缩略图；尚未解码时安排后台解码并先显示占位图"""
+        pixmap = self.pixmaps.get(path)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(path)
+            return pixmap
+        if path not in self.pending:
+            self.pending.add(path)
+            # 最近请求的（即当前可见的）项目优先解码
+            self.request_counter += 1
+            self.thread_pool.start(ThumbnailJob(self.cache, path, self.signals), self.request_counter)
+        return self.placeholder
+
+    @Slot(str, QImage)
+    def on_thumbnail_ready(self, path, image):
+        self.pending.discard(path)
+        if image.isNull():
+            return
+        self.pixmaps[path] = QPixmap.fromImage(image)
+        while len(self.pixmaps) > self.max_pixmaps:
+            self.pixmaps.popitem(last=False)
+        row = self.rows.get(path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class GalleryWidget(QWidget):
+    def __init__(self, output_dir, cache_dir, parent=None):
+        """
+        Gallery tab with paper/template/model filters and a virtualized thumbnail grid
+
+        Args:
+            output_dir (str): Directory holding the generated images
+            cache_dir (str): Directory for the thumbnail cache
+            parent (QWidget): Parent widget
+        """
+        super().__init__(parent)
+        self.output_dir = output_dir
+        self.all_entries = []
+        self.scanning = False
+        self.model = GalleryModel(ThumbnailCache(cache_dir), parent=self)
+        self.model.signals.scanned.connect(self.on_scanned)
+
+        layout = QVBoxLayout(self)
+        filter_layout = QHBoxLayout()
+        self.filters = {}
+        for key, label in (('paper', "论文:"), ('template', "模板:"), ('model', "模型:")):
+            combo = QComboBox()
+            combo.setSizeAdjustPolicy(QComboBox.SizeAdjustPolicy.AdjustToContents)
+            combo.addItem(ALL_LABEL)
+            combo.currentIndexChanged.connect(self.apply_filters)
+            filter_layout.addWidget(QLabel(label))
+            filter_layout.addWidget(combo)
+            self.filters[key] = combo
+        filter_layout.addStretch()
+        self.count_label = QLabel("")
+        filter_layout.addWidget(self.count_label)
+        refresh_button = QPushButton("刷新")
+        refresh_button.clicked.connect(self.refresh)
+        filter_layout.addWidget(refresh_button)
+        layout.addLayout(filter_layout)
+
+        # 图标模式 + 统一尺寸：视图只为可见项目请求数据，缩略图按需解码
+        self.view = QListView()
+        self.view.setViewMode(QListView.ViewMode.IconMode)
+        self.view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.view.setMovement(QListView.Movement.Static)
+        self.view.setUniformItemSizes(True)
+        self.view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.view.setBatchSize(200)
+        self.view.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.view.setGridSize(QSize(THUMBNAIL_SIZE + 24, THUMBNAIL_SIZE + 48))
+        self.view.setWordWrap(True)
+        self.view.setModel(self.model)
+        self.view.doubleClicked.connect(self.open_item)
+        layout.addWidget(self.view)
+
+    def refresh(self):
+        """在后台重新扫描输出目录，界面立即返回"""
+        if self.scanning:
+            return
+        self.scanning = True
+        self.count_label.setText("正在扫描...")
+        self.model.thread_pool.start(ScanJob(self.output_dir, self.model.signals), 1 << 30)
+
+    @Slot(object)
+    def on_scanned(self, entries):
+        self.scanning = False
+        self.all_entries = entries
+        for key, combo in self.filters.items():
+            current = combo.currentText()
+            values = sorted({entry[key] for entry in entries})
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem(ALL_LABEL)
+            combo.addItems(values)
+            combo.setCurrentIndex(max(0, combo.findText(current)))
+            combo.blockSignals(False)
+        self.apply_filters()
+
+    def apply_filters(self):
+        selected = {key: combo.currentText() for key, combo in self.filters.items()}
+        entries = [
+            entry for entry in self.all_entries
+            if all(value == ALL_LABEL or entry[key] == value for key, value in selected.items())
+        ]
+        self.model.set_entries(entries)
+        self.count_label.setText(f"共 {len(entries)} 张图像")
+
+    def open_item(self, index):
+        open_path(index.data(Qt.ItemDataRole.UserRole))
@@ -3,17 +3,219 @@ Image Generator Module
 Handles image generation using Nano-Banana and saving images to disk
 """
 import base64
+import hashlib
 import re
 import os
+import shutil
+import sqlite3
+import threading
 import time
-import requests
 from io import BytesIO
-from PIL import Image
 from llm_client import LLMClient
-from config import OUTPUT_DIR
+from config import OUTPUT_DIR, NANO_BANANA_MODEL, IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB, ensure_dir
+from tracing import span
+from memprofile import memory_stage
+from log_setup import get_logger
 
+logger = get_logger(__name__)
 
-def generate_and_save_image(image_prompt, filename=None, api_key=None, base_url=None, model_name=None):
+
+def normalize_prompt(image_prompt):
+    """忽略首尾空白和空白字符的差异，只在内容不同时才视为不同的提示词"""
+    return " ".join((image_prompt or "").split())
+
+
+class ImageCache:
+    def __init__(self, cache_dir=None, max_bytes=None):
+        """
+        Content-addressed store of generated images keyed by (image model, normalized prompt)
+
+        Each distinct image is stored once under its SHA-256; prompts that produced the same
+        bytes share the file. Least recently used images are evicted above max_bytes.
+
+        Args:
+            cache_dir (str): Directory holding the images and the index, defaults to IMAGE_CACHE_DIR
+            max_bytes (int): Size limit of the stored images, defaults to IMAGE_CACHE_MAX_MB
+        """
+        self.cache_dir = cache_dir or IMAGE_CACHE_DIR
+        self.max_bytes = IMAGE_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(self.cache_dir, 'index.sqlite3'), timeout=30, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS prompts (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                blob TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def prompt_key(model_name, image_prompt):
+        digest = hashlib.sha256()
+        digest.update((model_name or '').encode('utf-8'))
+        digest.update(b'\x00')
+        digest.update(normalize_prompt(image_prompt).encode('utf-8'))
+        return digest.hexdigest()
+
+    def blob_path(self, blob_hash):
+        return os.path.join(self.cache_dir, 'blobs', blob_hash[:2], f"{blob_hash}.png")
+
+    def get(self, model_name, image_prompt):
+        """
+        Look up the image generated earlier for this prompt and model
+
+        Args:
+            model_name (str): Image model
+            image_prompt (str): Image prompt
+
+        Returns:
+            str: Path of the cached image, or None
+        """
+        key = self.prompt_key(model_name, image_prompt)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT b.hash, b.size FROM prompts p JOIN blobs b ON b.hash = p.blob WHERE p.key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            path = self.blob_path(row[0])
+            if not os.path.exists(path) or os.path.getsize(path) != row[1]:
+                # 缓存文件被删除或修改，丢弃这条记录
+                self._conn.execute("DELETE FROM prompts WHERE blob = ?", (row[0],))
+                self._conn.execute("DELETE FROM blobs WHERE hash = ?", (row[0],))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE blobs SET last_used = ? WHERE hash = ?", (time.time(), row[0]))
+            self._conn.commit()
+        return path
+
+    def put(self, model_name, image_prompt, image_path):
+        """
+        Record a generated image, storing its bytes only if no identical image is cached
+
+        Args:
+            model_name (str): Image model
+            image_prompt (str): Image prompt
+            image_path (str): The saved image
+
+        Returns:
+            str: Path of the cached copy
+        """
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        blob_hash = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(blob_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO blobs (hash, size, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET last_used = excluded.last_used",
+                (blob_hash, len(data), now)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prompts (key, model, blob, created_at) VALUES (?, ?, ?, ?)",
+                (self.prompt_key(model_name, image_prompt), model_name or '', blob_hash, now)
+            )
+            self._conn.commit()
+            self._evict(keep=blob_hash)
+        return path
+
+    def _evict(self, keep=None):
+        # 超出容量时按最近使用时间删除，刚写入的图像保留
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for blob_hash, size in self._conn.execute(
+                "SELECT hash, size FROM blobs ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            if blob_hash == keep:
+                continue
+            self._conn.execute("DELETE FROM prompts WHERE blob = ?", (blob_hash,))
+            self._conn.execute("DELETE FROM blobs WHERE hash = ?", (blob_hash,))
+            try:
+                os.remove(self.blob_path(blob_hash))
+            except OSError:
+                pass
+            total -= size
+        self._conn.commit()
+
+    def stats(self):
+        """
+        Size of the cache
+
+        Returns:
+            dict: images, prompts and bytes stored
+        """
+        with self._lock:
+            images, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            prompts = self._conn.execute("SELECT COUNT(*) FROM prompts").fetchone()[0]
+        return {'images': images, 'prompts': prompts, 'bytes': size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def link_file(source, destination):
+    """
+    Make destination refer to source without copying when possible
+
+    Args:
+        source (str): Existing file
+        destination (str): Path to create, replaced if it exists
+    """
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        # 跨文件系统或不支持硬链接时复制
+        shutil.copyfile(source, destination)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """
+    Shared ImageCache of this process
+
+    Returns:
+        ImageCache: The cache, or None if IMAGE_CACHE_MAX_MB is 0
+    """
+    global _default_cache
+    if IMAGE_CACHE_MAX_MB <= 0:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ImageCache()
+        return _default_cache
+
+
+def generate_and_save_image(image_prompt, filename=None, api_key=None, base_url=None, model_name=None,
+                            output_dir=None, client=None, regenerate=False, cache=None):
     """
     Generate an image using Nano-Banana and save it to disk
     
@@ -23,22 +225,50 @@ def generate_and_save_image(image_prompt, filename=None, api_key=None, base_url=
         api_key (str): API key for the service
         base_url (str): Base URL for the API
         model_name (str): Name of the model to use
+        output_dir (str): Directory to save the image in, defaults to OUTPUT_DIR
+        client (LLMClient): Existing client to reuse instead of creating a new one
+        regenerate (bool): Always request a new image, replacing the cached one
+        cache (ImageCache): Image cache, defaults to the shared cache of this process; False disables it
         
     Returns:
         str: Path to the saved image file
     """
+    if cache is None:
+        cache = get_image_cache()
+    elif cache is False:
+        cache = None
+    cache_model = model_name or NANO_BANANA_MODEL
+    if cache is not None and not regenerate:
+        cached_path = cache.get(cache_model, image_prompt)
+        if cached_path is not None:
+            try:
+                with span("image.cache_hit"):
+                    image_path = image_output_path(filename, output_dir)
+                    link_file(cached_path, image_path)
+            except OSError as e:
+                # 其他线程或进程可能刚好淘汰了这张图像，按未命中处理
+                logger.info(f"  [缓存] 缓存的图像已不可用，重新生成: {e}",
+                            extra={'model': cache_model, 'path': cached_path, 'cache': 'miss'})
+            else:
+                logger.info(f"  [缓存] 使用相同提示词生成过的图像: {cached_path}",
+                            extra={'model': cache_model, 'path': image_path, 'cache': 'hit'})
+                return image_path
+
     try:
         # Initialize LLM client with provided parameters
-        client = LLMClient(api_key=api_key, base_url=base_url)
+        if client is None:
+            client = LLMClient(api_key=api_key, base_url=base_url)
         
         # Send request to Nano-Banana
+        start = time.perf_counter()
         response = client.send_image_request_to_nanobanana(image_prompt, model_name)
-        print("请求发送成功")
+        logger.info("请求发送成功", extra={'model': cache_model, 'duration_s': round(time.perf_counter() - start, 3),
+                                         'chars': len(response or '')})
         
         if not response:
             raise Exception("响应内容为空")
             
-        print(f"响应内容预览 (前500字符):\n{'-'*20}\n{response[:500]}\n{'-'*20}")
+        logger.debug(f"响应内容预览 (前500字符):\n{'-'*20}\n{response[:500]}\n{'-'*20}")
         
         # Extract image data from response
         image_data = extract_image_from_response(response)
@@ -47,7 +277,13 @@ def generate_and_save_image(image_prompt, filename=None, api_key=None, base_url=
             raise Exception("No image data found in Nano-Banana response")
             
         # Save image to disk
-        image_path = save_image(image_data, filename)
+        image_path = save_image(image_data, filename, output_dir)
+        
+        if cache is not None:
+            try:
+                cache.put(cache_model, image_prompt, image_path)
+            except Exception as e:
+                logger.warning(f"  [缓存] 写入失败: {e}", extra={'path': image_path})
         
         return image_path
         
@@ -55,6 +291,7 @@ def generate_and_save_image(image_prompt, filename=None, api_key=None, base_url=
         raise Exception(f"Error generating image: {str(e)}")
 
 
+@memory_stage("image.extract")
 def extract_image_from_response(response):
     """
     从响应中提取图像数据 (URL 或 Base64)
@@ -68,7 +305,7 @@ def extract_image_from_response(response):
     target_url = None
     
     if markdown_matches:
-        print(f"  [解析] 发现 Markdown 图片链接: {markdown_matches[0]}")
+        logger.info(f"  [解析] 发现 Markdown 图片链接: {markdown_matches[0]}")
         target_url = markdown_matches[0]
     else:
         # 2. 如果没有 Markdown，尝试匹配纯 URL
@@ -83,45 +320,53 @@ def extract_image_from_response(response):
         for url in url_matches:
             # 简单的启发式过滤：如果包含常见图片后缀或常见CDN关键字
             if any(ext in url.lower() for ext in valid_extensions):
-                print(f"  [解析] 发现潜在图片 URL: {url}")
+                logger.info(f"  [解析] 发现潜在图片 URL: {url}")
                 target_url = url
                 break
     
     # 如果找到了 URL，进行下载
     if target_url:
+        import requests  # 延迟导入，加快程序启动
         try:
-            print(f"  [下载] 正在下载: {target_url[:50]}...")
+            logger.info(f"  [下载] 正在下载: {target_url[:50]}...", extra={'url': target_url})
             # 增加 headers 模拟浏览器，防止某些 CDN 拒绝 python-requests
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
             }
-            url_response = requests.get(target_url, headers=headers, timeout=30)
+            start = time.perf_counter()
+            with span("image.download") as span_args:
+                url_response = requests.get(target_url, headers=headers, timeout=30)
+                span_args['bytes'] = len(url_response.content)
             if url_response.status_code == 200:
-                print(f"  [下载] 成功，大小: {len(url_response.content)} 字节")
+                logger.info(f"  [下载] 成功，大小: {len(url_response.content)} 字节",
+                            extra={'bytes': len(url_response.content),
+                                   'duration_s': round(time.perf_counter() - start, 3)})
                 return url_response.content
             else:
-                print(f"  [下载] 失败，状态码: {url_response.status_code}")
+                logger.warning(f"  [下载] 失败，状态码: {url_response.status_code}",
+                               extra={'status': url_response.status_code, 'url': target_url})
         except Exception as e:
-            print(f"  [下载] 异常: {str(e)}")
+            logger.warning(f"  [下载] 异常: {str(e)}", extra={'url': target_url})
 
     # 3. 查找 Base64 编码
-    print("  [解析] 尝试查找 Base64 数据...")
+    logger.debug("  [解析] 尝试查找 Base64 数据...")
     b64_pattern = r"data:image/\w+;base64,([A-Za-z0-9+/=]+)"
     match = re.search(b64_pattern, response)
     
     if match:
         base64_data = match.group(1)
         try:
-            return base64.b64decode(base64_data)
+            with span("image.decode", chars=len(base64_data)):
+                return base64.b64decode(base64_data)
         except Exception as e:
-            print(f"  [Base64] 解码失败: {e}")
+            logger.warning(f"  [Base64] 解码失败: {e}")
 
     return None
 
 
-def save_image(image_data, filename=None):
+def image_output_path(filename=None, output_dir=None):
     """
-    保存图像数据到文件
+    图像的保存路径，output_dir 默认为 OUTPUT_DIR
     """
     # Create filename if not provided
     if not filename:
@@ -132,21 +377,37 @@ def save_image(image_data, filename=None):
         filename += ".png"
         
     # Full path to save image
-    image_path = os.path.join(OUTPUT_DIR, filename)
+    return os.path.join(ensure_dir(output_dir or OUTPUT_DIR), filename)
+
+
+@memory_stage("image.save")
+def save_image(image_data, filename=None, output_dir=None):
+    """
+    保存图像数据到文件，output_dir 默认为 OUTPUT_DIR
+    """
+    image_path = image_output_path(filename, output_dir)
+    # 目标可能是指向图像缓存的硬链接，先删除再写入，避免改动缓存中的文件
+    if os.path.exists(image_path):
+        os.remove(image_path)
+    
+    from PIL import Image  # 延迟导入，加快程序启动
     
     # Try to use PIL to verify and save (but not force resize to 1440*768)
-    try:
-        image = Image.open(BytesIO(image_data))
-        print(f"  [保存] 图片原始尺寸: {image.size}, 格式: {image.format}")
-        
-        # Save image without resizing to preserve original dimensions
-        image.save(image_path, format="PNG")
-        print(f"  [保存] 保持原始图片尺寸不变")
-        
-    except Exception as e:
-        print(f"  [保存] PIL 处理失败 ({e})，尝试直接写入原始字节...")
-        with open(image_path, 'wb') as f:
-            f.write(image_data)
+    with span("image.save", bytes=len(image_data)):
+        try:
+            image = Image.open(BytesIO(image_data))
+            logger.info(f"  [保存] 图片原始尺寸: {image.size}, 格式: {image.format}",
+                        extra={'bytes': len(image_data), 'path': image_path})
+            
+            # Save image without resizing to preserve original dimensions
+            image.save(image_path, format="PNG")
+            logger.debug("  [保存] 保持原始图片尺寸不变")
+            
+        except Exception as e:
+            logger.warning(f"  [保存] PIL 处理失败 ({e})，尝试直接写入原始字节...",
+                           extra={'bytes': len(image_data), 'path': image_path})
+            with open(image_path, 'wb') as f:
+                f.write(image_data)
     
     return image_path
 
@@ -0,0 +1,211 @@
+"""
+Job Store Module
+Persists the output of each pipeline stage in SQLite so interrupted runs can resume
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import JOB_STORE_PATH
+
+# 流水线各阶段，按执行顺序排列
+STAGES = ('extract', 'llm', 'parse', 'image')
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 hash of a file's content
+
+    Args:
+        file_path (str): Path to the file
+        chunk_size (int): Number of bytes read at a time
+
+    Returns:
+        str: Hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    """
+    Build a stable key from the inputs that determine a stage's output
+
+    Args:
+        *parts: Document hash, prompt, model names, parent keys...
+
+    Returns:
+        str: Hex digest identifying the combination
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part or '').encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class JobStore:
+    def __init__(self, path=None):
+        """
+        Open (and create if needed) the SQLite job store
+
+        Args:
+            path (str): Path to the database file, defaults to JOB_STORE_PATH
+        """
+        self.path = path or JOB_STORE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS stages (
+                key TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                output TEXT,
+                error TEXT,
+                duration_s REAL,
+                meta TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (key, stage)
+            )
+        """)
+        # stages 只保留每个阶段的最新状态，重试成功会覆盖失败记录；每次尝试另外追加一行
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS attempts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                duration_s REAL,
+                meta TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS attempts_stage ON attempts (stage, id)")
+        self._conn.commit()
+
+    def get_stage(self, key, stage):
+        """
+        Look up a completed stage
+
+        Args:
+            key (str): Stage key built with make_key
+            stage (str): One of STAGES
+
+        Returns:
+            dict: output, duration_s and meta of the stage, or None if not completed
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output, duration_s, meta FROM stages WHERE key = ? AND stage = ? AND status = ?",
+                (key, stage, STATUS_DONE)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'output': row[0], 'duration_s': row[1], 'meta': json.loads(row[2]) if row[2] else {}}
+
+    def save_stage(self, key, stage, output, duration_s=None, meta=None):
+        """
+        Record the output of a successfully completed stage
+
+        Args:
+            key (str): Stage key built with make_key
+            stage (str): One of STAGES
+            output (str): Output of the stage
+            duration_s (float): How long the stage took
+            meta (dict): Extra information such as model name or sizes
+        """
+        self._write(key, stage, STATUS_DONE, output, None, duration_s, meta)
+
+    def fail_stage(self, key, stage, error, duration_s=None, meta=None):
+        """
+        Record that a stage failed, without discarding earlier stages or an earlier
+        successful run of the same stage (a failed forced rerun keeps the previous output)
+
+        Args:
+            key (str): Stage key built with make_key
+            stage (str): One of STAGES
+            error (str): Error message
+            duration_s (float): How long the stage ran before failing
+            meta (dict): Extra information such as model name or sizes
+        """
+        self._write(key, stage, STATUS_FAILED, None, error, duration_s, meta)
+
+    def stage_history(self, stage, limit=200):
+        """
+        Recently completed runs of a stage, used to estimate future runs
+
+        Args:
+            stage (str): One of STAGES
+            limit (int): Maximum number of runs returned
+
+        Returns:
+            list: Dicts with duration_s, output_chars and meta, newest first
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT duration_s, length(output), meta FROM stages "
+                "WHERE stage = ? AND status = ? AND duration_s IS NOT NULL ORDER BY updated_at DESC LIMIT ?",
+                (stage, STATUS_DONE, limit)
+            ).fetchall()
+        return [
+            {'duration_s': row[0], 'output_chars': row[1] or 0, 'meta': json.loads(row[2]) if row[2] else {}}
+            for row in rows
+        ]
+
+    def attempt_history(self, stage, limit=200):
+        """
+        Recent attempts of a stage, including failures later replaced by a successful retry,
+        used to route future runs by latency and error rate
+
+        Args:
+            stage (str): One of STAGES
+            limit (int): Maximum number of attempts returned
+
+        Returns:
+            list: Dicts with status, duration_s and meta, newest first
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, duration_s, meta FROM attempts WHERE stage = ? ORDER BY id DESC LIMIT ?",
+                (stage, limit)
+            ).fetchall()
+        return [
+            {'status': row[0], 'duration_s': row[1], 'meta': json.loads(row[2]) if row[2] else {}}
+            for row in rows
+        ]
+
+    def _write(self, key, stage, status, output, error, duration_s, meta):
+        meta_json = json.dumps(meta, ensure_ascii=False) if meta else None
+        now = time.time()
+        with self._lock:
+            # 失败只覆盖之前的失败记录，强制重新运行或重新生成失败时保留已完成的输出，续跑不必重做
+            self._conn.execute(
+                "INSERT INTO stages (key, stage, status, output, error, duration_s, meta, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key, stage) DO UPDATE SET status = excluded.status, output = excluded.output, "
+                "error = excluded.error, duration_s = excluded.duration_s, meta = excluded.meta, "
+                "updated_at = excluded.updated_at WHERE excluded.status = ? OR stages.status != ?",
+                (key, stage, status, output, error, duration_s, meta_json, now, STATUS_DONE, STATUS_DONE)
+            )
+            if duration_s is not None:
+                # 只记录真正执行过的尝试，复用的结果不计耗时也不计入尝试记录
+                self._conn.execute(
+                    "INSERT INTO attempts (stage, status, duration_s, meta, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (stage, status, duration_s, meta_json, now)
+                )
+            self._conn.commit()
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -2,25 +2,133 @@
 LLM Client Module
 Handles communication with various LLM APIs including Gemini and Nano-Banana
 """
-import openai
-from config import API_KEY, BASE_URL, MODEL_NAME, NANO_BANANA_MODEL
+import hashlib
+import time
+from config import (
+    API_KEY, BASE_URL, MODEL_NAME, NANO_BANANA_MODEL, STREAM_RESPONSES, PROMPT_CACHE_HINTS, AUTO_MODEL,
+    MODEL_CANDIDATES
+)
+from tracing import span, get_tracer
+from log_setup import get_logger
 import base64
 
+logger = get_logger(__name__)
+
+
+def default_model(model_name=None):
+    """
+    Concrete analysis model for callers that do not route per document
+
+    Args:
+        model_name (str): Requested model, defaults to MODEL_NAME
+
+    Returns:
+        str: The model, or the first of MODEL_CANDIDATES if it is "auto"
+    """
+    model = model_name or MODEL_NAME
+    if model.strip().lower() == AUTO_MODEL:
+        return MODEL_CANDIDATES[0]
+    return model
+
+
+DOCUMENT_HEADER = "PDF Content:"
+# Anthropic 风格的缓存标记，OpenRouter 等接口会转发给支持显式缓存的模型
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def build_messages(pdf_content, prompt, cache_hints=None):
+    """
+    Build the messages of an analysis request with the stable parts first
+
+    Providers cache the longest previously seen prefix of a request, so the prompt template
+    (identical for every paper using it) goes first as the system message and the document
+    follows as the user message: papers sharing a template reuse the template prefix, and
+    rerunning a paper with the same template reuses the whole request.
+
+    Args:
+        pdf_content (str): Content of the PDF file
+        prompt (str): Prompt template or custom prompt
+        cache_hints (bool): Mark both parts as cacheable, defaults to PROMPT_CACHE_HINTS
+
+    Returns:
+        list: Chat messages
+    """
+    cache_hints = PROMPT_CACHE_HINTS if cache_hints is None else cache_hints
+    parts = [("system", prompt), ("user", f"{DOCUMENT_HEADER}\n{pdf_content}")]
+    messages = []
+    for role, text in parts:
+        if not text:
+            continue
+        if cache_hints:
+            messages.append({"role": role, "content": [{"type": "text", "text": text, "cache_control": CACHE_CONTROL}]})
+        else:
+            messages.append({"role": role, "content": text})
+    return messages
+
+
+def message_text(messages):
+    """
+    Text of the messages, as counted by the token estimator
+
+    Args:
+        messages (list): Chat messages from build_messages
+
+    Returns:
+        str: Contents of all messages joined by blank lines
+    """
+    texts = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            texts.extend(part.get("text", "") for part in content)
+        else:
+            texts.append(content)
+    return "\n\n".join(texts)
+
+
+def read_usage(usage):
+    """
+    Token counts of a response, including prompt tokens served from the provider's cache
+
+    Args:
+        usage: The usage object of a chat completion, or None
+
+    Returns:
+        dict: prompt_tokens, completion_tokens and cached_tokens (empty if no usage was returned)
+    """
+    if usage is None:
+        return {}
+    data = usage.model_dump() if hasattr(usage, "model_dump") else dict(usage)
+    details = data.get("prompt_tokens_details") or {}
+    # OpenAI 兼容接口放在 prompt_tokens_details 中，部分转发 Anthropic 的接口使用 cache_read_input_tokens
+    cached = details.get("cached_tokens") or data.get("cache_read_input_tokens") or 0
+    return {
+        "prompt_tokens": data.get("prompt_tokens"),
+        "completion_tokens": data.get("completion_tokens"),
+        "cached_tokens": cached,
+    }
+
 
 class LLMClient:
-    def __init__(self, api_key=None, base_url=None):
+    def __init__(self, api_key=None, base_url=None, stream=None):
         """
         Initialize the LLM client
         
         Args:
             api_key (str): API key for the service
             base_url (str): Base URL for the API
+            stream (bool): Stream the analysis response, defaults to STREAM_RESPONSES
         """
         self.api_key = api_key or API_KEY
         self.base_url = base_url or BASE_URL
+        self.stream = STREAM_RESPONSES if stream is None else stream
+        # 部分 OpenAI 兼容代理不接受 stream_options，第一次被拒绝后本客户端不再发送
+        self.stream_usage = True
+        
+        import openai  # 延迟导入：openai SDK 加载较慢，只在真正创建客户端时导入
         self.client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url)
         
-    def send_pdf_to_llm(self, pdf_content, prompt, model_name=None):
+    def send_pdf_to_llm(self, pdf_content, prompt, model_name=None, usage=None):
         """
         Send PDF content and prompt to LLM
         
@@ -28,28 +136,108 @@ class LLMClient:
             pdf_content (str): Content of the PDF file
             prompt (str): Prompt to send to the LLM
             model_name (str): Name of the model to use
+            usage (dict): Filled with the token counts of the response (see read_usage)
             
         Returns:
             str: Response from the LLM
         """
-        model = model_name or MODEL_NAME
+        model = default_model(model_name)
         
         try:
-            # Combine prompt with PDF content
-            full_prompt = f"{prompt}\n\nPDF Content:\n{pdf_content}"
+            # Template first, document second, so repeated prefixes can be served from the provider's cache
+            messages = build_messages(pdf_content, prompt)
+            input_chars = len(message_text(messages))
+            options = {}
+            if PROMPT_CACHE_HINTS:
+                # 相同模板的请求使用同一个缓存键，便于接口把它们路由到同一份缓存
+                options['extra_body'] = {'prompt_cache_key': hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:32]}
             
-            chat_completion = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "user", "content": full_prompt}
-                ]
-            )
+            start = time.perf_counter()
+            with span("llm.request", model=model, input_chars=input_chars) as span_args:
+                if self.stream:
+                    content, response_usage = self._stream_completion(model, messages, **options)
+                else:
+                    chat_completion = self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        **options
+                    )
+                    content = chat_completion.choices[0].message.content
+                    response_usage = read_usage(chat_completion.usage)
+                span_args['output_chars'] = len(content or "")
+                span_args.update(response_usage)
+            if usage is not None:
+                usage.update(response_usage)
+            logger.debug(f"LLM 响应完成: {model}",
+                         extra={'model': model, 'input_chars': input_chars,
+                                'output_chars': len(content or ""),
+                                'duration_s': round(time.perf_counter() - start, 3), **response_usage})
+            if response_usage.get('cached_tokens'):
+                logger.info(f"  [缓存] 提示词缓存命中 {response_usage['cached_tokens']:,} / "
+                            f"{response_usage.get('prompt_tokens') or 0:,} 输入 tokens")
             
-            return chat_completion.choices[0].message.content
+            return content
             
         except Exception as e:
             raise Exception(f"Error communicating with LLM: {str(e)}")
             
+    def _stream_completion(self, model, messages, **options):
+        """
+        Stream a chat completion, recording the time to the first chunk as "llm.ttfb"
+        
+        Args:
+            model (str): Name of the model to use
+            messages (list): List of message dictionaries
+            **options: Extra arguments of the create call
+            
+        Returns:
+            tuple: (the concatenated response content, token counts from read_usage)
+        """
+        import openai
+        
+        start = time.perf_counter()
+        stream = None
+        if self.stream_usage:
+            try:
+                stream = self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True},  # 最后一个数据块带有 token 用量
+                    **options
+                )
+            except openai.BadRequestError as e:
+                # 只有接口明确拒绝 stream_options 时才改用不带该参数的请求，上下文超长等其他错误照常报告
+                if 'stream_options' not in f"{e} {getattr(e, 'body', '')}":
+                    raise
+                logger.warning("接口拒绝了 stream_options，改为不带该参数的流式请求 (响应中可能没有 token 用量)",
+                               extra={'model': model, 'error': str(e)})
+        if stream is None:
+            start = time.perf_counter()
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                **options
+            )
+            self.stream_usage = False
+        
+        parts = []
+        usage = {}
+        first_chunk = True
+        for chunk in stream:
+            if first_chunk:
+                first_chunk = False
+                tracer = get_tracer()
+                if tracer is not None:
+                    tracer.add_span("llm.ttfb", start, time.perf_counter() - start, model=model)
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            if getattr(chunk, "usage", None) is not None:
+                usage = read_usage(chunk.usage)
+        
+        return "".join(parts), usage
+            
     def send_image_request_to_nanobanana(self, image_prompt, model_name=None):
         """
         Send image generation request to Nano-Banana
@@ -64,12 +252,17 @@ class LLMClient:
         model = model_name or NANO_BANANA_MODEL
         
         try:
-            chat_completion = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "user", "content": image_prompt}
-                ]
-            )
+            start = time.perf_counter()
+            with span("image.request", model=model):
+                chat_completion = self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "user", "content": image_prompt}
+                    ]
+                )
+            logger.debug(f"图像请求完成: {model}",
+                         extra={'model': model, 'input_chars': len(image_prompt or ""),
+                                'duration_s': round(time.perf_counter() - start, 3)})
             
             return chat_completion.choices[0].message.content
             
@@ -87,7 +280,7 @@ class LLMClient:
         Returns:
             str: Response from the LLM
         """
-        model = model_name or MODEL_NAME
+        model = default_model(model_name)
         
         try:
             chat_completion = self.client.chat.completions.create(
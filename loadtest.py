@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Load tester for the PDF -> LLM -> image pipeline
+以逐级提高的并发数反复运行完整流程，报告吞吐量、各阶段 p50/p95/p99、错误率以及
+客户端 CPU 和内存占用，结果写入 JSON 报告:
+
+    python loadtest.py --fake --latency 0.5 --concurrency 1,2,4,8,16 --runs 32
+    python loadtest.py --base-url https://api.poe.com/v1 --pdf paper.pdf --concurrency 1,2,4
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import API_KEY, BASE_URL, MODEL_NAME, NANO_BANANA_MODEL, PROMPT_TEMPLATES
+from cli import percentile
+from llm_client import LLMClient, default_model
+from pdf_handler import read_pdf_content
+from pipeline import parse_code_block, request_image
+
+STAGES = ('extract', 'llm', 'parse', 'image', 'total')
+
+
+def current_rss_bytes():
+    """当前进程的常驻内存 (RSS)，无法获取时返回 None"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes():
+    """进程启动以来的峰值常驻内存"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class ResourceSampler:
+    def __init__(self, interval=0.2):
+        """
+        Sample the RSS of this process in the background
+
+        Args:
+            interval (float): Seconds between samples
+        """
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = current_rss_bytes()
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_once(client, pdf_path, prompt, model_name, nanobanana_model, output_dir, filename):
+    """
+    Run the pipeline for one paper and time each stage
+
+    Returns:
+        dict: Stage durations in seconds, plus 'error' if a stage failed
+    """
+    timings = {}
+    start = time.perf_counter()
+    stage_start = start
+    stage = 'extract'
+    try:
+        pdf_content = read_pdf_content(pdf_path)
+        timings['extract'] = time.perf_counter() - stage_start
+
+        stage, stage_start = 'llm', time.perf_counter()
+        llm_response = client.send_pdf_to_llm(pdf_content, prompt, model_name)
+        timings['llm'] = time.perf_counter() - stage_start
+
+        stage, stage_start = 'parse', time.perf_counter()
+        code_block = parse_code_block(llm_response)
+        timings['parse'] = time.perf_counter() - stage_start
+
+        stage, stage_start = 'image', time.perf_counter()
+        # 不使用图像缓存：每次都测量真实的图像请求，也不把测试图像写入用户的缓存
+        request_image(client, code_block, nanobanana_model, filename=filename, output_dir=output_dir, cache=False)
+        timings['image'] = time.perf_counter() - stage_start
+    except Exception as e:
+        timings['error'] = f"{stage}: {str(e)}"
+    timings['total'] = time.perf_counter() - start
+    return timings
+
+
+def run_level(concurrency, runs, client, pdf_paths, prompt, model_name, nanobanana_model, output_dir):
+    """
+    Run a fixed number of papers with the given concurrency
+
+    Returns:
+        dict: Report section for this concurrency level
+    """
+    cpu_start = os.times()
+    wall_start = time.perf_counter()
+    with ResourceSampler() as sampler, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(
+                run_once, client, pdf_paths[index % len(pdf_paths)], prompt,
+                model_name, nanobanana_model, output_dir, f"run_{concurrency}_{index}"
+            )
+            for index in range(runs)
+        ]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - wall_start
+    cpu_end = os.times()
+    cpu_seconds = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+
+    succeeded = [r for r in results if 'error' not in r]
+    errors = {}
+    for result in results:
+        if 'error' in result:
+            errors[result['error']] = errors.get(result['error'], 0) + 1
+
+    stages = {}
+    for stage in STAGES:
+        values = [r[stage] for r in succeeded if stage in r]
+        stages[stage] = {
+            'p50_s': round(percentile(values, 50), 4),
+            'p95_s': round(percentile(values, 95), 4),
+            'p99_s': round(percentile(values, 99), 4),
+            'max_s': round(max(values), 4) if values else 0.0
+        }
+
+    return {
+        'concurrency': concurrency,
+        'runs': runs,
+        'succeeded': len(succeeded),
+        'error_rate': round(1 - len(succeeded) / runs, 4) if runs else 0.0,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_min': round(len(succeeded) / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        'stages': stages,
+        'client': {
+            'cpu_seconds': round(cpu_seconds, 3),
+            'cpu_utilization': round(cpu_seconds / elapsed, 3) if elapsed > 0 else 0.0,
+            'rss_max_bytes': max(sampler.samples) if sampler.samples else None,
+            'peak_rss_bytes': peak_rss_bytes()
+        }
+    }
+
+
+def find_saturation(levels, min_gain=0.1):
+    """
+    Find the first concurrency level after which throughput stops growing
+
+    Args:
+        levels (list): Level reports in increasing concurrency order
+        min_gain (float): Relative throughput gain below which the pipeline counts as saturated
+
+    Returns:
+        int: Saturating concurrency, or None if throughput kept growing
+    """
+    for previous, level in zip(levels, levels[1:]):
+        if previous['throughput_per_min'] <= 0:
+            continue
+        gain = level['throughput_per_min'] / previous['throughput_per_min'] - 1
+        if gain < min_gain:
+            return previous['concurrency']
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PDF to Image Generator 负载测试")
+    parser.add_argument('--concurrency', default='1,2,4,8', help="逐级测试的并发数，逗号分隔 (默认: 1,2,4,8)")
+    parser.add_argument('--runs', type=int, default=None, help="每级运行的论文数 (默认: 并发数的 4 倍)")
+    parser.add_argument('--pdf', action='append', help="使用的 PDF 文件，可重复；不指定则生成合成 PDF")
+    parser.add_argument('--pages', type=int, default=20, help="合成 PDF 的页数 (默认: 20)")
+    parser.add_argument('--template', default=list(PROMPT_TEMPLATES.keys())[0], help="提示词模板名称")
+    parser.add_argument('--fake', action='store_true', help="启动本地模拟接口代替真实 API")
+    parser.add_argument('--latency', type=float, default=0.5, help="模拟接口的分析请求延迟（秒）")
+    parser.add_argument('--image-latency', type=float, default=None, help="模拟接口的图像请求延迟（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="模拟接口返回错误的比例")
+    parser.add_argument('--api-key', default=os.getenv('POE_API_KEY', API_KEY))
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--model', default=MODEL_NAME)
+    parser.add_argument('--image-model', default=NANO_BANANA_MODEL)
+    parser.add_argument('--report', default='loadtest_report.json', help="JSON 报告路径")
+    args = parser.parse_args(argv)
+    # 负载测试固定使用一个模型，auto 时取第一个候选模型，使各并发级别之间可比
+    args.model = default_model(args.model)
+
+    levels = [int(value) for value in args.concurrency.split(',') if value.strip()]
+    work_dir = tempfile.mkdtemp(prefix='loadtest_')
+    fake_server = None
+    try:
+        if args.fake:
+            from fake_api import FakeAPIServer
+            fake_server = FakeAPIServer(
+                latency=args.latency, image_latency=args.image_latency, error_rate=args.error_rate,
+                image_models=(args.image_model,)
+            ).start()
+            args.base_url = fake_server.base_url
+            args.api_key = args.api_key or 'loadtest'
+        if not args.api_key:
+            print("✗ 错误: 请设置 POE_API_KEY 环境变量、使用 --api-key 或 --fake")
+            return 1
+
+        pdf_paths = args.pdf
+        if not pdf_paths:
+            from benchmarks.fixtures import make_pdf
+            pdf_paths = [make_pdf(os.path.join(work_dir, 'synthetic.pdf'), args.pages)]
+
+        client = LLMClient(api_key=args.api_key, base_url=args.base_url)
+        prompt = PROMPT_TEMPLATES[args.template]
+        output_dir = os.path.join(work_dir, 'output')
+
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'base_url': args.base_url,
+            'fake': args.fake,
+            'model': args.model,
+            'image_model': args.image_model,
+            'pdfs': [os.path.basename(path) for path in pdf_paths],
+            'levels': []
+        }
+        for concurrency in levels:
+            runs = args.runs or concurrency * 4
+            print(f"并发 {concurrency}: 运行 {runs} 篇论文...")
+            level = run_level(
+                concurrency, runs, client, pdf_paths, prompt, args.model, args.image_model, output_dir
+            )
+            report['levels'].append(level)
+            total = level['stages']['total']
+            print(f"  吞吐量 {level['throughput_per_min']:.1f} 篇/分钟, 错误率 {level['error_rate']:.1%}, "
+                  f"端到端 p50 {total['p50_s']:.2f}s p95 {total['p95_s']:.2f}s p99 {total['p99_s']:.2f}s, "
+                  f"CPU {level['client']['cpu_utilization']:.0%}")
+
+        report['saturation_concurrency'] = find_saturation(report['levels'])
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        if report['saturation_concurrency'] is not None:
+            print(f"吞吐量在并发 {report['saturation_concurrency']} 之后不再明显增长")
+        print(f"报告已保存: {args.report}")
+        return 0
+    finally:
+        if fake_server is not None:
+            fake_server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
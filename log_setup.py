@@ -0,0 +1,199 @@
+"""
+Logging Setup Module
+Non-blocking structured logging: pipeline threads only enqueue records, a listener thread
+writes them to the GUI log, the console and a rotating JSONL file
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+
+from config import LOG_FILE, LOG_FILE_MAX_MB, LOG_FILE_BACKUPS, LOG_LEVEL
+
+# 本项目所有模块的日志器都在这个名称下，不接收第三方库 (httpx 等) 的日志
+LOGGER_NAME = 'pdf2img'
+
+# 当前任务和阶段，由 ContextFilter 附加到日志记录上
+_job_id = contextvars.ContextVar('log_job_id', default=None)
+_stage = contextvars.ContextVar('log_stage', default=None)
+
+# LogRecord 自带的属性；其余属性 (通过 extra= 传入) 视为结构化字段
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+def get_logger(name):
+    """
+    Logger of a project module
+
+    Args:
+        name (str): Module name, usually __name__
+
+    Returns:
+        logging.Logger: Child of the project logger
+    """
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+@contextmanager
+def log_context(job_id=None, stage=None):
+    """
+    Attach a job ID and/or stage to every record logged in the enclosed block
+    (and in functions wrapped with tracing.bind_context)
+
+    Args:
+        job_id (str): Job the records belong to, None keeps the current one
+        stage (str): Pipeline stage, None keeps the current one
+    """
+    tokens = []
+    if job_id is not None:
+        tokens.append((_job_id, _job_id.set(str(job_id))))
+    if stage is not None:
+        tokens.append((_stage, _stage.set(stage)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def record_fields(record):
+    """
+    Structured fields of a record: job_id, stage and everything passed with extra=
+
+    Args:
+        record (logging.LogRecord): Log record
+
+    Returns:
+        dict: Field name -> value, fields that are None are left out
+    """
+    return {
+        key: value for key, value in vars(record).items()
+        if key not in _RECORD_ATTRIBUTES and value is not None
+    }
+
+
+class ContextFilter(logging.Filter):
+    """在发出日志的线程中附加当前的任务编号和阶段（监听线程中已取不到上下文）"""
+
+    def filter(self, record):
+        if getattr(record, 'job_id', None) is None:
+            record.job_id = _job_id.get()
+        if getattr(record, 'stage', None) is None:
+            record.stage = _stage.get()
+        return True
+
+
+class JsonlFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，包含结构化字段"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LogBufferHandler(logging.Handler):
+    def __init__(self, buffer, level=logging.NOTSET):
+        """
+        Forward records to the GUI log buffer, under the job they belong to
+
+        Args:
+            buffer (LogBuffer): Buffer shown by the GUI log view
+            level (int): Minimum level forwarded
+        """
+        super().__init__(level)
+        self.buffer = buffer
+
+    def emit(self, record):
+        try:
+            self.buffer.append(getattr(record, 'job_id', None), self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def setup_logging(log_buffer=None, console=False, log_file=None, level=None):
+    """
+    Route project log records through a queue to the GUI, the console and a JSONL file
+
+    Emitting a record only formats the message and puts it on an unbounded queue, so
+    pipeline threads never wait for a slow terminal, disk or GUI. Calling this again
+    replaces the previous configuration.
+
+    Args:
+        log_buffer (LogBuffer): GUI log buffer to forward records to
+        console (bool): Also print records to stdout
+        log_file (str): Rotating JSONL file, defaults to LOG_FILE; '' disables the file
+        level (str): Level shown in the GUI and console, defaults to LOG_LEVEL
+
+    Returns:
+        logging.handlers.QueueListener: The running listener
+    """
+    global _listener, _queue_handler
+    level = level or LOG_LEVEL
+    log_file = LOG_FILE if log_file is None else log_file
+
+    handlers = []
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_FILE_MAX_MB * 1024 * 1024, backupCount=LOG_FILE_BACKUPS,
+            encoding='utf-8', delay=True
+        )
+        file_handler.setFormatter(JsonlFormatter())
+        file_handler.setLevel(logging.DEBUG)
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter('%(message)s'))
+        console_handler.setLevel(level)
+        handlers.append(console_handler)
+    if log_buffer is not None:
+        buffer_handler = LogBufferHandler(log_buffer, level)
+        buffer_handler.setFormatter(logging.Formatter('%(message)s'))
+        handlers.append(buffer_handler)
+
+    with _setup_lock:
+        _stop()
+        records = queue.SimpleQueue()
+        _queue_handler = logging.handlers.QueueHandler(records)
+        _queue_handler.addFilter(ContextFilter())
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.addHandler(_queue_handler)
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def _stop():
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger(LOGGER_NAME).removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()  # 写完队列中剩余的日志
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def shutdown_logging():
+    """写完队列中的日志并关闭日志文件"""
+    with _setup_lock:
+        _stop()
@@ -0,0 +1,155 @@
+"""
+Log View Module
+Thread-safe log buffer and a QPlainTextEdit that shows it in timed batches
+"""
+import threading
+from collections import OrderedDict, deque
+
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QPlainTextEdit
+
+
+class LogBuffer:
+    def __init__(self, max_lines=5000, max_job_lines=None):
+        """
+        Ring buffer of log lines that worker threads can append to directly
+
+        Args:
+            max_lines (int): Number of lines kept overall and per job, older lines are dropped
+            max_job_lines (int): Number of per-job lines kept across all jobs, defaults to ten
+                times max_lines; the jobs that logged least recently are dropped first
+        """
+        self.max_lines = max_lines
+        self.max_job_lines = max(max_job_lines or max_lines * 10, max_lines)
+        self._lines = deque(maxlen=max_lines)  # (job_id, message)
+        # job_id -> deque，单个任务的日志不会被其他任务挤掉；按最近使用排序，超出总行数时丢弃最久未用的任务
+        self._job_lines = OrderedDict()
+        self._job_line_count = 0
+        self._pending = deque(maxlen=max_lines)  # 尚未显示的行
+        self._overflowed = False
+        self._lock = threading.Lock()
+
+    def append(self, job_id, message):
+        """
+        Record a message, safe to call from any thread
+
+        Args:
+            job_id (str): Job that produced the message, None for application messages
+            message (str): Log text
+        """
+        entry = (job_id, message)
+        with self._lock:
+            self._lines.append(entry)
+            if job_id is not None:
+                self._append_job_line(job_id, entry)
+            if len(self._pending) == self.max_lines:
+                self._overflowed = True
+            self._pending.append(entry)
+
+    def _append_job_line(self, job_id, entry):
+        lines = self._job_lines.get(job_id)
+        if lines is None:
+            lines = self._job_lines[job_id] = deque(maxlen=self.max_lines)
+        else:
+            self._job_lines.move_to_end(job_id)
+        if len(lines) < self.max_lines:
+            self._job_line_count += 1
+        lines.append(entry)
+        while self._job_line_count > self.max_job_lines:
+            _, evicted = self._job_lines.popitem(last=False)
+            self._job_line_count -= len(evicted)
+
+    def take_pending(self):
+        """
+        Remove and return the messages recorded since the last call
+
+        Returns:
+            tuple: (list of (job_id, message), whether older pending lines were dropped)
+        """
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+            overflowed, self._overflowed = self._overflowed, False
+        return pending, overflowed
+
+    def lines(self, job_id=None):
+        """
+        Snapshot of the buffered lines
+
+        Args:
+            job_id (str): Only return lines of this job, None returns all lines
+
+        Returns:
+            list: (job_id, message) tuples, oldest first
+        """
+        with self._lock:
+            if job_id is None:
+                return list(self._lines)
+            if job_id not in self._job_lines:
+                return []
+            self._job_lines.move_to_end(job_id)  # 正在查看的任务最后淘汰
+            return list(self._job_lines[job_id])
+
+
+class LogView(QPlainTextEdit):
+    def __init__(self, buffer, flush_interval_ms=100, parent=None):
+        """
+        Read-only log widget that redraws at most once per flush interval
+
+        Args:
+            buffer (LogBuffer): Buffer the messages are read from
+            flush_interval_ms (int): Milliseconds between batched updates
+            parent (QWidget): Parent widget
+        """
+        super().__init__(parent)
+        self.buffer = buffer
+        self.job_id = None
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+        self.setMaximumBlockCount(buffer.max_lines)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(flush_interval_ms)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def format_line(self, job_id, message):
+        # 全部日志中给任务消息加上任务编号
+        if self.job_id is None and job_id is not None:
+            return f"[#{job_id}] {message}"
+        return message
+
+    def set_filter(self, job_id):
+        """
+        Show only one job's lines, or all lines
+
+        Args:
+            job_id (str): Job to show, None shows all jobs
+        """
+        self.job_id = job_id
+        self.buffer.take_pending()
+        self.setPlainText("\n".join(self.format_line(*entry) for entry in self.buffer.lines(job_id)))
+        self.scroll_to_bottom()
+
+    def flush(self):
+        """把缓冲区中的新消息一次性追加到文本框"""
+        pending, overflowed = self.buffer.take_pending()
+        if overflowed:
+            # 两次刷新之间的消息超过缓冲区容量，直接按缓冲区重建
+            self.set_filter(self.job_id)
+            return
+        if self.job_id is not None:
+            pending = [entry for entry in pending if entry[0] == self.job_id]
+        if not pending:
+            return
+
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        self.appendPlainText("\n".join(self.format_line(*entry) for entry in pending))
+        # 用户向上翻看时不强制滚动
+        if at_bottom:
+            self.scroll_to_bottom()
+
+    def scroll_to_bottom(self):
+        scrollbar = self.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
@@ -6,7 +6,9 @@ PDF to Image Generator Application
 
 import sys
 import os
-import subprocess
+import threading
+import importlib
+import time
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -15,47 +17,143 @@ from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
     QLabel, QPushButton, QLineEdit, QTextEdit, QFileDialog, 
     QMessageBox, QTabWidget, QComboBox, QScrollArea, QGroupBox,
-    QSizePolicy
+    QSizePolicy, QCheckBox, QSpinBox, QSplitter, QTableWidget,
+    QTableWidgetItem, QProgressBar, QHeaderView, QAbstractItemView
 )
-from PySide6.QtCore import Qt, QThread, Signal, Slot
+from PySide6.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, Signal, Slot
 from PySide6.QtGui import QFont, QPalette
 
 # 导入自定义模块
-from pdf_handler import read_pdf_content, get_pdf_info
 from llm_client import LLMClient
-from code_parser import extract_last_code_block
-from image_generator import generate_and_save_image
-from config import API_KEY, BASE_URL, MODEL_NAME, NANO_BANANA_MODEL, PROMPT_TEMPLATES
+from job_store import JobStore, hash_file
+from pipeline import (
+    run_fanout, stage_keys, extract_pdf, request_llm, parse_code_block, request_image, safe_filename,
+    create_job_dir, write_manifest, route_model
+)
+from model_router import get_router, is_auto
+from gallery import GalleryWidget, open_path
+from log_view import LogBuffer, LogView
+from log_setup import setup_logging, shutdown_logging, log_context
+from prefetch import PdfPrefetcher
+from token_estimator import estimate_request, format_estimate, load_history, summarize_estimates
+from tracing import Tracer, use_tracer
+from memprofile import MemoryProfiler, use_profiler
+from config import (
+    API_KEY, BASE_URL, MODEL_NAME, NANO_BANANA_MODEL, PROMPT_TEMPLATES, TRACE_DIR, OUTPUT_DIR, DATA_DIR, LOG_VIEW_MAX_LINES,
+    MEMORY_PROFILE, ensure_dir
+)
+
+
+def report_trace(tracer, pdf_file_path, log):
+    """在任务日志中输出各阶段耗时汇总，并导出 Chrome trace 文件"""
+    if not tracer.spans:
+        return
+    log("耗时统计:")
+    for line in tracer.format_summary():
+        log(f"  {line}")
+    stem = safe_filename(os.path.splitext(os.path.basename(pdf_file_path))[0])
+    try:
+        trace_path = tracer.export_chrome_trace(
+            os.path.join(TRACE_DIR, f"{stem}_{time.strftime('%Y%m%d_%H%M%S')}.trace.json")
+        )
+        log(f"  Trace 文件 (chrome://tracing): {trace_path}")
+    except Exception as e:
+        log(f"⚠ 无法导出 Trace 文件: {str(e)}")
+
+
+def report_memory(profiler, pdf_file_path, log):
+    """在任务日志中输出各阶段内存占用汇总，并写入内存报告文件"""
+    if profiler is None or not profiler.records:
+        return
+    log("内存统计:")
+    for line in profiler.format_summary():
+        log(f"  {line}")
+    stem = safe_filename(os.path.splitext(os.path.basename(pdf_file_path))[0])
+    try:
+        report_path = profiler.write_report(
+            os.path.join(TRACE_DIR, f"{stem}_{time.strftime('%Y%m%d_%H%M%S')}.memory.json")
+        )
+        log(f"  内存报告: {report_path}")
+    except Exception as e:
+        log(f"⚠ 无法写入内存报告: {str(e)}")
+
+
+class PrefetchSignals(QObject):
+    """把后台预读取线程得到的PDF信息转交给主线程"""
+    info_ready = Signal(str, object)  # (path, info)
+    info_failed = Signal(str, str)  # (path, message)
+    estimate_ready = Signal(int, str, object)  # (generation, path, estimate)
 
 
-class WorkerThread(QThread):
-    """工作线程，用于在后台处理PDF"""
-    log_signal = Signal(str)
-    finished_signal = Signal(bool, str)  # (success, message)
+class JobSignals(QObject):
+    """任务信号，QRunnable 本身不能发送信号；日志直接写入 LogBuffer，不经过信号"""
+    progress_signal = Signal(str, int, int)  # (job_id, step, total_steps)，total_steps 为 0 表示进度未知
+    finished_signal = Signal(str, bool, str)  # (job_id, success, message)
+
+
+class PipelineJob(QRunnable):
+    """任务队列中的单个任务，在线程池中处理一个PDF"""
+    TOTAL_STEPS = 6
     
-    def __init__(self, pdf_file_path, api_key, base_url, model_name, nanobanana_model, prompt):
+    def __init__(self, job_id, pdf_file_path, api_key, base_url, model_name, nanobanana_model, prompt, store,
+                 log_buffer, prefetcher=None, prompt_label="自定义", regenerate=False):
         super().__init__()
+        self.job_id = job_id
         self.pdf_file_path = pdf_file_path
         self.api_key = api_key
         self.base_url = base_url
         self.model_name = model_name
         self.nanobanana_model = nanobanana_model
         self.prompt = prompt
+        self.prompt_label = prompt_label
+        self.regenerate = regenerate
+        self.store = store
+        self.log_buffer = log_buffer
+        self.prefetcher = prefetcher
+        self.signals = JobSignals()
         
     def log_message(self, message):
-        """发送日志消息到主线程"""
-        self.log_signal.emit(message)
+        """记录日志，由界面定时批量显示"""
+        self.log_buffer.append(self.job_id, message)
+        
+    def step(self, number, message):
+        """记录步骤日志并更新进度"""
+        self.signals.progress_signal.emit(self.job_id, number, self.TOTAL_STEPS)
+        self.log_message(f"步骤 {number}/{self.TOTAL_STEPS}: {message}")
         
     def run(self):
-        """在后台线程中处理PDF的实际工作"""
+        """在线程池中运行任务，并记录各阶段耗时"""
+        tracer = Tracer(os.path.basename(self.pdf_file_path))
+        profiler = MemoryProfiler(os.path.basename(self.pdf_file_path)) if MEMORY_PROFILE else None
+        with use_tracer(tracer), use_profiler(profiler), log_context(job_id=self.job_id):
+            success, message = self.process()
+        report_trace(tracer, self.pdf_file_path, self.log_message)
+        report_memory(profiler, self.pdf_file_path, self.log_message)
+        self.signals.finished_signal.emit(self.job_id, success, message)
+        
+    def process(self):
+        """处理PDF的实际工作，返回 (success, message)"""
         try:
-            # 读取PDF内容
-            self.log_message("步骤 1/6: 正在读取PDF内容...")
-            pdf_content = read_pdf_content(self.pdf_file_path)
+            store = self.store
+            
+            # 读取PDF内容，选择文件时已在后台开始预读取
+            self.step(1, "正在读取PDF内容...")
+            prefetched = self.prefetcher.take(self.pdf_file_path) if self.prefetcher else None
+            if prefetched is not None:
+                doc_hash, pdf_content = prefetched
+                self.log_message("✓ 使用后台预读取的PDF内容")
+            else:
+                doc_hash = hash_file(self.pdf_file_path)
+                pdf_content = extract_pdf(self.pdf_file_path, store, doc_hash, self.log_message)
             self.log_message(f"✓ PDF内容读取完成，共 {len(pdf_content)} 个字符")
+            model_name = route_model(
+                self.model_name, pdf_content, self.prompt, store, doc_hash, self.nanobanana_model,
+                name=os.path.basename(self.pdf_file_path)
+            )
+            keys = stage_keys(doc_hash, self.prompt, model_name, self.nanobanana_model)
             
             # 初始化LLM客户端
-            self.log_message("步骤 2/6: 正在连接到大语言模型...")
+            self.step(2, "正在连接到大语言模型...")
             client = LLMClient(
                 api_key=self.api_key,
                 base_url=self.base_url
@@ -63,8 +161,10 @@ class WorkerThread(QThread):
             self.log_message("✓ 大语言模型连接成功")
             
             # 发送请求到大语言模型
-            self.log_message("步骤 3/6: 正在发送请求到大语言模型...")
-            llm_response = client.send_pdf_to_llm(pdf_content, self.prompt, self.model_name)
+            self.step(3, "正在发送请求到大语言模型...")
+            llm_response = request_llm(
+                client, pdf_content, self.prompt, model_name, store, keys['llm'], self.log_message
+            )
             self.log_message("✓ 大语言模型响应接收完成")
             
             # 显示LLM响应摘要
@@ -72,42 +172,109 @@ class WorkerThread(QThread):
             self.log_message(f"  响应长度: {response_length} 字符")
             
             # 提取代码块
-            self.log_message("步骤 4/6: 正在提取代码块...")
-            code_block = extract_last_code_block(llm_response)
-            
-            if not code_block:
+            self.step(4, "正在提取代码块...")
+            try:
+                code_block = parse_code_block(llm_response, store, keys['parse'], self.log_message)
+            except Exception:
                 self.log_message("⚠ 未在大语言模型响应中找到代码块")
-                self.finished_signal.emit(False, "未在大语言模型响应中找到代码块")
-                return
+                return False, "未在大语言模型响应中找到代码块"
                 
             self.log_message("✓ 代码块提取完成")
             code_length = len(code_block) if code_block else 0
             self.log_message(f"  代码块长度: {code_length} 字符")
             
             # 使用Nano-Banana生成图像
-            self.log_message("步骤 5/6: 正在使用Nano-Banana生成图像...")
+            self.step(5, "正在使用Nano-Banana生成图像...")
             # 直接使用提取的代码块作为图像生成提示词
-            image_path = generate_and_save_image(
-                code_block,
-                api_key=self.api_key,
-                base_url=self.base_url,
-                model_name=self.nanobanana_model
+            # 每个任务有独立的输出目录，和多模板对比、批处理的输出结构一致
+            job_dir = create_job_dir(self.pdf_file_path)
+            image_path = request_image(
+                client, code_block, self.nanobanana_model,
+                filename=safe_filename(self.prompt_label), output_dir=job_dir,
+                store=store, key=keys['image'], log=self.log_message, regenerate=self.regenerate
+            )
+            write_manifest(
+                job_dir, self.pdf_file_path, model_name, self.nanobanana_model,
+                {self.prompt_label: {'image_path': image_path}}
             )
             self.log_message("✓ 图像生成完成")
             
             # 完成
-            self.log_message("步骤 6/6: 图像已成功生成并保存")
+            self.step(6, "图像已成功生成并保存")
             self.log_message(f"保存路径: {image_path}")
-            self.finished_signal.emit(True, "处理完成")
+            return True, "处理完成"
+        except Exception as e:
+            self.log_message(f"✗ 处理过程中出现错误: {str(e)}")
+            return False, str(e)
+
+
+class FanOutJob(QRunnable):
+    """任务队列中的多模板对比任务，只读取一次PDF并并发运行多个提示词模板"""
+    
+    def __init__(self, job_id, pdf_file_path, api_key, base_url, model_name, nanobanana_model, template_names, store,
+                 log_buffer, prefetcher=None, regenerate=False):
+        super().__init__()
+        self.job_id = job_id
+        self.pdf_file_path = pdf_file_path
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model_name = model_name
+        self.nanobanana_model = nanobanana_model
+        self.template_names = template_names
+        self.regenerate = regenerate
+        self.store = store
+        self.log_buffer = log_buffer
+        self.prefetcher = prefetcher
+        self.signals = JobSignals()
+        
+    def log_message(self, message):
+        """记录日志，由界面定时批量显示"""
+        self.log_buffer.append(self.job_id, message)
+        
+    def run(self):
+        """在线程池中运行任务，并记录各阶段耗时"""
+        tracer = Tracer(os.path.basename(self.pdf_file_path))
+        profiler = MemoryProfiler(os.path.basename(self.pdf_file_path)) if MEMORY_PROFILE else None
+        with use_tracer(tracer), use_profiler(profiler), log_context(job_id=self.job_id):
+            success, message = self.process()
+        report_trace(tracer, self.pdf_file_path, self.log_message)
+        report_memory(profiler, self.pdf_file_path, self.log_message)
+        self.signals.finished_signal.emit(self.job_id, success, message)
+        
+    def process(self):
+        """运行多模板对比，返回 (success, message)"""
+        try:
+            self.signals.progress_signal.emit(self.job_id, 0, 0)
+            self.log_message(f"多模板对比: {', '.join(self.template_names)}")
+            job = run_fanout(
+                self.pdf_file_path,
+                self.template_names,
+                api_key=self.api_key,
+                base_url=self.base_url,
+                model_name=self.model_name,
+                nanobanana_model=self.nanobanana_model,
+                log=self.log_message,
+                store=self.store,
+                prefetched=self.prefetcher.take(self.pdf_file_path) if self.prefetcher else None,
+                regenerate=self.regenerate
+            )
+            failed = [name for name, result in job['results'].items() if 'error' in result]
+            for name, result in job['results'].items():
+                if 'image_path' in result:
+                    self.log_message(f"[{name}] 保存路径: {result['image_path']}")
+            if failed:
+                return False, f"以下模板处理失败: {', '.join(failed)}"
+            else:
+                return True, "处理完成"
         except Exception as e:
             self.log_message(f"✗ 处理过程中出现错误: {str(e)}")
-            self.finished_signal.emit(False, str(e))
+            return False, str(e)
 
 
 class PDFImageGeneratorApp(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.pdf_file_path = ""
+        self.pdf_file_paths = []
         self.prompt_templates = PROMPT_TEMPLATES
         self.selected_template = list(PROMPT_TEMPLATES.keys())[0]  # 默认选择第一个模板
         
@@ -117,6 +284,23 @@ class PDFImageGeneratorApp(QMainWindow):
         self.model_name = MODEL_NAME
         self.nanobanana_model = NANO_BANANA_MODEL
         
+        # 任务队列：线程池并发处理多个PDF，大部分时间都在等待网络
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(3)
+        self.job_store = None
+        self.prefetcher = None
+        self.prefetch_signals = PrefetchSignals()
+        self.prefetch_signals.info_ready.connect(self.on_pdf_info)
+        self.prefetch_signals.info_failed.connect(self.on_pdf_info_failed)
+        self.prefetch_signals.estimate_ready.connect(self.on_pdf_estimate)
+        self.pdf_infos = {}
+        self.pdf_estimates = {}
+        self.estimate_generation = 0  # 提示词或模型变化后丢弃旧的预估结果
+        self.jobs = {}  # job_id -> {'row': int, 'runnable': QRunnable}
+        self.next_job_id = 1
+        self.log_buffer = LogBuffer(LOG_VIEW_MAX_LINES)
+        setup_logging(log_buffer=self.log_buffer)  # 各模块的日志按任务写入日志缓冲区和 JSONL 文件
+        
         self.init_ui()
         
     def init_ui(self):
@@ -149,6 +333,7 @@ class PDFImageGeneratorApp(QMainWindow):
         self.create_file_selection_tab()
         self.create_prompt_settings_tab()
         self.create_result_tab()
+        self.create_gallery_tab()
         
         # 创建按钮区域
         self.create_button_area(main_layout)
@@ -210,6 +395,8 @@ class PDFImageGeneratorApp(QMainWindow):
         model_label.setFixedWidth(120)
         self.model_input = QLineEdit()
         self.model_input.setText(self.model_name)
+        self.model_input.setToolTip("填写 auto 时按文档长度和各模型最近的耗时、失败率自动选择模型")
+        self.model_input.editingFinished.connect(self.update_estimates)
         model_hbox.addWidget(model_label)
         model_hbox.addWidget(self.model_input)
         api_key_layout.addLayout(model_hbox)
@@ -220,6 +407,7 @@ class PDFImageGeneratorApp(QMainWindow):
         nanobanana_label.setFixedWidth(120)
         self.nanobanana_input = QLineEdit()
         self.nanobanana_input.setText(self.nanobanana_model)
+        self.nanobanana_input.editingFinished.connect(self.update_estimates)
         nanobanana_hbox.addWidget(nanobanana_label)
         nanobanana_hbox.addWidget(self.nanobanana_input)
         api_key_layout.addLayout(nanobanana_hbox)
@@ -240,7 +428,7 @@ class PDFImageGeneratorApp(QMainWindow):
         file_layout = QVBoxLayout(file_group)
         
         file_hbox = QHBoxLayout()
-        file_label = QLabel("选择的文件:")
+        file_label = QLabel("选择的文件:")  # 支持多选
         file_label.setFixedWidth(100)
         self.file_path_input = QLineEdit()
         self.file_path_input.setReadOnly(True)
@@ -257,6 +445,12 @@ class PDFImageGeneratorApp(QMainWindow):
         self.pdf_info_label.setStyleSheet("color: #7f8c8d;")
         file_layout.addWidget(self.pdf_info_label)
         
+        # 预估输入 tokens、费用和耗时
+        self.estimate_label = QLabel("")
+        self.estimate_label.setWordWrap(True)
+        self.estimate_label.setStyleSheet("color: #7f8c8d;")
+        file_layout.addWidget(self.estimate_label)
+        
         layout.addWidget(file_group)
         layout.addStretch()
         
@@ -284,6 +478,17 @@ class PDFImageGeneratorApp(QMainWindow):
         
         layout.addWidget(template_group)
         
+        # 多模板对比：勾选后只读取一次PDF，并发生成每个模板的图像
+        fanout_group = QGroupBox("多模板对比（勾选后忽略自定义提示词）")
+        fanout_layout = QHBoxLayout(fanout_group)
+        self.fanout_checkboxes = {}
+        for template_name in self.prompt_templates:
+            checkbox = QCheckBox(template_name)
+            fanout_layout.addWidget(checkbox)
+            self.fanout_checkboxes[template_name] = checkbox
+        fanout_layout.addStretch()
+        layout.addWidget(fanout_group)
+        
         # 默认提示词显示
         default_prompt_group = QGroupBox("选定模板内容（只读）")
         default_prompt_layout = QVBoxLayout(default_prompt_group)
@@ -304,25 +509,75 @@ class PDFImageGeneratorApp(QMainWindow):
         custom_prompt_layout.addWidget(self.prompt_text)
         layout.addWidget(custom_prompt_group)
         
+        # 默认复用相同图像提示词生成过的图像
+        self.regenerate_checkbox = QCheckBox("重新生成图像（不使用缓存中相同提示词的图像）")
+        layout.addWidget(self.regenerate_checkbox)
+        
         layout.addStretch()
         self.tab_widget.addTab(prompt_widget, "提示词设置")
         
     def create_result_tab(self):
-        """创建处理结果标签页"""
+        """创建处理结果标签页：上方为任务队列，下方为所选任务的日志"""
         result_widget = QWidget()
         layout = QVBoxLayout(result_widget)
+        splitter = QSplitter(Qt.Orientation.Vertical)
+        
+        # 任务队列，每行一个任务
+        self.job_table = QTableWidget(0, 4)
+        self.job_table.setHorizontalHeaderLabels(["文件", "提示词", "状态", "进度"])
+        self.job_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.job_table.verticalHeader().setVisible(False)
+        self.job_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.job_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.job_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.job_table.itemSelectionChanged.connect(self.refresh_log_view)
+        splitter.addWidget(self.job_table)
         
         # 结果显示区域
-        self.result_text = QTextEdit()
-        self.result_text.setReadOnly(True)
-        layout.addWidget(self.result_text)
+        log_widget = QWidget()
+        log_layout = QVBoxLayout(log_widget)
+        log_layout.setContentsMargins(0, 0, 0, 0)
+        log_hbox = QHBoxLayout()
+        self.log_title_label = QLabel("全部日志")
+        show_all_button = QPushButton("显示全部日志")
+        show_all_button.clicked.connect(self.job_table.clearSelection)
+        log_hbox.addWidget(self.log_title_label)
+        log_hbox.addStretch()
+        log_hbox.addWidget(show_all_button)
+        log_layout.addLayout(log_hbox)
+        self.result_text = LogView(self.log_buffer)
+        log_layout.addWidget(self.result_text)
+        splitter.addWidget(log_widget)
+        
+        splitter.setStretchFactor(1, 1)
+        layout.addWidget(splitter)
         
         self.tab_widget.addTab(result_widget, "处理结果")
         
+    def create_gallery_tab(self):
+        """创建图库标签页，切换到该页时在后台重新扫描输出目录"""
+        self.gallery = GalleryWidget(OUTPUT_DIR, os.path.join(DATA_DIR, 'thumbnails'))
+        self.gallery_index = self.tab_widget.addTab(self.gallery, "图库")
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
+        
+    @Slot(int)
+    def on_tab_changed(self, index):
+        if index == self.gallery_index:
+            self.gallery.refresh()
+            
     def create_button_area(self, main_layout):
         """创建底部按钮区域"""
         button_layout = QHBoxLayout()
         
+        # 最大并发数
+        concurrency_label = QLabel("最大并发数:")
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 16)
+        self.concurrency_spin.setValue(self.thread_pool.maxThreadCount())
+        self.concurrency_spin.valueChanged.connect(self.thread_pool.setMaxThreadCount)
+        button_layout.addWidget(concurrency_label)
+        button_layout.addWidget(self.concurrency_spin)
+        
         # 处理PDF按钮
         self.process_button = QPushButton("处理PDF并生成图像")
         self.process_button.setStyleSheet("""
@@ -392,35 +647,135 @@ class PDFImageGeneratorApp(QMainWindow):
         """当用户选择不同的提示词模板时调用"""
         self.selected_template = template_name
         self.default_prompt_text.setPlainText(self.prompt_templates[template_name])
+        self.update_estimates()
+        
+    def current_prompt(self):
+        """返回 (提示词, 标签)：有自定义提示词时使用自定义提示词，否则使用选定的模板"""
+        user_prompt = self.prompt_text.toPlainText().strip()
+        if user_prompt:
+            return user_prompt, "自定义"
+        return self.prompt_templates[self.selected_template], self.selected_template
         
     def browse_pdf(self):
-        """浏览并选择PDF文件"""
-        file_path, _ = QFileDialog.getOpenFileName(
+        """浏览并选择一个或多个PDF文件"""
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self, 
             "选择PDF文件", 
             "", 
             "PDF files (*.pdf);;All files (*.*)"
         )
-        if file_path:
-            self.pdf_file_path = file_path
-            self.file_path_input.setText(file_path)
-            # 显示PDF信息
-            try:
-                pdf_info = get_pdf_info(file_path)
-                info_text = f"页数: {pdf_info['pages']}, 大小: {pdf_info['file_size']} 字节"
-                self.pdf_info_label.setText(info_text)
-                self.pdf_info_label.setStyleSheet("color: #27ae60;")
-            except Exception as e:
-                self.pdf_info_label.setText(f"无法获取PDF信息: {str(e)}")
-                self.pdf_info_label.setStyleSheet("color: #e74c3c;")
+        if file_paths:
+            self.pdf_file_paths = file_paths
+            self.file_path_input.setText("; ".join(file_paths))
+            self.pdf_infos = {}
+            self.pdf_info_label.setText("正在读取PDF信息...")
+            self.pdf_info_label.setStyleSheet("color: #7f8c8d;")
+            # 在后台读取PDF信息并提前提取文本，不阻塞UI线程
+            prefetcher = self.get_prefetcher()
+            for file_path in file_paths:
+                prefetcher.prefetch(
+                    file_path,
+                    on_info=self.prefetch_signals.info_ready.emit,
+                    on_error=self.prefetch_signals.info_failed.emit
+                )
+            self.update_estimates()
+                
+    def get_job_store(self):
+        """第一次使用时打开任务数据库"""
+        if self.job_store is None:
+            self.job_store = JobStore()
+        return self.job_store
+        
+    def get_prefetcher(self):
+        """第一次选择文件时创建后台预读取器"""
+        if self.prefetcher is None:
+            self.prefetcher = PdfPrefetcher(self.get_job_store())
+        return self.prefetcher
+        
+    @Slot(str, object)
+    def on_pdf_info(self, file_path, pdf_info):
+        """显示后台读取到的PDF信息"""
+        if file_path not in self.pdf_file_paths:
+            return
+        self.pdf_infos[file_path] = pdf_info
+        total_pages = sum(info['pages'] for info in self.pdf_infos.values())
+        total_size = sum(info['file_size'] for info in self.pdf_infos.values())
+        if len(self.pdf_file_paths) == 1:
+            info_text = f"页数: {total_pages}, 大小: {total_size} 字节"
+        else:
+            info_text = f"共 {len(self.pdf_file_paths)} 个文件, 总页数: {total_pages}, 总大小: {total_size} 字节"
+            if len(self.pdf_infos) < len(self.pdf_file_paths):
+                info_text += f" (已读取 {len(self.pdf_infos)}/{len(self.pdf_file_paths)})"
+        self.pdf_info_label.setText(info_text)
+        self.pdf_info_label.setStyleSheet("color: #27ae60;")
+        
+    @Slot(str, str)
+    def on_pdf_info_failed(self, file_path, message):
+        """显示PDF信息读取失败"""
+        if file_path not in self.pdf_file_paths:
+            return
+        self.pdf_info_label.setText(f"无法获取PDF信息 ({os.path.basename(file_path)}): {message}")
+        self.pdf_info_label.setStyleSheet("color: #e74c3c;")
+        
+    def update_estimates(self):
+        """按当前的提示词和模型，在文本提取完成后于后台预估 tokens、费用和耗时"""
+        if not self.pdf_file_paths or self.prefetcher is None:
+            return
+        self.estimate_generation += 1
+        generation = self.estimate_generation
+        self.pdf_estimates = {}
+        self.estimate_label.setText("正在预估 tokens 和费用...")
+        self.estimate_label.setStyleSheet("color: #7f8c8d;")
+        
+        prompt, _ = self.current_prompt()
+        model_name = self.model_input.text()
+        nanobanana_model = self.nanobanana_input.text()
+        store = self.get_job_store()
+        histories = {}
+        
+        def estimate(file_path, doc_hash, content):
+            # 在预读取线程中执行；历史记录只在第一次用到时查询
+            model = model_name
+            if is_auto(model):
+                model = get_router().choose(content, prompt, store, commit=False)['model']
+            if model not in histories:
+                histories[model] = load_history(store, model, nanobanana_model)
+            self.prefetch_signals.estimate_ready.emit(
+                generation, file_path,
+                estimate_request(content, prompt, model, nanobanana_model, histories[model])
+            )
+        
+        for file_path in self.pdf_file_paths:
+            self.prefetcher.when_ready(file_path, estimate)
+        
+    @Slot(int, str, object)
+    def on_pdf_estimate(self, generation, file_path, estimate):
+        """显示后台计算的预估结果，超出上下文长度时标红提示"""
+        if generation != self.estimate_generation or file_path not in self.pdf_file_paths:
+            return
+        self.pdf_estimates[file_path] = estimate
+        if len(self.pdf_file_paths) == 1:
+            text = f"预估: {format_estimate(estimate)}"
+        else:
+            text = f"预估合计: {format_estimate(summarize_estimates(list(self.pdf_estimates.values())))}"
+            if len(self.pdf_estimates) < len(self.pdf_file_paths):
+                text += f" (已预估 {len(self.pdf_estimates)}/{len(self.pdf_file_paths)})"
+        over_limit = [path for path, item in self.pdf_estimates.items() if item['over_limit']]
+        if over_limit:
+            names = ", ".join(os.path.basename(path) for path in over_limit)
+            text += f"\n⚠ 可能超出模型上下文长度: {names}，建议先删减内容或换用上下文更长的模型"
+            self.estimate_label.setStyleSheet("color: #e74c3c;")
+        else:
+            self.estimate_label.setStyleSheet("color: #27ae60;")
+        self.estimate_label.setText(text)
                 
     def process_pdf(self):
-        """处理PDF文件的主要函数"""
+        """把选中的每个PDF加入任务队列"""
         # 切换到处理结果标签页
         self.tab_widget.setCurrentIndex(3)
         
         # 检查必要参数
-        if not self.pdf_file_path:
+        if not self.pdf_file_paths:
             self.log_message("✗ 错误: 请选择一个PDF文件")
             return
             
@@ -429,62 +784,148 @@ class PDFImageGeneratorApp(QMainWindow):
             self.log_message("✗ 错误: 请输入API密钥")
             return
             
-        # 获取用户自定义提示词，如果没有则使用默认提示词
-        user_prompt = self.prompt_text.toPlainText().strip()
-        if not user_prompt:
-            # 使用选定的模板作为默认提示词
-            user_prompt = self.prompt_templates[self.selected_template]
+        fanout_templates = [
+            name for name, checkbox in self.fanout_checkboxes.items() if checkbox.isChecked()
+        ]
+        
+        # 获取用户自定义提示词，如果没有则使用选定的模板
+        user_prompt, prompt_label = self.current_prompt()
             
-        self.result_text.clear()
-        self.log_message("开始处理PDF文件...")
-        
-        # 在新线程中执行处理任务，避免阻塞UI
-        self.worker_thread = WorkerThread(
-            self.pdf_file_path,
-            api_key,
-            self.base_url_input.text(),
-            self.model_input.text(),
-            self.nanobanana_input.text(),
-            user_prompt
-        )
-        self.worker_thread.log_signal.connect(self.log_message)
-        self.worker_thread.finished_signal.connect(self.on_process_finished)
-        self.worker_thread.start()
-        
-        # 禁用处理按钮，防止重复点击
-        self.process_button.setEnabled(False)
-        self.process_button.setText("处理中...")
-        
-    @Slot(bool, str)
-    def on_process_finished(self, success, message):
-        """处理完成后回调"""
-        self.process_button.setEnabled(True)
-        self.process_button.setText("处理PDF并生成图像")
+        store = self.get_job_store()
+        prefetcher = self.get_prefetcher()
+        regenerate = self.regenerate_checkbox.isChecked()
+        for pdf_file_path in self.pdf_file_paths:
+            job_id = str(self.next_job_id)
+            self.next_job_id += 1
+            
+            # 在线程池中执行处理任务，避免阻塞UI
+            if fanout_templates:
+                runnable = FanOutJob(
+                    job_id,
+                    pdf_file_path,
+                    api_key,
+                    self.base_url_input.text(),
+                    self.model_input.text(),
+                    self.nanobanana_input.text(),
+                    fanout_templates,
+                    store,
+                    self.log_buffer,
+                    prefetcher,
+                    regenerate
+                )
+                label = " + ".join(fanout_templates)
+            else:
+                runnable = PipelineJob(
+                    job_id,
+                    pdf_file_path,
+                    api_key,
+                    self.base_url_input.text(),
+                    self.model_input.text(),
+                    self.nanobanana_input.text(),
+                    user_prompt,
+                    store,
+                    self.log_buffer,
+                    prefetcher,
+                    prompt_label,
+                    regenerate
+                )
+                label = prompt_label
+            runnable.signals.progress_signal.connect(self.on_job_progress)
+            runnable.signals.finished_signal.connect(self.on_process_finished)
+            
+            self.add_job_row(job_id, pdf_file_path, label, runnable)
+            self.log_buffer.append(job_id, f"已加入队列: {os.path.basename(pdf_file_path)}")
+            self.thread_pool.start(runnable)
+            
+    def add_job_row(self, job_id, pdf_file_path, label, runnable):
+        """在任务队列表格中添加一行"""
+        row = self.job_table.rowCount()
+        self.job_table.insertRow(row)
+        file_item = QTableWidgetItem(os.path.basename(pdf_file_path))
+        file_item.setToolTip(pdf_file_path)
+        file_item.setData(Qt.ItemDataRole.UserRole, job_id)
+        self.job_table.setItem(row, 0, file_item)
+        self.job_table.setItem(row, 1, QTableWidgetItem(label))
+        self.job_table.setItem(row, 2, QTableWidgetItem("排队中"))
+        progress_bar = QProgressBar()
+        progress_bar.setRange(0, PipelineJob.TOTAL_STEPS)
+        progress_bar.setValue(0)
+        self.job_table.setCellWidget(row, 3, progress_bar)
+        self.jobs[job_id] = {'row': row, 'runnable': runnable}
+        
+    def selected_job_id(self):
+        """返回表格中选中的任务ID，未选中时返回 None"""
+        rows = self.job_table.selectionModel().selectedRows()
+        if not rows:
+            return None
+        return self.job_table.item(rows[0].row(), 0).data(Qt.ItemDataRole.UserRole)
+        
+    @Slot()
+    def refresh_log_view(self):
+        """根据表格选择显示单个任务或全部任务的日志"""
+        job_id = self.selected_job_id()
+        if job_id is None:
+            self.log_title_label.setText("全部日志")
+        else:
+            self.log_title_label.setText(f"任务 #{job_id} 日志")
+        self.result_text.set_filter(job_id)
+        
+    @Slot(str, int, int)
+    def on_job_progress(self, job_id, step, total_steps):
+        """更新任务状态和进度条"""
+        row = self.jobs[job_id]['row']
+        self.job_table.item(row, 2).setText("运行中")
+        progress_bar = self.job_table.cellWidget(row, 3)
+        progress_bar.setRange(0, total_steps)
+        progress_bar.setValue(step)
+        
+    @Slot(str, bool, str)
+    def on_process_finished(self, job_id, success, message):
+        """任务完成后回调"""
+        job = self.jobs[job_id]
+        progress_bar = self.job_table.cellWidget(job['row'], 3)
+        status_item = self.job_table.item(job['row'], 2)
         if success:
-            self.log_message("✓ 全部处理完成")
+            progress_bar.setRange(0, 1)
+            progress_bar.setValue(1)
+            status_item.setText("完成")
+            self.log_buffer.append(job_id, "✓ 全部处理完成")
         else:
-            self.log_message(f"✗ 处理失败: {message}")
+            status_item.setText("失败")
+            status_item.setToolTip(message)
+            self.log_buffer.append(job_id, f"✗ 处理失败: {message}")
+        
+    def closeEvent(self, event):
+        """关闭窗口时停止后台预读取，并写完队列中的日志"""
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+        shutdown_logging()
+        super().closeEvent(event)
         
     def open_output_directory(self):
         """打开输出目录"""
         try:
-            output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
-            if sys.platform == "darwin":  # macOS
-                subprocess.Popen(["open", output_dir])
-            elif sys.platform == "win32":  # Windows
-                subprocess.Popen(["explorer", output_dir])
-            else:  # Linux
-                subprocess.Popen(["xdg-open", output_dir])
+            open_path(ensure_dir(OUTPUT_DIR))
         except Exception as e:
             self.log_message(f"✗ 无法打开目录: {str(e)}")
 
     @Slot(str)
     def log_message(self, message):
-        """在结果文本框中记录消息"""
-        self.result_text.append(message)
-        # 滚动到底部
-        scrollbar = self.result_text.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
+        """在全部日志中记录应用自身的消息"""
+        self.log_buffer.append(None, message)
+
+
+# 启动时不导入的较慢模块（网络、PDF、图像库），窗口显示后在后台预加载
+PRELOAD_MODULES = ('openai', 'PyPDF2', 'PIL.Image', 'requests')
+
+
+def preload_heavy_modules():
+    """在后台线程中预先导入较慢的模块，首次处理时无需再等待"""
+    for module_name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            pass
 
 
 def main():
@@ -502,6 +943,9 @@ def main():
     # 初始更新标题样式
     window.update_title_style()
     
+    # 窗口显示之后再加载网络、PDF 和图像库
+    QTimer.singleShot(300, lambda: threading.Thread(target=preload_heavy_modules, daemon=True).start())
+    
     sys.exit(app.exec())
 
 
@@ -0,0 +1,295 @@
+"""
+Memory Profiling Module
+Opt-in per-stage memory measurements (tracemalloc + RSS), exportable as a JSON report
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# 当前生效的 MemoryProfiler；未设置时 memory_stage() 不做任何记录
+_current_profiler = contextvars.ContextVar('current_profiler', default=None)
+
+# 多个任务同时分析时共用 tracemalloc，最后一个结束的任务负责停止
+_tracing_users = 0
+_tracing_started = False
+_tracing_lock = threading.Lock()
+
+MB = 1024 * 1024
+
+
+def current_rss():
+    """
+    Resident set size of this process
+
+    Returns:
+        int: RSS in bytes, or None if it cannot be read on this platform
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil  # 可选依赖，非 Linux 平台使用
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+
+def peak_rss():
+    """
+    Highest RSS this process has reached so far
+
+    Returns:
+        int: Peak RSS in bytes, or None if it cannot be read on this platform
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def _start_tracing(frames):
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            _tracing_started = True
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+class MemoryProfiler:
+    def __init__(self, name="pipeline", top_n=10, frames=1, sample_interval_s=0.01):
+        """
+        Measure memory of each stage wrapped in memory_stage()
+
+        tracemalloc and RSS are process wide: when several stages run at the same time
+        (concurrent jobs, batch --jobs > 1) their allocations are attributed to every
+        open stage, so profile one paper at a time for exact numbers.
+
+        Args:
+            name (str): Name written to the report
+            top_n (int): Number of allocation sites listed per stage
+            frames (int): Stack frames stored per allocation (more frames = slower, more detail)
+            sample_interval_s (float): Seconds between RSS samples taken while a stage is running
+        """
+        self.name = name
+        self.top_n = top_n
+        self.frames = frames
+        self.sample_interval_s = sample_interval_s
+        self.records = []
+        self._open = []  # 正在运行的阶段
+        self._lock = threading.Lock()
+        self._stop_sampling = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        """开始记录内存分配，并在后台采样 RSS"""
+        _start_tracing(self.frames)
+        self._stop_sampling.clear()
+        self._sampler = threading.Thread(target=self._sample_rss, name='rss-sampler', daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        """停止采样，最后一个使用者停止 tracemalloc"""
+        self._stop_sampling.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        _stop_tracing()
+
+    def _sample_rss(self):
+        # 阶段内的 RSS 峰值只能靠采样得到，ru_maxrss 是整个进程的历史最大值
+        while not self._stop_sampling.wait(self.sample_interval_s):
+            rss = current_rss()
+            if rss is None:
+                return
+            with self._lock:
+                for stage in self._open:
+                    stage['rss_peak'] = max(stage['rss_peak'], rss)
+
+    def _fold_peak(self):
+        """把当前的 tracemalloc 峰值计入所有正在运行的阶段"""
+        current, peak = tracemalloc.get_traced_memory()
+        for stage in self._open:
+            stage['peak'] = max(stage['peak'], stage['carried'] + peak - stage['start'])
+        return current
+
+    def _top_allocations(self):
+        """上次清空记录后分配且仍未释放的内存，按分配位置汇总"""
+        ignored = (tracemalloc.__file__, __file__, "<frozen importlib._bootstrap>", "<unknown>")
+        stats = [stat for stat in tracemalloc.take_snapshot().statistics('lineno')
+                 if stat.traceback[0].filename not in ignored]
+        return [
+            {'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             'size': stat.size, 'count': stat.count}
+            for stat in stats[:self.top_n]
+        ]
+
+    @contextmanager
+    def stage(self, name, **args):
+        """
+        Measure the enclosed block
+
+        Allocation records are cleared when a stage starts, so the snapshot taken at its end
+        only holds what the stage allocated and kept; snapshots of the whole heap would take
+        seconds per stage once large libraries are loaded. A stage that contains other
+        measured stages therefore reports totals but no allocation sites.
+
+        Args:
+            name (str): Stage name, e.g. "pdf.read"
+            **args: Extra values written with the stage (sizes, file names...)
+        """
+        rss = current_rss()
+        with self._lock:
+            current = self._fold_peak()
+            for outer in self._open:
+                # 清空记录前，把外层阶段已分配的内存转入 carried
+                outer['carried'] += current - outer['start']
+                outer['start'] = 0
+                outer['nested'] = True
+            tracemalloc.clear_traces()
+            stage = {'start': 0, 'carried': 0, 'peak': 0, 'nested': False,
+                     'rss_before': rss, 'rss_peak': rss or 0}
+            self._open.append(stage)
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            duration = time.perf_counter() - start
+            rss = current_rss()
+            with self._lock:
+                current = self._fold_peak()
+                self._open.remove(stage)
+            record = {
+                'name': name,
+                'args': args,
+                'duration_s': duration,
+                'traced_peak': stage['peak'],  # 阶段内比开始时多占用的最大内存
+                'retained': stage['carried'] + current - stage['start'],  # 阶段结束后仍未释放的内存
+                'rss_before': stage['rss_before'],
+                'rss_after': rss,
+                'rss_peak': max(stage['rss_peak'], rss or 0) or None,
+                'top_allocations': None if stage['nested'] else self._top_allocations(),
+            }
+            with self._lock:
+                self.records.append(record)
+
+    def summary(self):
+        """
+        Aggregate the stages by name
+
+        Returns:
+            list: (name, count, max traced peak, total retained, max RSS growth) in bytes,
+            largest peak first
+        """
+        totals = {}
+        with self._lock:
+            for record in self.records:
+                count, peak, retained, rss_growth = totals.get(record['name'], (0, 0, 0, 0))
+                growth = 0
+                if record['rss_before'] is not None and record['rss_peak'] is not None:
+                    growth = record['rss_peak'] - record['rss_before']
+                totals[record['name']] = (count + 1, max(peak, record['traced_peak']),
+                                          retained + record['retained'], max(rss_growth, growth))
+        rows = [(name,) + values for name, values in totals.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def format_summary(self):
+        """
+        Human readable version of summary()
+
+        Returns:
+            list: One line per stage name
+        """
+        return [
+            f"{name:<18} x{count:<4} 峰值 {peak / MB:8.1f} MB   保留合计 {retained / MB:8.1f} MB   "
+            f"RSS 增长 {rss_growth / MB:8.1f} MB"
+            for name, count, peak, retained, rss_growth in self.summary()
+        ]
+
+    def write_report(self, path):
+        """
+        Write all stage measurements, the per-stage summary and the process peak RSS as JSON
+
+        Args:
+            path (str): Output file path
+
+        Returns:
+            str: The path written
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            records = list(self.records)
+        report = {
+            'name': self.name,
+            'created': time.time(),
+            'peak_rss': peak_rss(),
+            'summary': [
+                {'name': name, 'count': count, 'traced_peak': peak, 'retained': retained, 'rss_growth': rss_growth}
+                for name, count, peak, retained, rss_growth in self.summary()
+            ],
+            'stages': records,
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return path
+
+
+@contextmanager
+def use_profiler(profiler):
+    """
+    Make a memory profiler current for the enclosed block (and for functions wrapped with bind_context)
+
+    Args:
+        profiler (MemoryProfiler): Profiler receiving the measurements, or None to disable profiling
+    """
+    if profiler is not None:
+        profiler.start()
+    token = _current_profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _current_profiler.reset(token)
+        if profiler is not None:
+            profiler.stop()
+
+
+def get_profiler():
+    """返回当前生效的 MemoryProfiler，没有则返回 None"""
+    return _current_profiler.get()
+
+
+@contextmanager
+def memory_stage(name, **args):
+    """
+    Measure the enclosed block (or decorated function) with the current profiler;
+    does nothing when memory profiling is off
+
+    Args:
+        name (str): Stage name
+        **args: Extra values written with the stage
+    """
+    profiler = _current_profiler.get()
+    if profiler is None:
+        yield args
+        return
+    with profiler.stage(name, **args) as stage_args:
+        yield stage_args
@@ -0,0 +1,154 @@
+"""
+Model Router Module
+Picks the analysis model for each document when MODEL_NAME is "auto", from the document's
+token count, the models' context limits and their recent latency and error history
+"""
+import os
+import random
+import threading
+import time
+
+from llm_client import build_messages, message_text
+from token_estimator import count_tokens, context_limit, fit_latency, DEFAULT_OUTPUT_TOKENS, MIN_SAMPLES
+from job_store import STATUS_DONE
+from config import AUTO_MODEL, MODEL_CANDIDATES, ROUTER_MAX_ERROR_RATE, ROUTER_EXPLORE_RATE
+
+
+def is_auto(model_name):
+    """模型名为 auto (不区分大小写) 时由路由器选择模型"""
+    return (model_name or '').strip().lower() == AUTO_MODEL
+
+
+class ModelRouter:
+    def __init__(self, candidates=None, window=50, max_error_rate=None, explore_rate=None, refresh_s=5.0):
+        """
+        Choose analysis models from the recorded llm attempts in the job store
+
+        Models without enough recorded runs are tried first (a few documents each), then each
+        document goes to the model with the lowest expected turnaround: the latency fitted to
+        its recent runs for this input size, divided by its recent success rate.
+
+        Args:
+            candidates (list): Models to choose from, defaults to MODEL_CANDIDATES
+            window (int): Number of recent runs per model taken into account
+            max_error_rate (float): Models failing more often are skipped, defaults to ROUTER_MAX_ERROR_RATE
+            explore_rate (float): Share of documents sent to another usable model to keep its history
+                current, defaults to ROUTER_EXPLORE_RATE
+            refresh_s (float): Seconds the history read from the job store is reused
+        """
+        self.candidates = list(candidates or MODEL_CANDIDATES)
+        self.window = window
+        self.max_error_rate = ROUTER_MAX_ERROR_RATE if max_error_rate is None else max_error_rate
+        self.explore_rate = ROUTER_EXPLORE_RATE if explore_rate is None else explore_rate
+        self.refresh_s = refresh_s
+        self._lock = threading.Lock()
+        self._history = {}  # 数据库路径 -> (读取时间, 各模型的统计)
+        self._tried = {}  # 样本不足时本进程已分配给各模型的文档数
+
+    def _load_stats(self, store):
+        """各候选模型最近 window 次尝试的耗时样本和失败次数"""
+        if store is None:
+            return {}
+        path = os.path.abspath(store.path)
+        cached = self._history.get(path)
+        if cached is not None and time.monotonic() - cached[0] < self.refresh_s:
+            return cached[1]
+        stats = {model: {'samples': [], 'failures': 0, 'runs': 0} for model in self.candidates}
+        for run in store.attempt_history('llm', limit=self.window * len(self.candidates) * 4):
+            model_stats = stats.get(run['meta'].get('model'))
+            if model_stats is None or model_stats['runs'] >= self.window:
+                continue
+            model_stats['runs'] += 1
+            if run['status'] == STATUS_DONE:
+                if run['meta'].get('input_chars'):
+                    model_stats['samples'].append((run['meta']['input_chars'], run['duration_s']))
+            else:
+                model_stats['failures'] += 1
+        for model_stats in stats.values():
+            model_stats['fit'] = fit_latency(model_stats['samples'])
+            model_stats['error_rate'] = model_stats['failures'] / model_stats['runs'] if model_stats['runs'] else 0.0
+        self._history[path] = (time.monotonic(), stats)
+        return stats
+
+    def choose(self, pdf_content, prompt, store=None, has_result=None, commit=True):
+        """
+        Choose the analysis model for one document
+
+        Args:
+            pdf_content (str): Extracted PDF text
+            prompt (str): Prompt sent together with the PDF text
+            store (JobStore): Job store holding the outcomes of earlier runs
+            has_result (callable): Returns True for a model whose response to this document is
+                already stored; such a model is chosen so finished work is reused
+            commit (bool): Count the choice towards trying new models (False for estimates)
+
+        Returns:
+            dict: model, reason, input_tokens and the expected seconds of each scored model
+        """
+        input_tokens, _ = count_tokens(message_text(build_messages(pdf_content, prompt, cache_hints=False)))
+        input_chars = len(prompt) + len(pdf_content)
+        decision = {'input_tokens': input_tokens, 'expected_s': {}}
+
+        usable = [m for m in self.candidates if input_tokens + DEFAULT_OUTPUT_TOKENS <= context_limit(m)]
+        if not usable:
+            decision.update(model=max(self.candidates, key=context_limit), reason="超出所有候选模型的上下文长度，选择上下文最长的模型")
+            return decision
+
+        if has_result is not None:
+            for model in usable:
+                if has_result(model):
+                    decision.update(model=model, reason="复用该模型已完成的响应")
+                    return decision
+
+        with self._lock:
+            stats = self._load_stats(store)
+            # 没有足够记录的模型先各试几篇，依次轮换
+            untried = [m for m in usable
+                       if len(stats.get(m, {}).get('samples', ())) + stats.get(m, {}).get('failures', 0) < MIN_SAMPLES
+                       and self._tried.get(m, 0) < MIN_SAMPLES]
+            if untried:
+                model = min(untried, key=lambda m: self._tried.get(m, 0))
+                if commit:
+                    self._tried[model] = self._tried.get(model, 0) + 1
+                decision.update(model=model, reason="记录不足，试用该模型")
+                return decision
+
+        expected = {}
+        for model in usable:
+            model_stats = stats.get(model)
+            if model_stats is None or model_stats['fit'] is None or model_stats['error_rate'] > self.max_error_rate:
+                continue
+            base, per_char = model_stats['fit']
+            # 失败后需要重试，按成功率折算预计耗时
+            expected[model] = (base + per_char * input_chars) / max(1.0 - model_stats['error_rate'], 0.1)
+        decision['expected_s'] = {model: round(seconds, 2) for model, seconds in expected.items()}
+
+        if not expected:
+            decision.update(model=usable[0], reason="候选模型都没有可用的耗时记录或失败率过高，使用第一个候选模型")
+            return decision
+        best = min(expected, key=expected.get)
+        others = [m for m in expected if m != best]
+        if others and commit and random.random() < self.explore_rate:
+            model = random.choice(others)
+            decision.update(model=model, reason=f"随机试用，更新耗时记录 (最快为 {best})")
+            return decision
+        decision.update(model=best, reason=f"预计 {expected[best]:.1f}s，{len(expected)} 个模型中最快")
+        return decision
+
+
+_default_router = None
+_default_router_lock = threading.Lock()
+
+
+def get_router():
+    """
+    Shared ModelRouter of this process
+
+    Returns:
+        ModelRouter: The router
+    """
+    global _default_router
+    with _default_router_lock:
+        if _default_router is None:
+            _default_router = ModelRouter()
+        return _default_router
@@ -2,11 +2,17 @@
 PDF Handler Module
 Handles PDF file upload and extraction
 """
-import PyPDF2
 import os
 import base64
+import time
+from tracing import span
+from memprofile import memory_stage
+from log_setup import get_logger
 
+logger = get_logger(__name__)
 
+
+@memory_stage("pdf.read")
 def read_pdf_content(file_path):
     """
     Read and extract text content from PDF file
@@ -17,22 +23,32 @@ def read_pdf_content(file_path):
     Returns:
         str: Extracted text content from PDF
     """
+    import PyPDF2  # 延迟导入，加快程序启动
+    
     content = ""
+    start = time.perf_counter()
     
     try:
         with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
+            with span("pdf.open", file=os.path.basename(file_path)):
+                pdf_reader = PyPDF2.PdfReader(file)
             
             # Extract text from all pages
-            for page in pdf_reader.pages:
-                content += page.extract_text() + "\n"
+            for page_number, page in enumerate(pdf_reader.pages, 1):
+                with span("pdf.page", page=page_number):
+                    content += page.extract_text() + "\n"
                 
     except Exception as e:
         raise Exception(f"Error reading PDF file: {str(e)}")
-        
+    
+    logger.debug(f"PDF 文本提取完成: {os.path.basename(file_path)}",
+                 extra={'file': os.path.basename(file_path), 'pages': len(pdf_reader.pages),
+                        'bytes': os.path.getsize(file_path), 'chars': len(content),
+                        'duration_s': round(time.perf_counter() - start, 3)})
     return content
 
 
+@memory_stage("pdf.encode")
 def encode_pdf_to_base64(file_path):
     """
     Encode PDF file to base64 string for uploading
@@ -61,6 +77,8 @@ def get_pdf_info(file_path):
     Returns:
         dict: Dictionary containing PDF information
     """
+    import PyPDF2  # 延迟导入，加快程序启动
+    
     try:
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
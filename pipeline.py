@@ -0,0 +1,862 @@
+"""
+Pipeline Module
+Runs the PDF -> LLM -> code block -> image stages without any GUI dependency
+"""
+import json
+import os
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from pdf_handler import read_pdf_content
+from llm_client import LLMClient
+from code_parser import extract_last_code_block
+from image_generator import generate_and_save_image
+from job_store import hash_file, make_key
+from token_estimator import estimate_request, format_estimate, load_history
+from dedup import minhash_signature
+from model_router import get_router, is_auto
+from tracing import span, get_tracer, bind_context
+from memprofile import memory_stage, get_profiler
+from log_setup import get_logger, log_context
+from work_queue import Heartbeat, STATUS_LEASED, STATUS_QUEUED
+from config import OUTPUT_DIR, PROMPT_TEMPLATES, MODEL_NAME
+
+logger = get_logger(__name__)
+
+
+def _noop_log(message):
+    pass
+
+
+def safe_filename(name):
+    """
+    Turn an arbitrary label (template name, PDF stem) into a filename-safe string
+
+    Args:
+        name (str): Label to convert
+
+    Returns:
+        str: Filename-safe version of the label
+    """
+    cleaned = re.sub(r'[\\/:*?"<>|\s]+', '_', name).strip('._')
+    return cleaned or "untitled"
+
+
+def create_job_dir(pdf_file_path, base_dir=None):
+    """
+    Create the output directory that groups all results of one job
+
+    Args:
+        pdf_file_path (str): Path to the source PDF file
+        base_dir (str): Parent directory, defaults to OUTPUT_DIR
+
+    Returns:
+        str: Path to the newly created job directory
+    """
+    base_dir = base_dir or OUTPUT_DIR
+    stem = safe_filename(os.path.splitext(os.path.basename(pdf_file_path))[0])
+    job_name = f"{stem}_{time.strftime('%Y%m%d_%H%M%S')}"
+    job_dir = os.path.join(base_dir, job_name)
+
+    # 同一秒内重复提交时避免覆盖已有结果；其他线程或 worker 进程可能同时创建同名目录，
+    # 以 mkdir 是否成功为准
+    os.makedirs(base_dir, exist_ok=True)
+    suffix = 1
+    while True:
+        try:
+            os.mkdir(job_dir)
+            return job_dir
+        except FileExistsError:
+            suffix += 1
+            job_dir = os.path.join(base_dir, f"{job_name}_{suffix}")
+
+
+def stage_keys(doc_hash, prompt, model_name, nanobanana_model):
+    """
+    Build the job store keys of every stage for one document and set of settings
+
+    Args:
+        doc_hash (str): Hash of the PDF file content
+        prompt (str): Prompt sent together with the PDF text
+        model_name (str): Name of the analysis model
+        nanobanana_model (str): Name of the image model
+
+    Returns:
+        dict: Stage name -> key; a stage's key covers only the settings it depends on
+    """
+    llm_key = make_key(doc_hash, prompt, model_name)
+    return {
+        'extract': doc_hash,
+        'llm': llm_key,
+        'parse': llm_key,
+        'image': make_key(llm_key, nanobanana_model)
+    }
+
+
+def _run_stage(store, key, stage, func, log, is_valid=None, meta=None, force=False):
+    """
+    Return a stage's stored output if it already completed, otherwise run and record it
+
+    Args:
+        store (JobStore): Job store, or None to always run the stage
+        key (str): Job store key of the stage
+        stage (str): Stage name
+        func (callable): Runs the stage and returns its output
+        log (callable): Callback receiving progress messages
+        is_valid (callable): Extra check that a stored output is still usable
+        meta (dict): Extra information recorded with the stage
+        force (bool): Run the stage even if a stored output exists
+
+    Returns:
+        The stage output
+    """
+    if store is not None and not force:
+        cached = store.get_stage(key, stage)
+        if cached is not None and (is_valid is None or is_valid(cached['output'])):
+            log(f"↺ 复用已完成的阶段: {stage}")
+            return cached['output']
+
+    start = time.perf_counter()
+    try:
+        with span(f"stage.{stage}"), memory_stage(f"stage.{stage}"), log_context(stage=stage):
+            output = func()
+    except Exception as e:
+        duration = time.perf_counter() - start
+        logger.warning(f"阶段失败: {stage}: {e}", extra={'stage': stage, 'duration_s': round(duration, 3)})
+        if store is not None:
+            store.fail_stage(key, stage, str(e), duration, meta)
+        raise
+    duration = time.perf_counter() - start
+    logger.debug(f"阶段完成: {stage}", extra={'stage': stage, 'duration_s': round(duration, 3),
+                                           'chars': len(output) if isinstance(output, str) else None})
+    if store is not None:
+        store.save_stage(key, stage, output, duration, meta)
+    return output
+
+
+def route_model(model_name, pdf_content, prompt, store=None, doc_hash=None, nanobanana_model=None, name=None,
+                reuse_from=None):
+    """
+    Resolve the analysis model of one document: a pinned model is returned as is, "auto"
+    asks the model router and logs its decision
+
+    Args:
+        model_name (str): Requested model, defaults to MODEL_NAME
+        pdf_content (str): Extracted PDF text
+        prompt (str): Prompt sent together with the PDF text
+        store (JobStore): Job store with the outcomes of earlier runs
+        doc_hash (str): Hash of the PDF file, lets the router reuse a stored response
+        nanobanana_model (str): Name of the image model
+        name (str): Document name shown in the log
+        reuse_from (str): Hash of a near-duplicate document; when this document has no stored
+            response of its own, the model that answered the near-duplicate is chosen
+
+    Returns:
+        str: The analysis model to use
+    """
+    model_name = model_name or MODEL_NAME
+    if not is_auto(model_name):
+        return model_name
+
+    router = get_router()
+    has_result = None
+    if store is not None:
+        def stored(source, model):
+            return store.get_stage(stage_keys(source, prompt, model, nanobanana_model)['llm'], 'llm') is not None
+
+        # 优先复用本文档自己的响应，其次是近似重复文档的响应
+        for source in (doc_hash, reuse_from):
+            if source is not None and any(stored(source, model) for model in router.candidates):
+                def has_result(model, source=source):
+                    return stored(source, model)
+                break
+
+    decision = router.choose(pdf_content, prompt, store, has_result)
+    logger.info(f"模型路由{f' {name}' if name else ''}: {decision['model']} ({decision['reason']})",
+                extra={'model': decision['model'], 'input_tokens': decision['input_tokens'],
+                       'expected_s': decision['expected_s'] or None, 'reason': decision['reason']})
+    return decision['model']
+
+
+def extract_pdf(pdf_file_path, store=None, doc_hash=None, log=None):
+    """
+    Extract PDF text, reusing a stored extraction of the same document
+
+    Args:
+        pdf_file_path (str): Path to the PDF file
+        store (JobStore): Job store used to checkpoint the result
+        doc_hash (str): Precomputed hash of the PDF file
+        log (callable): Callback receiving progress messages
+
+    Returns:
+        str: Extracted PDF text
+    """
+    log = log or _noop_log
+    if store is not None and doc_hash is None:
+        doc_hash = hash_file(pdf_file_path)
+    return _run_stage(store, doc_hash, 'extract', lambda: read_pdf_content(pdf_file_path), log)
+
+
+def request_llm(client, pdf_content, prompt, model_name=None, store=None, key=None, log=None, usage=None):
+    """
+    Send the PDF text and prompt to the analysis model, reusing a stored response
+
+    Args:
+        client (LLMClient): Client used for the request
+        pdf_content (str): Extracted PDF text
+        prompt (str): Prompt sent together with the PDF text
+        model_name (str): Name of the analysis model
+        store (JobStore): Job store used to checkpoint the result
+        key (str): Job store key of the llm stage
+        log (callable): Callback receiving progress messages
+        usage (dict): Filled with the token counts of the request (left empty if the stored response is reused)
+
+    Returns:
+        str: Response from the LLM
+    """
+    log = log or _noop_log
+    usage = {} if usage is None else usage
+    meta = {'model': model_name, 'input_chars': len(prompt) + len(pdf_content)}
+
+    def send():
+        response = client.send_pdf_to_llm(pdf_content, prompt, model_name, usage=usage)
+        meta.update(usage)  # 与阶段结果一起记录，包括命中提示词缓存的 tokens
+        return response
+
+    return _run_stage(store, key, 'llm', send, log, meta=meta)
+
+
+def parse_code_block(llm_response, store=None, key=None, log=None):
+    """
+    Extract the image prompt (last code block) from the LLM response
+
+    Args:
+        llm_response (str): Response from the LLM
+        store (JobStore): Job store used to checkpoint the result
+        key (str): Job store key of the parse stage
+        log (callable): Callback receiving progress messages
+
+    Returns:
+        str: The last code block of the response
+    """
+    log = log or _noop_log
+
+    def parse():
+        code_block = extract_last_code_block(llm_response or "")
+        if not code_block:
+            raise Exception("未在大语言模型响应中找到代码块")
+        return code_block
+
+    return _run_stage(store, key, 'parse', parse, log)
+
+
+def request_image(client, code_block, nanobanana_model=None, filename=None, output_dir=None,
+                  store=None, key=None, log=None, regenerate=False, cache=None):
+    """
+    Generate and save the image, reusing a stored image that still exists on disk
+
+    Args:
+        client (LLMClient): Client used for the request
+        code_block (str): Image prompt extracted from the LLM response
+        nanobanana_model (str): Name of the image model
+        filename (str): Filename for the saved image (without extension)
+        output_dir (str): Directory the image is written to
+        store (JobStore): Job store used to checkpoint the result
+        key (str): Job store key of the image stage
+        log (callable): Callback receiving progress messages
+        regenerate (bool): Request a new image even if this prompt was generated before
+        cache (ImageCache): Image cache, defaults to the shared cache of this process; False disables it
+
+    Returns:
+        str: Path to the saved image file
+    """
+    log = log or _noop_log
+    return _run_stage(
+        store, key, 'image',
+        lambda: generate_and_save_image(
+            code_block,
+            filename=filename,
+            model_name=nanobanana_model,
+            output_dir=output_dir,
+            client=client,
+            regenerate=regenerate,
+            cache=cache
+        ),
+        log,
+        is_valid=os.path.exists,
+        meta={'model': nanobanana_model},
+        force=regenerate
+    )
+
+
+def generate_from_content(client, pdf_content, prompt, model_name=None, nanobanana_model=None,
+                          filename=None, output_dir=None, log=None, store=None, keys=None, regenerate=False):
+    """
+    Run the LLM, code block and image stages for already extracted PDF text
+
+    Args:
+        client (LLMClient): Shared client used for both the LLM and image requests
+        pdf_content (str): Extracted PDF text
+        prompt (str): Prompt sent together with the PDF text
+        model_name (str): Name of the analysis model
+        nanobanana_model (str): Name of the image model
+        filename (str): Filename for the saved image (without extension)
+        output_dir (str): Directory the image is written to
+        log (callable): Callback receiving progress messages
+        store (JobStore): Job store used to checkpoint each stage
+        keys (dict): Stage keys as returned by stage_keys (required with store)
+        regenerate (bool): Request a new image instead of reusing a cached one
+
+    Returns:
+        dict: llm_response, code_block, image_path and the token usage of the LLM request
+    """
+    log = log or _noop_log
+    keys = keys or {}
+    usage = {}
+
+    log("正在发送请求到大语言模型...")
+    llm_response = request_llm(client, pdf_content, prompt, model_name, store, keys.get('llm'), log, usage)
+    log(f"✓ 大语言模型响应接收完成，长度: {len(llm_response) if llm_response else 0} 字符")
+
+    code_block = parse_code_block(llm_response, store, keys.get('parse'), log)
+    log(f"✓ 代码块提取完成，长度: {len(code_block)} 字符")
+
+    log("正在使用Nano-Banana生成图像...")
+    image_path = request_image(
+        client, code_block, nanobanana_model, filename, output_dir, store, keys.get('image'), log, regenerate
+    )
+    log(f"✓ 图像已保存: {image_path}")
+
+    return {
+        'llm_response': llm_response,
+        'code_block': code_block,
+        'image_path': image_path,
+        'usage': usage
+    }
+
+
+def run_fanout(pdf_file_path, template_names, api_key=None, base_url=None, model_name=None,
+               nanobanana_model=None, templates=None, max_workers=None, log=None, store=None,
+               prefetched=None, regenerate=False):
+    """
+    Extract a PDF once and run every selected template against it concurrently
+
+    Args:
+        pdf_file_path (str): Path to the PDF file
+        template_names (list): Names of the templates to run
+        api_key (str): API key for the service
+        base_url (str): Base URL for the API
+        model_name (str): Name of the analysis model
+        nanobanana_model (str): Name of the image model
+        templates (dict): Template name -> prompt mapping, defaults to PROMPT_TEMPLATES
+        max_workers (int): Upper bound on concurrent template runs
+        log (callable): Callback receiving progress messages
+        store (JobStore): Job store used to checkpoint and resume each stage
+        prefetched (tuple): (doc_hash, content) already extracted in the background
+        regenerate (bool): Request new images instead of reusing cached ones
+
+    Returns:
+        dict: job_dir and per-template results ({'image_path': ...} or {'error': ...})
+    """
+    log = log or _noop_log
+    templates = templates or PROMPT_TEMPLATES
+    if not template_names:
+        raise Exception("未选择任何提示词模板")
+
+    if prefetched is not None:
+        doc_hash, pdf_content = prefetched
+        log(f"✓ 使用后台预读取的PDF内容，共 {len(pdf_content)} 个字符")
+    else:
+        log("正在读取PDF内容...")
+        doc_hash = hash_file(pdf_file_path) if store is not None else None
+        pdf_content = extract_pdf(pdf_file_path, store, doc_hash, log)
+        log(f"✓ PDF内容读取完成，共 {len(pdf_content)} 个字符")
+
+    client = LLMClient(api_key=api_key, base_url=base_url)
+    job_dir = create_job_dir(pdf_file_path)
+    log(f"输出目录: {job_dir}")
+
+    routed = {}  # 模板名 -> 选中的分析模型，失败的模板也记录在清单中
+
+    def run_template(name):
+        def template_log(message):
+            log(f"[{name}] {message}")
+        model = route_model(model_name, pdf_content, templates[name], store, doc_hash, nanobanana_model, name=name)
+        routed[name] = model
+        result = generate_from_content(
+            client,
+            pdf_content,
+            templates[name],
+            model_name=model,
+            nanobanana_model=nanobanana_model,
+            filename=safe_filename(name),
+            output_dir=job_dir,
+            log=template_log,
+            store=store,
+            keys=stage_keys(doc_hash, templates[name], model, nanobanana_model),
+            regenerate=regenerate
+        )
+        result['model'] = model
+        return result
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(template_names)) as executor:
+        futures = {name: executor.submit(bind_context(run_template), name) for name in template_names}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                log(f"[{name}] ✗ 处理失败: {str(e)}")
+                results[name] = {'error': str(e), 'model': routed.get(name)}
+
+    write_manifest(job_dir, pdf_file_path, model_name, nanobanana_model, results)
+    return {'job_dir': job_dir, 'results': results}
+
+
+def write_manifest(job_dir, pdf_file_path, model_name, nanobanana_model, results):
+    """
+    Record which paper, templates and models produced the files in a job directory
+
+    Args:
+        job_dir (str): Job output directory
+        pdf_file_path (str): Path to the source PDF file
+        model_name (str): Name of the analysis model as requested
+        nanobanana_model (str): Name of the image model
+        results (dict): Per-template results as returned by run_fanout, with the model each
+            template was routed to
+    """
+    model_name = model_name or MODEL_NAME
+    templates = {
+        name: {
+            'image': os.path.relpath(result['image_path'], job_dir) if 'image_path' in result else None,
+            'error': result.get('error'),
+            'model': result.get('model') or model_name,
+            'usage': result.get('usage') or None
+        }
+        for name, result in results.items()
+    }
+    # 所有模板使用同一个模型时记录该模型，而不是请求的 auto
+    models = {template['model'] for template in templates.values()}
+    manifest = {
+        'pdf': os.path.abspath(pdf_file_path),
+        'model': models.pop() if len(models) == 1 else model_name,
+        'image_model': nanobanana_model,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'templates': templates
+    }
+    with open(os.path.join(job_dir, 'job.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def timed_read_pdf_content(file_path):
+    """
+    Read PDF text and measure how long the extraction took (runs in worker processes)
+
+    Args:
+        file_path (str): Path to the PDF file
+
+    Returns:
+        tuple: (extracted text, extraction time in seconds)
+    """
+    start = time.perf_counter()
+    content = read_pdf_content(file_path)
+    return content, time.perf_counter() - start
+
+
+def find_pdfs(directory, recursive=False):
+    """
+    List the PDF files in a directory, sorted by path
+
+    Args:
+        directory (str): Directory to scan
+        recursive (bool): Whether to descend into subdirectories
+
+    Returns:
+        list: Paths of the PDF files found
+    """
+    pdf_paths = []
+    for root, dirs, files in os.walk(directory):
+        pdf_paths.extend(os.path.join(root, name) for name in files if name.lower().endswith('.pdf'))
+        if not recursive:
+            break
+    return sorted(pdf_paths)
+
+
+def run_batch(pdf_paths, prompt, template_name=None, api_key=None, base_url=None, model_name=None,
+              nanobanana_model=None, jobs=4, extract_jobs=None, log=None, store=None, regenerate=False,
+              dedup_index=None, reuse_duplicates=False):
+    """
+    Process many PDFs: extraction in a process pool, network stages with bounded concurrency
+
+    Args:
+        pdf_paths (list): Paths of the PDF files to process
+        prompt (str): Prompt sent together with each PDF's text
+        template_name (str): Label used for the image filename and manifest
+        api_key (str): API key for the service
+        base_url (str): Base URL for the API
+        model_name (str): Name of the analysis model
+        nanobanana_model (str): Name of the image model
+        jobs (int): Maximum number of papers in the LLM/image stages at once
+        extract_jobs (int): Number of extraction processes, defaults to the CPU count
+        log (callable): Callback receiving progress messages
+        store (JobStore): Job store used to skip stages finished by earlier runs
+        regenerate (bool): Request new images instead of reusing finished or cached ones
+        dedup_index (NearDuplicateIndex): Index used to flag papers nearly identical to earlier ones
+        reuse_duplicates (bool): Reuse the LLM response of the earlier paper instead of sending
+            a near-duplicate again (requires store)
+
+    Returns:
+        list: One record per PDF with duplicate_of if flagged, either image_path or error, and timings:
+            extract_s, network_s, latency_s (the paper's own time, without waiting in the batch queue)
+            and batch_elapsed_s (when it finished, counted from the start of the batch)
+    """
+    log = log or _noop_log
+    label = template_name or "custom"
+    client = LLMClient(api_key=api_key, base_url=base_url)
+    histories = {}  # 分析模型 -> 耗时记录，自动选择模型时每个模型分别读取
+    batch_start = time.perf_counter()
+    finished_events = {}  # doc_hash -> 本批次中该论文处理结束时设置的 Event
+    finished_lock = threading.Lock()
+
+    def run_network(record, pdf_content):
+        # 单篇耗时从论文被网络线程取出时算起（加上它自己的提取耗时），不包括在批次中排队的时间
+        dequeued = time.perf_counter()
+        doc_hash = record.get('doc_hash')
+        done = threading.Event()
+        if doc_hash is not None:
+            with finished_lock:
+                earlier = finished_events.setdefault(doc_hash, done)
+            if earlier is not done:
+                # 同一批次中内容完全相同的文件，等前一个处理完后复用它的结果
+                earlier.wait()
+        try:
+            with span("paper", pdf=os.path.basename(record['pdf'])), log_context(job_id=os.path.basename(record['pdf'])):
+                run_network_stages(record, pdf_content)
+        finally:
+            done.set()
+        finished = time.perf_counter()
+        record['latency_s'] = record.get('extract_s', 0.0) + finished - dequeued
+        record['batch_elapsed_s'] = finished - batch_start
+        return record
+
+    def find_duplicate(record, pdf_content):
+        """把论文加入近似重复索引，返回最相似的已处理论文"""
+        if record.get('doc_hash') is None:
+            record['doc_hash'] = hash_file(record['pdf'])
+        with span("dedup.lookup"):
+            matches = dedup_index.match_and_add(
+                record['doc_hash'], minhash_signature(pdf_content), os.path.basename(record['pdf'])
+            )
+        return matches[0] if matches else None
+
+    def history_for(model):
+        if model not in histories:
+            histories[model] = load_history(store, model, nanobanana_model)
+        return histories[model]
+
+    def reuse_duplicate(model, keys, duplicate):
+        """把近似重复论文已保存的 LLM 响应和代码块记到当前论文名下，之后的阶段直接复用"""
+        if store.get_stage(keys['llm'], 'llm') is not None:
+            return False  # 本论文已有自己的响应
+        duplicate_keys = stage_keys(duplicate['doc_hash'], prompt, model, nanobanana_model)
+        llm = store.get_stage(duplicate_keys['llm'], 'llm')
+        code_block = store.get_stage(duplicate_keys['parse'], 'parse')
+        if llm is None or code_block is None:
+            return False
+        # 不记录耗时，避免复用的结果影响耗时预估
+        meta = {'model': model, 'duplicate_of': duplicate['doc_hash'],
+                'similarity': round(duplicate['similarity'], 3)}
+        store.save_stage(keys['llm'], 'llm', llm['output'], None, meta)
+        store.save_stage(keys['parse'], 'parse', code_block['output'], None, meta)
+        return True
+
+    def run_network_stages(record, pdf_content):
+        start = time.perf_counter()
+        try:
+            # 先查找近似重复的论文，自动选择模型时选用回答过它的模型，才能复用它的响应
+            duplicate = find_duplicate(record, pdf_content) if dedup_index is not None else None
+            reuse_from = None
+            if duplicate is not None and reuse_duplicates and store is not None:
+                event = finished_events.get(duplicate['doc_hash'])
+                if event is not None:
+                    event.wait()  # 相似的论文在本批次中排在前面，等它处理完
+                reuse_from = duplicate['doc_hash']
+            model = route_model(model_name, pdf_content, prompt, store, record.get('doc_hash'), nanobanana_model,
+                                name=os.path.basename(record['pdf']), reuse_from=reuse_from)
+            record['model'] = model
+            keys = stage_keys(record.get('doc_hash'), prompt, model, nanobanana_model)
+            finished = store.get_stage(keys['image'], 'image') if store is not None and not regenerate else None
+            if finished is not None and os.path.exists(finished['output']):
+                # 已完成的论文直接复用之前的结果，不再创建新的输出目录
+                record['image_path'] = finished['output']
+                record['resumed'] = True
+            else:
+                if duplicate is not None:
+                    record['duplicate_of'] = duplicate
+                    log(f"≈ {record['pdf']}: 与 {duplicate['name']} 近似重复 (相似度 {duplicate['similarity']:.2f})")
+                    if reuse_duplicates and store is not None and reuse_duplicate(model, keys, duplicate):
+                        record['reused_llm'] = True
+                        log(f"↺ {record['pdf']}: 复用 {duplicate['name']} 的大语言模型响应")
+                if not record.get('reused_llm'):
+                    record['estimate'] = estimate_request(pdf_content, prompt, model, nanobanana_model, history_for(model))
+                    if record['estimate']['over_limit']:
+                        log(f"⚠ {record['pdf']}: 可能超出模型上下文长度 ({format_estimate(record['estimate'])})")
+                job_dir = create_job_dir(record['pdf'])
+                result = generate_from_content(
+                    client,
+                    pdf_content,
+                    prompt,
+                    model_name=model,
+                    nanobanana_model=nanobanana_model,
+                    filename=safe_filename(label),
+                    output_dir=job_dir,
+                    store=store,
+                    keys=keys,
+                    regenerate=regenerate
+                )
+                write_manifest(job_dir, record['pdf'], model, nanobanana_model, {label: result})
+                record['image_path'] = result['image_path']
+                record['usage'] = result['usage']
+        except Exception as e:
+            record['error'] = str(e)
+        record['network_s'] = time.perf_counter() - start
+        return record
+
+    records = []
+    extract = timed_read_pdf_content
+    if get_profiler() is not None:
+        # 内存分析只能统计本进程的分配，分析时在本进程中逐个提取
+        extract_pool_cm = ThreadPoolExecutor(max_workers=1)
+        extract = bind_context(timed_read_pdf_content)
+    else:
+        extract_pool_cm = ProcessPoolExecutor(max_workers=extract_jobs)
+    with extract_pool_cm as extract_pool, ThreadPoolExecutor(max_workers=jobs) as network_pool:
+        network_futures = []
+        extract_futures = {}
+        for path in pdf_paths:
+            record = {'pdf': path}
+            if store is not None:
+                record['doc_hash'] = hash_file(path)
+                extracted = store.get_stage(record['doc_hash'], 'extract')
+                if extracted is not None:
+                    record['extract_s'] = 0.0
+                    network_futures.append(
+                        network_pool.submit(bind_context(run_network), record, extracted['output'])
+                    )
+                    continue
+            extract_futures[extract_pool.submit(extract, path)] = record
+
+        for future in as_completed(extract_futures):
+            record = extract_futures[future]
+            try:
+                pdf_content, record['extract_s'] = future.result()
+            except Exception as e:
+                record['error'] = str(e)
+                record['batch_elapsed_s'] = time.perf_counter() - batch_start
+                log(f"✗ {record['pdf']}: {record['error']}")
+                records.append(record)
+                continue
+            tracer = get_tracer()
+            if tracer is not None:
+                # 提取在子进程中进行，按返回的耗时补记 span
+                tracer.add_span("stage.extract", time.perf_counter() - record['extract_s'], record['extract_s'],
+                                pdf=os.path.basename(record['pdf']))
+            if store is not None:
+                store.save_stage(record['doc_hash'], 'extract', pdf_content, record['extract_s'])
+            network_futures.append(network_pool.submit(bind_context(run_network), record, pdf_content))
+
+        for future in as_completed(network_futures):
+            record = future.result()
+            if 'error' in record:
+                log(f"✗ {record['pdf']}: {record['error']}")
+            elif record.get('resumed'):
+                log(f"↺ {record['pdf']} -> {record['image_path']} (已完成，跳过)")
+            else:
+                log(f"✓ {record['pdf']} -> {record['image_path']} ({record['latency_s']:.1f}s)")
+            records.append(record)
+
+    return records
+
+
+def estimate_batch(pdf_paths, prompt, model_name=None, nanobanana_model=None, extract_jobs=None, store=None):
+    """
+    Extract the PDFs and estimate tokens, cost and latency without calling any API
+
+    Args:
+        pdf_paths (list): Paths of the PDF files to estimate
+        prompt (str): Prompt sent together with each PDF's text
+        model_name (str): Name of the analysis model
+        nanobanana_model (str): Name of the image model
+        extract_jobs (int): Number of extraction processes, defaults to the CPU count
+        store (JobStore): Job store; extracted text is checkpointed so a later run reuses it
+
+    Returns:
+        list: One record per PDF with model and estimate, or error, in input order
+    """
+    histories = {}
+
+    def estimate(record, pdf_content):
+        model = model_name or MODEL_NAME
+        if is_auto(model):
+            # 只预估，不计入路由器对新模型的试用
+            model = get_router().choose(pdf_content, prompt, store, commit=False)['model']
+        if model not in histories:
+            histories[model] = load_history(store, model, nanobanana_model)
+        record['model'] = model
+        record['estimate'] = estimate_request(pdf_content, prompt, model, nanobanana_model, histories[model])
+
+    records = [{'pdf': path} for path in pdf_paths]
+    pending = []
+    for record in records:
+        if store is not None:
+            record['doc_hash'] = hash_file(record['pdf'])
+            extracted = store.get_stage(record['doc_hash'], 'extract')
+            if extracted is not None:
+                estimate(record, extracted['output'])
+                continue
+        pending.append(record)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=extract_jobs) as extract_pool:
+            futures = {extract_pool.submit(timed_read_pdf_content, r['pdf']): r for r in pending}
+            for future in as_completed(futures):
+                record = futures[future]
+                try:
+                    pdf_content, extract_s = future.result()
+                except Exception as e:
+                    record['error'] = str(e)
+                    continue
+                if store is not None:
+                    store.save_stage(record['doc_hash'], 'extract', pdf_content, extract_s)
+                estimate(record, pdf_content)
+    return records
+
+
+def process_task(client, payload, store=None, output_dir=None, log=None):
+    """
+    Run the whole pipeline for one work queue task
+
+    Args:
+        client (LLMClient): Client used for the LLM and image requests
+        payload (dict): Task payload with pdf, prompt, template, model and image_model,
+            and optionally doc_hash if the caller already hashed the file
+        store (JobStore): Job store shared by the workers
+        output_dir (str): Parent directory of the job output directories, defaults to OUTPUT_DIR
+
+    Returns:
+        dict: image_path, job_dir and the analysis model of the result
+    """
+    log = log or _noop_log
+    pdf_file_path = payload['pdf']
+    doc_hash = payload.get('doc_hash') or (hash_file(pdf_file_path) if store is not None else None)
+    model = payload['model']
+    if is_auto(model or MODEL_NAME):
+        # 自动选择模型要看文档长度，先提取 (已保存的提取结果直接复用)
+        pdf_content = extract_pdf(pdf_file_path, store, doc_hash, log)
+        model = route_model(model, pdf_content, payload['prompt'], store, doc_hash, payload['image_model'],
+                            name=os.path.basename(pdf_file_path))
+    else:
+        pdf_content = None
+    keys = stage_keys(doc_hash, payload['prompt'], model, payload['image_model'])
+    finished = store.get_stage(keys['image'], 'image') if store is not None else None
+    if finished is not None and os.path.exists(finished['output']):
+        # 任务被重新投递时，之前的 worker 可能已经生成了图像
+        log("↺ 复用已完成的阶段: image")
+        return {'image_path': finished['output'], 'job_dir': os.path.dirname(finished['output']), 'model': model}
+
+    if pdf_content is None:
+        pdf_content = extract_pdf(pdf_file_path, store, doc_hash, log)
+    job_dir = create_job_dir(pdf_file_path, output_dir)
+    result = generate_from_content(
+        client,
+        pdf_content,
+        payload['prompt'],
+        model_name=model,
+        nanobanana_model=payload['image_model'],
+        filename=safe_filename(payload['template']),
+        output_dir=job_dir,
+        log=log,
+        store=store,
+        keys=keys
+    )
+    write_manifest(job_dir, pdf_file_path, model, payload['image_model'], {payload['template']: result})
+    return {'image_path': result['image_path'], 'job_dir': job_dir, 'model': model}
+
+
+def run_worker(queue, api_key=None, base_url=None, worker_id=None, concurrency=1, lease_s=60, poll_s=1.0,
+               exit_when_empty=False, output_dir=None, log=None, store=None, stop_event=None):
+    """
+    Process tasks from a shared work queue until stopped
+
+    Args:
+        queue: Work queue returned by work_queue.open_queue
+        api_key (str): API key of this worker
+        base_url (str): Base URL for the API
+        worker_id (str): Name recorded on leased tasks, defaults to host:pid
+        concurrency (int): Number of tasks processed at once by this worker
+        lease_s (float): Lease length; a task not renewed in time is delivered to another worker
+        poll_s (float): Seconds to wait when the queue is empty
+        exit_when_empty (bool): Return once no task is queued or leased instead of waiting for more
+        output_dir (str): Shared parent directory of the job output directories
+        log (callable): Callback receiving progress messages
+        store (JobStore): Job store shared by the workers
+        stop_event (threading.Event): Set to stop after the current tasks
+
+    Returns:
+        list: One record per task handled by this worker, with id, pdf, attempts, duration_s and image_path or error
+    """
+    log = log or _noop_log
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop_event = stop_event or threading.Event()
+    client = LLMClient(api_key=api_key, base_url=base_url)
+    records = []
+
+    def loop(slot):
+        name = f"{worker_id}/{slot}" if concurrency > 1 else worker_id
+
+        def task_log(message):
+            log(f"[{name}] {message}")
+
+        while not stop_event.is_set():
+            task = queue.lease(name, lease_s)
+            if task is None:
+                if exit_when_empty:
+                    counts = queue.stats()
+                    if counts[STATUS_QUEUED] == 0 and counts[STATUS_LEASED] == 0:
+                        return
+                stop_event.wait(poll_s)
+                continue
+
+            pdf = task['payload']['pdf']
+            record = {'id': task['id'], 'pdf': pdf, 'attempts': task['attempts']}
+            log(f"[{name}] 开始处理 {os.path.basename(pdf)} (第 {task['attempts']} 次投递)")
+            start = time.perf_counter()
+            with Heartbeat(queue, task, lease_s) as heartbeat, log_context(job_id=task['id']):
+                try:
+                    result = process_task(client, task['payload'], store, output_dir, task_log)
+                except Exception as e:
+                    record['error'] = str(e)
+            record['duration_s'] = time.perf_counter() - start
+
+            if heartbeat.lost:
+                # 租约已过期，任务可能已交给其他 worker，不再提交结果
+                log(f"[{name}] ⚠ 租约已丢失，放弃 {os.path.basename(pdf)} 的结果")
+                record['error'] = record.get('error') or "租约已丢失"
+            elif 'error' in record:
+                queue.fail(task, record['error'])
+                log(f"[{name}] ✗ {os.path.basename(pdf)}: {record['error']}")
+            else:
+                record['image_path'] = result['image_path']
+                if queue.complete(task, result):
+                    log(f"[{name}] ✓ {os.path.basename(pdf)} -> {result['image_path']} ({record['duration_s']:.1f}s)")
+                else:
+                    log(f"[{name}] ⚠ 租约已丢失，结果未提交: {os.path.basename(pdf)}")
+            records.append(record)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(loop, slot) for slot in range(concurrency)]:
+            future.result()
+    return records
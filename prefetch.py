@@ -0,0 +1,144 @@
+"""
+Prefetch Module
+Starts PDF metadata lookup and text extraction as soon as a file is selected
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pdf_handler import get_pdf_info
+from job_store import hash_file
+from pipeline import extract_pdf
+
+
+class PdfPrefetcher:
+    def __init__(self, store=None, max_workers=2, max_entries=32):
+        """
+        Extract selected PDFs in the background so processing can start without waiting
+
+        Args:
+            store (JobStore): Job store; prefetched text is also checkpointed there
+            max_workers (int): Number of background extraction threads
+            max_entries (int): Number of prefetched documents kept in memory until taken
+        """
+        self.store = store
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        # 页数和大小单独用一个线程读取，不排在耗时的文本提取之后
+        self._info_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch-info')
+        self._entries = OrderedDict()  # (path, mtime, size) -> Future[(doc_hash, content)]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry_key(pdf_file_path):
+        # 文件被修改后预读取结果失效
+        stat = os.stat(pdf_file_path)
+        return os.path.abspath(pdf_file_path), stat.st_mtime_ns, stat.st_size
+
+    def _extract(self, pdf_file_path):
+        doc_hash = hash_file(pdf_file_path)
+        return doc_hash, extract_pdf(pdf_file_path, self.store, doc_hash)
+
+    def prefetch(self, pdf_file_path, on_info=None, on_error=None):
+        """
+        Look up metadata and start text extraction in the background
+
+        Args:
+            pdf_file_path (str): Path to the PDF file
+            on_info (callable): Called as on_info(path, info) from a worker thread
+            on_error (callable): Called as on_error(path, message) from a worker thread
+        """
+        def load_info():
+            try:
+                info = get_pdf_info(pdf_file_path)
+            except Exception as e:
+                if on_error:
+                    on_error(pdf_file_path, str(e))
+                return
+            if on_info:
+                on_info(pdf_file_path, info)
+
+        self._info_executor.submit(load_info)
+
+        try:
+            key = self._entry_key(pdf_file_path)
+        except OSError:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = self._executor.submit(self._extract, pdf_file_path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def take(self, pdf_file_path, timeout=None):
+        """
+        Get the prefetched text, waiting for an extraction that is still running
+
+        The entry is removed, so the text is not kept in memory after the job took it; taking
+        the same file again returns None and the job reads the stored extraction instead.
+
+        Args:
+            pdf_file_path (str): Path to the PDF file
+            timeout (float): Seconds to wait, None waits until the extraction finishes
+
+        Returns:
+            tuple: (doc_hash, content), or None if the file was not prefetched or extraction failed
+        """
+        try:
+            key = self._entry_key(pdf_file_path)
+        except OSError:
+            return None
+        with self._lock:
+            future = self._entries.pop(key, None)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            # 预读取失败时由任务自己重新读取并报告错误
+            return None
+
+    def when_ready(self, pdf_file_path, callback):
+        """
+        Run a callback on the prefetched text once extraction has finished, without blocking
+
+        A file that was already taken or evicted is extracted again in the background (usually
+        just read back from the job store); that text is passed to the callback but not kept.
+
+        Args:
+            pdf_file_path (str): Path to the PDF file
+            callback (callable): Called as callback(path, doc_hash, content) from a worker thread;
+                not called if extraction failed
+        """
+        try:
+            key = self._entry_key(pdf_file_path)
+        except OSError:
+            return
+        with self._lock:
+            future = self._entries.get(key)
+        if future is None:
+            try:
+                future = self._executor.submit(self._extract, pdf_file_path)
+            except RuntimeError:
+                return  # 已关闭
+
+        def done(finished):
+            try:
+                doc_hash, content = finished.result()
+            except Exception:
+                return
+            try:
+                # 已完成的 future 会在调用线程中直接执行回调，统一转到后台线程
+                self._executor.submit(callback, pdf_file_path, doc_hash, content)
+            except RuntimeError:
+                pass  # 已关闭
+
+        future.add_done_callback(done)
+
+    def shutdown(self):
+        """停止后台线程，不等待未开始的任务"""
+        self._info_executor.shutdown(wait=False, cancel_futures=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,410 @@
+"""
+Server Module
+HTTP service that runs the pipeline for a whole team on one shared worker pool
+and one shared job store:
+
+    python -m cli serve --port 8080 --workers 8 --per-key 2
+
+    POST /jobs                 上传 PDF (multipart 字段 file，可选 template / prompt / model / image_model)
+    GET  /jobs/{id}            查询任务状态
+    GET  /jobs/{id}/events     以 Server-Sent Events 推送任务状态
+    GET  /jobs/{id}/image      下载生成的图像
+    GET  /health               队列长度和运行中的任务数
+
+API 密钥通过 `Authorization: Bearer <key>` 传入；只有以 --share-key 启动时，未提供密钥的请求才使用服务端配置的密钥。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from config import DATA_DIR, OUTPUT_DIR, PROMPT_TEMPLATES, ensure_dir
+from job_store import hash_file
+from llm_client import LLMClient
+from log_setup import log_context
+from tracing import bind_context
+from pipeline import (
+    create_job_dir, extract_pdf, parse_code_block, request_image, request_llm, route_model, safe_filename,
+    stage_keys, write_manifest
+)
+
+FINISHED_STATUSES = ('done', 'failed')
+QUEUE_DEPTH_HEADER = 'X-Queue-Depth'
+
+
+class QueueFull(Exception):
+    """队列已满，调用方应稍后重试"""
+
+
+class JobManager:
+    def __init__(self, api_key=None, base_url=None, model_name=None, nanobanana_model=None, store=None,
+                 workers=4, per_key=2, max_queue=32, max_jobs=1000, upload_dir=None, output_dir=None,
+                 share_key=False):
+        """
+        Queue of pipeline jobs shared by all clients of the server
+
+        Args:
+            api_key (str): Server key, used when a request doesn't bring its own and share_key is set
+            base_url (str): Base URL for the API
+            model_name (str): Default analysis model
+            nanobanana_model (str): Default image model
+            store (JobStore): Job store shared by all jobs, so identical papers reuse earlier stages
+            workers (int): Number of jobs running at once
+            per_key (int): Number of jobs running at once for a single API key
+            max_queue (int): Number of waiting jobs after which submissions are rejected
+            max_jobs (int): Number of jobs kept in memory for status queries
+            upload_dir (str): Directory uploaded PDFs are stored in
+            output_dir (str): Parent directory of the job output directories
+            share_key (bool): Run requests without their own key on the server key instead of rejecting them
+        """
+        self.api_key = api_key
+        self.share_key = share_key
+        self.base_url = base_url
+        self.model_name = model_name
+        self.nanobanana_model = nanobanana_model
+        self.store = store
+        self.workers = workers
+        self.per_key = per_key
+        self.max_queue = max_queue
+        self.max_jobs = max_jobs
+        self.upload_dir = upload_dir or os.path.join(DATA_DIR, 'uploads')
+        self.output_dir = output_dir or OUTPUT_DIR
+
+        self.jobs = OrderedDict()  # job_id -> job dict，只在事件循环线程中修改
+        self.events = {}  # job_id -> asyncio.Event，任务状态变化时触发
+        self.key_limits = {}  # key_id -> asyncio.Semaphore
+        self.clients = {}  # api_key -> LLMClient
+        self.clients_lock = threading.Lock()
+        self.slots = None
+        self.loop = None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='serve')
+
+    def start(self):
+        """在事件循环中调用，绑定循环并创建并发限制"""
+        self.loop = asyncio.get_running_loop()
+        self.slots = asyncio.Semaphore(self.workers)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def queue_depth(self):
+        return sum(1 for job in self.jobs.values() if job['status'] == 'queued')
+
+    def running_count(self):
+        return sum(1 for job in self.jobs.values() if job['status'] == 'running')
+
+    def submit(self, pdf_name, pdf_bytes, api_key=None, template=None, prompt=None, model_name=None,
+               nanobanana_model=None):
+        """
+        Store the uploaded PDF and queue a job for it
+
+        Args:
+            pdf_name (str): Original filename of the PDF
+            pdf_bytes (bytes): PDF file content
+            api_key (str): Key of the requesting client, defaults to the server key if share_key is set
+            template (str): Name of a built-in prompt template
+            prompt (str): Custom prompt, takes precedence over template
+            model_name (str): Analysis model, defaults to the server setting
+            nanobanana_model (str): Image model, defaults to the server setting
+
+        Returns:
+            dict: The queued job
+        """
+        if not api_key and self.share_key:
+            api_key = self.api_key
+        if not api_key:
+            raise Exception("缺少 API 密钥，请通过 Authorization: Bearer <key> 传入")
+        if prompt:
+            label = "自定义"
+        else:
+            label = template or list(PROMPT_TEMPLATES.keys())[0]
+            if label not in PROMPT_TEMPLATES:
+                raise Exception(f"未知的提示词模板: {label}，可选: {', '.join(PROMPT_TEMPLATES)}")
+            prompt = PROMPT_TEMPLATES[label]
+        depth = self.queue_depth()
+        if depth >= self.max_queue:
+            raise QueueFull(depth)
+
+        # 按内容保存上传的文件，同一篇论文只存一份，文件名保持原样
+        digest = hashlib.sha256(pdf_bytes).hexdigest()[:16]
+        pdf_path = os.path.join(ensure_dir(os.path.join(self.upload_dir, digest)), safe_filename(pdf_name))
+        if not os.path.exists(pdf_path):
+            with open(pdf_path, 'wb') as f:
+                f.write(pdf_bytes)
+
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'stage': None,
+            'pdf': os.path.basename(pdf_path),
+            'template': label,
+            'model': model_name or self.model_name,
+            'image_model': nanobanana_model or self.nanobanana_model,
+            'key_id': hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:8],
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'stages': {},
+            'log': [],
+            'image_path': None,
+            'error': None
+        }
+        self.jobs[job_id] = job
+        self.events[job_id] = asyncio.Event()
+        self._forget_old_jobs()
+        self.loop.create_task(self._execute(job, pdf_path, prompt, api_key))
+        return job
+
+    def _forget_old_jobs(self):
+        # 只保留最近的任务记录，已完成的最早任务先被移除
+        while len(self.jobs) > self.max_jobs:
+            for job_id, job in self.jobs.items():
+                if job['status'] in FINISHED_STATUSES:
+                    del self.jobs[job_id]
+                    self.events.pop(job_id, None)
+                    break
+            else:
+                return
+
+    def _key_limit(self, key_id):
+        if key_id not in self.key_limits:
+            self.key_limits[key_id] = asyncio.Semaphore(self.per_key)
+        return self.key_limits[key_id]
+
+    def _client(self, api_key):
+        # 同一密钥的任务共用一个客户端及其连接池
+        with self.clients_lock:
+            if api_key not in self.clients:
+                self.clients[api_key] = LLMClient(api_key=api_key, base_url=self.base_url)
+            return self.clients[api_key]
+
+    def update(self, job, log=None, **fields):
+        """在事件循环线程中更新任务并通知订阅者"""
+        job.update(fields)
+        if log is not None:
+            job['log'].append(log)
+        event = self.events.get(job['id'])
+        if event is not None:
+            event.set()
+            self.events[job['id']] = asyncio.Event()
+
+    def post_update(self, job, log=None, **fields):
+        """从工作线程更新任务"""
+        self.loop.call_soon_threadsafe(lambda: self.update(job, log, **fields))
+
+    def change_event(self, job_id):
+        """返回任务下一次变化时触发的事件，应在读取任务状态之前获取"""
+        return self.events.get(job_id) or asyncio.Event()
+
+    async def wait_for_change(self, event, timeout):
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _execute(self, job, pdf_path, prompt, api_key):
+        # 先占用密钥的并发名额再占用全局名额，受限的密钥不会占着工作线程
+        async with self._key_limit(job['key_id']):
+            async with self.slots:
+                self.update(job, status='running', started=time.time())
+                try:
+                    with log_context(job_id=job['id']):
+                        # 工作线程不继承协程的上下文，日志的任务编号随 bind_context 传入
+                        image_path = await self.loop.run_in_executor(
+                            self.executor, bind_context(self._run_stages), job, pdf_path, prompt, api_key
+                        )
+                except Exception as e:
+                    self.update(job, log=f"✗ 处理失败: {str(e)}", status='failed', error=str(e),
+                                finished=time.time())
+                else:
+                    self.update(job, log="✓ 全部处理完成", status='done', stage=None, image_path=image_path,
+                                finished=time.time())
+
+    def _run_stages(self, job, pdf_path, prompt, api_key):
+        """在工作线程中依次运行各阶段，返回图像路径"""
+        def log(message):
+            self.post_update(job, log=message)
+
+        stages = {}
+
+        def run(stage, func):
+            self.post_update(job, stage=stage)
+            start = time.perf_counter()
+            result = func()
+            stages[stage] = round(time.perf_counter() - start, 3)
+            self.post_update(job, stages=dict(stages))
+            return result
+
+        client = self._client(api_key)
+        store = self.store
+        doc_hash = hash_file(pdf_path)
+
+        pdf_content = run('extract', lambda: extract_pdf(pdf_path, store, doc_hash, log))
+        log(f"✓ PDF内容读取完成，共 {len(pdf_content)} 个字符")
+        model = route_model(job['model'], pdf_content, prompt, store, doc_hash, job['image_model'], name=job['pdf'])
+        if model != job['model']:
+            self.post_update(job, log=f"模型路由: 使用 {model}", model=model)
+        keys = stage_keys(doc_hash, prompt, model, job['image_model'])
+        llm_response = run('llm', lambda: request_llm(
+            client, pdf_content, prompt, model, store, keys['llm'], log
+        ))
+        code_block = run('parse', lambda: parse_code_block(llm_response, store, keys['parse'], log))
+
+        finished = store.get_stage(keys['image'], 'image') if store is not None else None
+        if finished is not None and os.path.exists(finished['output']):
+            # 其他成员已生成过相同的图像，直接复用
+            log("↺ 复用已完成的阶段: image")
+            return finished['output']
+        job_dir = create_job_dir(pdf_path, self.output_dir)
+        image_path = run('image', lambda: request_image(
+            client, code_block, job['image_model'], filename=safe_filename(job['template']), output_dir=job_dir,
+            store=store, key=keys['image'], log=log
+        ))
+        write_manifest(
+            job_dir, pdf_path, model, job['image_model'], {job['template']: {'image_path': image_path}}
+        )
+        return image_path
+
+
+def job_view(job):
+    """返回给客户端的任务信息"""
+    view = {key: value for key, value in job.items() if key != 'image_path'}
+    view['has_image'] = job['image_path'] is not None
+    return view
+
+
+def json_error(status, message, headers=None):
+    return web.json_response({'error': message}, status=status, headers=headers)
+
+
+def request_api_key(request, form):
+    auth = request.headers.get('Authorization', '')
+    if auth.lower().startswith('bearer '):
+        return auth[len('bearer '):].strip()
+    return form.get('api_key')
+
+
+async def handle_submit(request):
+    manager = request.app['manager']
+    form = {}
+    pdf_name = pdf_bytes = None
+    reader = await request.multipart()
+    async for part in reader:
+        if part.name == 'file':
+            pdf_name = part.filename or 'upload.pdf'
+            pdf_bytes = await part.read()
+        elif part.name:
+            form[part.name] = (await part.text()).strip()
+    if not pdf_bytes:
+        return json_error(400, "缺少 PDF 文件 (multipart 字段 file)")
+
+    try:
+        job = manager.submit(
+            pdf_name, pdf_bytes,
+            api_key=request_api_key(request, form),
+            template=form.get('template'),
+            prompt=form.get('prompt'),
+            model_name=form.get('model'),
+            nanobanana_model=form.get('image_model')
+        )
+    except QueueFull as e:
+        # 背压：队列已满时拒绝新任务，客户端根据队列长度和 Retry-After 重试
+        return json_error(429, "队列已满，请稍后重试", headers={
+            QUEUE_DEPTH_HEADER: str(e.args[0]),
+            'Retry-After': str(max(1, e.args[0] // max(1, manager.workers)))
+        })
+    except Exception as e:
+        return json_error(400, str(e))
+
+    return web.json_response(
+        job_view(job), status=202,
+        headers={'Location': f"/jobs/{job['id']}", QUEUE_DEPTH_HEADER: str(manager.queue_depth())}
+    )
+
+
+def get_job(request):
+    job = request.app['manager'].jobs.get(request.match_info['job_id'])
+    if job is None:
+        raise web.HTTPNotFound(
+            text=json.dumps({'error': "任务不存在"}, ensure_ascii=False), content_type='application/json'
+        )
+    return job
+
+
+async def handle_status(request):
+    return web.json_response(job_view(get_job(request)))
+
+
+async def handle_events(request):
+    manager = request.app['manager']
+    job = get_job(request)
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+    await response.prepare(request)
+    sent_logs = 0
+    while True:
+        event = manager.change_event(job['id'])
+        view = job_view(job)
+        view['log'] = job['log'][sent_logs:]
+        sent_logs = len(job['log'])
+        await response.write(f"data: {json.dumps(view, ensure_ascii=False)}\n\n".encode('utf-8'))
+        if job['status'] in FINISHED_STATUSES:
+            break
+        await manager.wait_for_change(event, timeout=15)
+    return response
+
+
+async def handle_image(request):
+    job = get_job(request)
+    if job['status'] != 'done':
+        return json_error(409, f"任务尚未完成 (状态: {job['status']})")
+    if not os.path.exists(job['image_path']):
+        return json_error(410, "图像文件已被删除")
+    return web.FileResponse(job['image_path'])
+
+
+async def handle_health(request):
+    manager = request.app['manager']
+    depth = manager.queue_depth()
+    return web.json_response(
+        {'queued': depth, 'running': manager.running_count(), 'workers': manager.workers,
+         'max_queue': manager.max_queue},
+        headers={QUEUE_DEPTH_HEADER: str(depth)}
+    )
+
+
+def create_app(manager, max_upload_mb=100):
+    """
+    Build the aiohttp application around a JobManager
+
+    Args:
+        manager (JobManager): Queue the handlers submit jobs to
+        max_upload_mb (int): Largest accepted request body in megabytes
+
+    Returns:
+        web.Application: The application
+    """
+    app = web.Application(client_max_size=max_upload_mb * 1024 * 1024)
+    app['manager'] = manager
+
+    async def on_startup(app):
+        manager.start()
+
+    async def on_cleanup(app):
+        manager.close()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post('/jobs', handle_submit)
+    app.router.add_get('/jobs/{job_id}', handle_status)
+    app.router.add_get('/jobs/{job_id}/events', handle_events)
+    app.router.add_get('/jobs/{job_id}/image', handle_image)
+    app.router.add_get('/health', handle_health)
+    return app
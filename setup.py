@@ -4,10 +4,13 @@ Setup script for creating Mac application bundle
 from setuptools import setup
 
 APP = ['main.py']
-DATA_FILES = [('', ['.env'])]
+# 不打包 .env：API 密钥只从环境变量读取，不应随应用分发
+DATA_FILES = []
 OPTIONS = {
     'argv_emulation': True,
-    'packages': ['tkinter', 'openai', 'PyPDF2', 'PIL', 'dotenv'],
+    # 只强制打包运行时确实需要的包；tkinter 已被 PySide6 取代，排除后包体更小、启动更快
+    'packages': ['openai', 'PyPDF2', 'PIL'],
+    'excludes': ['tkinter'],
     'iconfile': 'app.icns',  # 如果你有一个图标文件的话
     'plist': {
         'CFBundleName': 'PDF2Image',
@@ -26,7 +29,6 @@ setup(
     install_requires=[
         'openai>=1.0.0',
         'PyPDF2',
-        'Pillow',
-        'python-dotenv'
+        'Pillow'
     ]
 )
\ No newline at end of file
@@ -0,0 +1,23 @@
+"""
+Shared fixtures for the test suite
+"""
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 测试不使用也不写入用户的图像缓存和日志文件
+os.environ['IMAGE_CACHE_MAX_MB'] = '0'
+os.environ['LOG_FILE'] = ''
+
+from fake_api import FakeAPIServer
+
+
+@pytest.fixture
+def fake_api():
+    """本地模拟接口，每个测试单独计数"""
+    with FakeAPIServer() as server:
+        yield server
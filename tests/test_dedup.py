@@ -0,0 +1,92 @@
+"""
+Near-duplicate detection and reuse of the earlier paper's LLM response
+"""
+import pytest
+
+import pipeline
+from benchmarks.fixtures import make_pdf
+from config import DEDUP_THRESHOLD
+from dedup import NearDuplicateIndex, minhash_signature, signature_similarity
+from job_store import JobStore, hash_file
+from pdf_handler import read_pdf_content
+from pipeline import stage_keys
+
+MODEL = 'kimi-k2-thinking'
+PROMPT = "Summarize the paper."
+
+
+@pytest.fixture
+def papers(tmp_path):
+    """预印本、多一页附录的正式版（前面的内容相同）和一篇无关的论文"""
+    return {
+        'preprint': make_pdf(str(tmp_path / 'preprint.pdf'), 10, seed=1),
+        'camera_ready': make_pdf(str(tmp_path / 'camera_ready.pdf'), 11, seed=1),
+        'unrelated': make_pdf(str(tmp_path / 'unrelated.pdf'), 10, seed=2),
+    }
+
+
+def signature_of(path):
+    return minhash_signature(read_pdf_content(path))
+
+
+def test_preprint_and_camera_ready_match(tmp_path, papers):
+    preprint = signature_of(papers['preprint'])
+    # 大小写和排版不同不影响签名
+    camera_ready = minhash_signature(read_pdf_content(papers['camera_ready']).upper().replace(" ", "\n "))
+    unrelated = signature_of(papers['unrelated'])
+
+    assert signature_similarity(preprint, camera_ready) >= DEDUP_THRESHOLD
+    assert signature_similarity(preprint, unrelated) < 0.2
+
+    index = NearDuplicateIndex(str(tmp_path / 'dedup.sqlite3'))
+    assert index.match_and_add('preprint', preprint, 'preprint.pdf') == []
+    assert index.match_and_add('unrelated', unrelated, 'unrelated.pdf') == []
+    [match] = index.match_and_add('camera_ready', camera_ready, 'camera_ready.pdf')
+    assert (match['doc_hash'], match['name']) == ('preprint', 'preprint.pdf')
+    index.close()
+
+
+def test_short_text_has_no_signature():
+    # 扫描版等几乎没有文本的论文不会互相匹配
+    assert minhash_signature("Figure 1") is None
+
+
+def test_index_persists_after_reopening(tmp_path, papers):
+    path = str(tmp_path / 'dedup.sqlite3')
+    first = NearDuplicateIndex(path)
+    first.match_and_add('preprint', signature_of(papers['preprint']), 'preprint.pdf')
+    first.close()
+
+    second = NearDuplicateIndex(path)
+    assert second.count() == 1
+    assert [match['doc_hash'] for match in second.query(signature_of(papers['camera_ready']))] == ['preprint']
+    second.close()
+
+
+def test_reuse_copies_the_earlier_response(fake_api, tmp_path, papers, monkeypatch):
+    monkeypatch.setattr(pipeline, 'OUTPUT_DIR', str(tmp_path / 'output'))
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    index = NearDuplicateIndex(str(tmp_path / 'dedup.sqlite3'))
+
+    def run(path):
+        [record] = pipeline.run_batch(
+            [path], PROMPT, api_key='test', base_url=fake_api.base_url, model_name=MODEL,
+            nanobanana_model='nano-banana', jobs=1, extract_jobs=1, store=store, dedup_index=index,
+            reuse_duplicates=True
+        )
+        return record
+
+    first = run(papers['preprint'])
+    second = run(papers['camera_ready'])
+    third = run(papers['unrelated'])
+
+    assert 'duplicate_of' not in first and 'duplicate_of' not in third
+    assert second['duplicate_of']['doc_hash'] == first['doc_hash'] and second['reused_llm']
+    assert fake_api.model_requests[MODEL] == 2
+    original = stage_keys(hash_file(papers['preprint']), PROMPT, MODEL, 'nano-banana')
+    reused = stage_keys(hash_file(papers['camera_ready']), PROMPT, MODEL, 'nano-banana')
+    for stage in ('llm', 'parse'):
+        assert store.get_stage(reused[stage], stage)['output'] == store.get_stage(original[stage], stage)['output']
+    assert store.get_stage(reused['llm'], 'llm')['meta']['duplicate_of'] == first['doc_hash']
+    index.close()
+    store.close()
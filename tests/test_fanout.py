@@ -0,0 +1,74 @@
+"""
+Several templates run against one PDF extraction
+"""
+import os
+import time
+
+import pytest
+
+import pipeline
+from benchmarks.fixtures import make_pdf
+from fake_api import FakeAPIServer
+from llm_client import LLMClient
+from pdf_handler import read_pdf_content
+
+MODEL = 'kimi-k2-thinking'
+TEMPLATES = {'first': "Summarize the paper.", 'second': "Describe the method.", 'third': "List the results."}
+
+
+@pytest.fixture
+def pdf(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, 'OUTPUT_DIR', str(tmp_path / 'output'))
+    return make_pdf(str(tmp_path / 'paper.pdf'), 3)
+
+
+def count_extractions(monkeypatch):
+    calls = []
+
+    def read(path):
+        calls.append(path)
+        return read_pdf_content(path)
+
+    monkeypatch.setattr(pipeline, 'read_pdf_content', read)
+    return calls
+
+
+def test_templates_share_one_extraction_and_run_concurrently(pdf, monkeypatch):
+    extractions = count_extractions(monkeypatch)
+
+    with FakeAPIServer(latency=0.4, image_latency=0.0) as server:
+        LLMClient(api_key='test', base_url=server.base_url)  # 首次创建客户端时导入 openai，不计入耗时
+        start = time.perf_counter()
+        result = pipeline.run_fanout(
+            pdf, list(TEMPLATES), api_key='test', base_url=server.base_url, model_name=MODEL,
+            nanobanana_model='nano-banana', templates=TEMPLATES
+        )
+        elapsed = time.perf_counter() - start
+
+    assert extractions == [pdf]
+    # 依次运行需要 3 × 0.4 秒
+    assert elapsed < 1.0
+    images = {name: result['results'][name]['image_path'] for name in TEMPLATES}
+    assert len(set(images.values())) == len(TEMPLATES)
+    assert all(os.path.dirname(path) == result['job_dir'] and os.path.exists(path) for path in images.values())
+
+
+def test_failed_template_does_not_stop_the_others(pdf):
+    templates = dict(TEMPLATES, long="Explain every figure. " * 500)
+    content_chars = len(read_pdf_content(pdf))
+    logs = []
+
+    with FakeAPIServer(max_prompt_chars=content_chars + 2000) as server:
+        result = pipeline.run_fanout(
+            pdf, list(templates), api_key='test', base_url=server.base_url, model_name=MODEL,
+            nanobanana_model='nano-banana', templates=templates, log=logs.append
+        )
+
+    assert 'context length' in result['results']['long']['error']
+    assert all('image_path' in result['results'][name] for name in TEMPLATES)
+    assert any(line.startswith("[long] ✗") for line in logs)
+
+
+def test_no_template_selected(pdf):
+    with pytest.raises(Exception, match="未选择任何提示词模板"):
+        pipeline.run_fanout(pdf, [], api_key='test')
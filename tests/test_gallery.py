@@ -0,0 +1,136 @@
+"""
+Gallery entries read from the job.json manifests
+"""
+import json
+import os
+
+import pytest
+
+pytest.importorskip('PySide6')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication
+
+from fake_api import make_png
+from gallery import ALL_LABEL, UNKNOWN_LABEL, GalleryModel, GalleryWidget, ThumbnailCache, scan_job_dir, scan_outputs
+
+
+@pytest.fixture
+def qapp():
+    return QApplication.instance() or QApplication([])
+
+
+def write_image(path, width=64, height=64):
+    with open(path, 'wb') as f:
+        f.write(make_png(width, height))
+    return str(path)
+
+
+def write_job(job_dir, manifest, images):
+    os.makedirs(job_dir)
+    for name in images:
+        write_image(os.path.join(job_dir, name))
+    with open(os.path.join(job_dir, 'job.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+
+def test_model_is_read_per_template(tmp_path):
+    job_dir = str(tmp_path / 'paper_20260101_000000')
+    write_job(job_dir, {
+        'pdf': '/papers/paper.pdf', 'model': 'auto', 'image_model': 'nano-banana',
+        'templates': {
+            'first': {'image': 'first.png', 'model': 'kimi-k2-thinking'},
+            'second': {'image': 'second.png', 'model': 'gemini-3-pro'}
+        }
+    }, ['first.png', 'second.png'])
+
+    models = {entry['template']: entry['model'] for entry in scan_job_dir(job_dir)}
+
+    assert models == {'first': 'kimi-k2-thinking', 'second': 'gemini-3-pro'}
+
+
+def test_model_falls_back_to_manifest(tmp_path):
+    # 之前版本的清单只在顶层记录模型
+    job_dir = str(tmp_path / 'paper_20250101_000000')
+    write_job(job_dir, {
+        'pdf': '/papers/paper.pdf', 'model': 'kimi-k2-thinking', 'image_model': 'nano-banana',
+        'templates': {'first': {'image': 'first.png'}}
+    }, ['first.png'])
+
+    assert [entry['model'] for entry in scan_job_dir(job_dir)] == ['kimi-k2-thinking']
+
+
+def test_scan_outputs_indexes_job_dirs_and_loose_images(tmp_path):
+    write_job(str(tmp_path / 'paper_20250101_000000'), {
+        'pdf': '/papers/paper.pdf', 'model': 'kimi-k2-thinking', 'image_model': 'nano-banana',
+        'templates': {'first': {'image': 'first.png'}}
+    }, ['first.png'])
+    # 旧版本直接保存在输出目录中的图像
+    loose = write_image(tmp_path / 'old_paper_20240101_000000_2.png')
+    os.utime(loose, (1, 1))
+    with open(tmp_path / 'notes.txt', 'w') as f:
+        f.write("not an image")
+
+    entries = scan_outputs(str(tmp_path))
+
+    assert [(entry['paper'], entry['template'], entry['model']) for entry in entries] == [
+        ('paper', 'first', 'kimi-k2-thinking'), ('old_paper', UNKNOWN_LABEL, UNKNOWN_LABEL)
+    ]
+    assert scan_outputs(str(tmp_path / 'missing')) == []
+
+
+def test_thumbnail_is_scaled_and_cached(tmp_path, qapp):
+    image = write_image(tmp_path / 'poster.png', 800, 400)
+    cache = ThumbnailCache(str(tmp_path / 'thumbnails'), size=100)
+
+    thumbnail = cache.load(image)
+
+    assert (thumbnail.width(), thumbnail.height()) == (100, 50)
+    cached = cache.thumbnail_path(image)
+    assert os.path.exists(cached)
+    # 再次加载直接读取缓存；图像被修改后缓存失效
+    assert cache.load(image).size() == thumbnail.size()
+    write_image(tmp_path / 'poster.png', 400, 400)
+    os.utime(image, (1, 1))
+    assert cache.thumbnail_path(image) != cached
+    assert (cache.load(image).width(), cache.load(image).height()) == (100, 100)
+
+
+def test_model_decodes_each_thumbnail_once_and_bounds_memory(tmp_path, qapp, monkeypatch):
+    paths = [write_image(tmp_path / f'{number}.png') for number in range(5)]
+    model = GalleryModel(ThumbnailCache(str(tmp_path / 'thumbnails')), max_pixmaps=3)
+    started = []
+    monkeypatch.setattr(model.thread_pool, 'start', lambda job, priority=0: started.append(job.path))
+    model.set_entries([{'path': path} for path in paths])
+
+    # 视图重复绘制同一项目时只安排一次解码
+    model.thumbnail(paths[0])
+    model.thumbnail(paths[0])
+    assert started == [paths[0]]
+
+    cache = ThumbnailCache(str(tmp_path / 'thumbnails'))
+    for path in paths:
+        model.on_thumbnail_ready(path, cache.load(path))
+    assert list(model.pixmaps) == paths[2:]
+    assert not model.thumbnail(paths[4]).isNull() and started == [paths[0]]
+
+
+def test_filters_select_entries(tmp_path, qapp):
+    widget = GalleryWidget(str(tmp_path / 'output'), str(tmp_path / 'thumbnails'))
+    entries = [
+        {'path': f'{paper}-{model}.png', 'paper': paper, 'template': 'first', 'model': model,
+         'image_model': 'nano-banana', 'mtime': 0}
+        for paper in ('a', 'b') for model in ('kimi-k2-thinking', 'gemini-3-pro')
+    ]
+    widget.on_scanned(entries)
+    assert widget.model.rowCount() == 4
+
+    widget.filters['paper'].setCurrentText('a')
+    widget.filters['model'].setCurrentText('gemini-3-pro')
+
+    assert [entry['path'] for entry in widget.model.entries] == ['a-gemini-3-pro.png']
+    # 重新扫描后保留当前的筛选条件
+    widget.on_scanned(entries)
+    assert widget.model.rowCount() == 1
+    widget.filters['paper'].setCurrentText(ALL_LABEL)
+    assert widget.model.rowCount() == 2
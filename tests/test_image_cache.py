@@ -0,0 +1,88 @@
+"""
+Image cache hits, size bound and eviction
+"""
+import os
+
+import pytest
+
+from fake_api import make_png
+from image_generator import ImageCache, generate_and_save_image
+from llm_client import LLMClient
+
+MODEL = 'nano-banana'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ImageCache(str(tmp_path / 'cache'), max_bytes=10 * 1024 * 1024)
+    yield cache
+    cache.close()
+
+
+def write_image(path, color):
+    data = make_png(64, 64, color)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path), data
+
+
+def test_hit_ignores_whitespace_and_depends_on_model(cache, tmp_path):
+    source, data = write_image(tmp_path / 'source.png', (10, 20, 30))
+    cache.put(MODEL, "a  poster\nprompt ", source)
+
+    # 命中缓存时不会用到 client
+    image_path = generate_and_save_image(
+        "a poster prompt", 'poster', model_name=MODEL, output_dir=str(tmp_path / 'out'), client=object(), cache=cache
+    )
+
+    with open(image_path, 'rb') as f:
+        assert f.read() == data
+    assert cache.get('other-model', "a poster prompt") is None
+
+
+def test_identical_images_are_stored_once(cache, tmp_path):
+    first, _ = write_image(tmp_path / 'first.png', (10, 20, 30))
+    second, _ = write_image(tmp_path / 'second.png', (10, 20, 30))
+    cache.put(MODEL, "first prompt", first)
+    cache.put(MODEL, "second prompt", second)
+
+    assert cache.stats() == {'images': 1, 'prompts': 2, 'bytes': os.path.getsize(first)}
+
+
+def test_least_recently_used_image_is_evicted(tmp_path):
+    images = [write_image(tmp_path / f'{number}.png', (number, 0, 0)) for number in range(3)]
+    size = max(len(data) for _, data in images)
+    cache = ImageCache(str(tmp_path / 'cache'), max_bytes=2 * size)
+    cache.put(MODEL, "prompt 0", images[0][0])
+    cache.put(MODEL, "prompt 1", images[1][0])
+    # 使用过的图像排到后面，超出容量时先删除 prompt 1 的图像
+    assert cache.get(MODEL, "prompt 0") is not None
+    cache.put(MODEL, "prompt 2", images[2][0])
+
+    assert cache.stats()['bytes'] <= 2 * size
+    assert cache.get(MODEL, "prompt 1") is None
+    assert cache.get(MODEL, "prompt 0") is not None and cache.get(MODEL, "prompt 2") is not None
+    cache.close()
+
+
+def test_image_evicted_after_lookup_is_generated_again(cache, tmp_path, fake_api, monkeypatch):
+    source, _ = write_image(tmp_path / 'source.png', (10, 20, 30))
+    cache.put(MODEL, "poster prompt", source)
+    # 查到缓存之后、建立链接之前，图像被其他进程淘汰
+    lookup = cache.get
+
+    def get_then_evict(model_name, image_prompt):
+        path = lookup(model_name, image_prompt)
+        os.remove(path)
+        return path
+
+    monkeypatch.setattr(cache, 'get', get_then_evict)
+
+    image_path = generate_and_save_image(
+        "poster prompt", 'poster', model_name=MODEL, output_dir=str(tmp_path / 'out'),
+        client=LLMClient(api_key='test', base_url=fake_api.base_url), cache=cache
+    )
+
+    assert os.path.exists(image_path) and fake_api.model_requests[MODEL] == 1
+    # 重新生成的图像再次写入缓存
+    assert lookup(MODEL, "poster prompt") is not None
@@ -0,0 +1,69 @@
+"""
+GUI job queue: one job per selected PDF on a thread pool of bounded size
+"""
+import os
+import time
+
+import pytest
+
+pytest.importorskip('PySide6')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication
+
+import main
+import pipeline
+from benchmarks.fixtures import make_pdf
+from job_store import JobStore
+
+MODEL = 'kimi-k2-thinking'
+
+
+@pytest.fixture
+def window(tmp_path, monkeypatch, fake_api):
+    """指向模拟接口的主窗口，任务数据库、输出和 trace 文件都在临时目录中"""
+    monkeypatch.setattr(pipeline, 'OUTPUT_DIR', str(tmp_path / 'output'))
+    monkeypatch.setattr(main, 'TRACE_DIR', str(tmp_path / 'traces'))
+    app = QApplication.instance() or QApplication([])
+    window = main.PDFImageGeneratorApp()
+    window.job_store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    window.api_key_input.setText('test')
+    window.base_url_input.setText(fake_api.base_url)
+    window.model_input.setText(MODEL)
+    yield app, window
+    window.thread_pool.waitForDone()
+    if window.prefetcher is not None:
+        window.prefetcher.shutdown()
+    window.job_store.close()
+    window.deleteLater()
+
+
+def job_statuses(window):
+    return [window.job_table.item(row, 2).text() for row in range(window.job_table.rowCount())]
+
+
+def test_each_pdf_is_a_job_with_bounded_concurrency(tmp_path, window, fake_api, monkeypatch):
+    app, window = window
+    monkeypatch.setattr(fake_api, 'latency', 0.3)
+    window.pdf_file_paths = [make_pdf(str(tmp_path / f'p{number}.pdf'), 3, seed=number) for number in range(4)]
+    window.concurrency_spin.setValue(2)
+
+    window.process_pdf()
+    active = set()
+    deadline = time.monotonic() + 60
+    while any(status not in ("完成", "失败") for status in job_statuses(window)):
+        assert time.monotonic() < deadline
+        active.add(window.thread_pool.activeThreadCount())
+        app.processEvents()
+        time.sleep(0.01)
+    app.processEvents()
+
+    assert job_statuses(window) == ["完成"] * 4
+    assert max(active) == 2
+    for job_id in window.jobs:
+        progress_bar = window.job_table.cellWidget(window.jobs[job_id]['row'], 3)
+        assert progress_bar.value() == progress_bar.maximum()
+        # 每个任务的日志单独保存，选中任务时显示
+        assert window.log_buffer.lines(job_id)[-1] == (job_id, "✓ 全部处理完成")
+    images = [name for _, _, files in os.walk(tmp_path / 'output') for name in files if name.endswith('.png')]
+    assert len(images) == 4
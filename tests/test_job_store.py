@@ -0,0 +1,85 @@
+"""
+Stage checkpoints in the job store, and resuming batch runs from them
+"""
+import pytest
+
+import pipeline
+from benchmarks.fixtures import make_pdf
+from job_store import JobStore, STATUS_DONE, STATUS_FAILED, make_key
+
+MODEL = 'kimi-k2-thinking'
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    yield store
+    store.close()
+
+
+def test_failed_rerun_keeps_completed_stage(store):
+    key = make_key('doc', 'prompt')
+    store.save_stage(key, 'llm', "response", 1.0, {'model': MODEL})
+    store.fail_stage(key, 'llm', "HTTP 400", 0.5, {'model': MODEL})
+
+    assert store.get_stage(key, 'llm') == {'output': "response", 'duration_s': 1.0, 'meta': {'model': MODEL}}
+    # 失败的尝试仍然记录下来
+    assert [attempt['status'] for attempt in store.attempt_history('llm')] == [STATUS_FAILED, STATUS_DONE]
+
+
+def test_retry_after_failure_is_stored(store):
+    key = make_key('doc', 'prompt')
+    store.fail_stage(key, 'image', "HTTP 500", 0.5)
+    assert store.get_stage(key, 'image') is None
+
+    store.save_stage(key, 'image', "a.png", 2.0)
+    assert store.get_stage(key, 'image')['output'] == "a.png"
+
+
+def test_store_survives_reopening(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    first = JobStore(path)
+    first.save_stage('key', 'extract', "text", 0.1)
+    first.close()
+
+    second = JobStore(path)
+    assert second.get_stage('key', 'extract')['output'] == "text"
+    second.close()
+
+
+def llm_requests(fake_api):
+    return sum(count for model, count in fake_api.model_requests.items() if not fake_api.is_image_model(model))
+
+
+def run(fake_api, pdf, store, **options):
+    [record] = pipeline.run_batch(
+        [pdf], "Summarize the paper.", api_key='test', base_url=fake_api.base_url, model_name=MODEL,
+        nanobanana_model='nano-banana', jobs=1, extract_jobs=1, store=store, **options
+    )
+    return record
+
+
+def test_resume_skips_finished_stages(fake_api, store, tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, 'OUTPUT_DIR', str(tmp_path / 'output'))
+    pdf = make_pdf(str(tmp_path / 'paper.pdf'), 3)
+
+    def fail_image(*args, **kwargs):
+        raise Exception("HTTP 500")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(pipeline, 'generate_and_save_image', fail_image)
+        failed = run(fake_api, pdf, store)
+    assert 'HTTP 500' in failed['error']
+
+    # 续跑只重做失败的图像阶段
+    resumed = run(fake_api, pdf, store)
+    assert 'error' not in resumed
+    assert llm_requests(fake_api) == 1 and fake_api.model_requests['nano-banana'] == 1
+
+    # 强制重新生成失败时，之前生成的图像仍然可以续用
+    with monkeypatch.context() as patch:
+        patch.setattr(pipeline, 'generate_and_save_image', fail_image)
+        assert 'error' in run(fake_api, pdf, store, regenerate=True)
+    again = run(fake_api, pdf, store)
+    assert again['image_path'] == resumed['image_path'] and again['resumed']
+    assert llm_requests(fake_api) == 1 and fake_api.model_requests['nano-banana'] == 1
@@ -0,0 +1,80 @@
+"""
+LLMClient requests against the fake API
+"""
+import pytest
+
+from fake_api import FakeAPIServer
+from llm_client import DOCUMENT_HEADER, LLMClient, build_messages, message_text, read_usage
+
+MODEL = 'kimi-k2-thinking'
+
+
+def test_stream_without_stream_options():
+    with FakeAPIServer(reject_stream_options=True) as server:
+        client = LLMClient(api_key='test', base_url=server.base_url, stream=True)
+        first = client.send_pdf_to_llm("Paper text", "Summarize the paper.", 'kimi-k2-thinking')
+        assert server.request_count == 2
+        # 之后的请求直接不带 stream_options
+        second = client.send_pdf_to_llm("Paper text", "Summarize the paper.", 'kimi-k2-thinking')
+        assert server.request_count == 3
+
+    assert first == second and '```' in first
+
+
+def test_stream_reports_usage():
+    with FakeAPIServer() as server:
+        client = LLMClient(api_key='test', base_url=server.base_url, stream=True)
+        usage = {}
+        client.send_pdf_to_llm("Paper text", "Summarize the paper.", 'kimi-k2-thinking', usage=usage)
+
+    assert server.request_count == 1
+    assert usage['prompt_tokens'] > 0
+
+
+def test_other_bad_requests_keep_stream_options():
+    with FakeAPIServer(max_prompt_chars=1000) as server:
+        client = LLMClient(api_key='test', base_url=server.base_url, stream=True)
+        with pytest.raises(Exception, match="context length"):
+            client.send_pdf_to_llm("word " * 1000, "Summarize the paper.", 'kimi-k2-thinking')
+        # 超长的论文不会重试，也不会让之后的请求失去 token 用量
+        assert server.request_count == 1
+        usage = {}
+        client.send_pdf_to_llm("Paper text", "Summarize the paper.", 'kimi-k2-thinking', usage=usage)
+
+    assert client.stream_usage and usage['prompt_tokens'] > 0
+
+
+def test_template_comes_before_the_document():
+    messages = build_messages("Paper text", "Summarize the paper.", cache_hints=False)
+    assert messages == [
+        {'role': 'system', 'content': "Summarize the paper."},
+        {'role': 'user', 'content': f"{DOCUMENT_HEADER}\nPaper text"},
+    ]
+    hinted = build_messages("Paper text", "Summarize the paper.", cache_hints=True)
+    assert [part['cache_control'] for message in hinted for part in message['content']] == [{'type': 'ephemeral'}] * 2
+    assert message_text(hinted) == message_text(messages)
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_repeated_prefixes_are_reported_as_cached(stream):
+    template = "Describe the figures of the paper in detail. " * 40
+    with FakeAPIServer() as server:
+        client = LLMClient(api_key='test', base_url=server.base_url, stream=stream)
+        usages = []
+        for paper in ("First paper text. " * 50, "Second paper text. " * 50, "First paper text. " * 50):
+            usage = {}
+            client.send_pdf_to_llm(paper, template, MODEL, usage=usage)
+            usages.append(usage)
+
+    first, other_paper, rerun = usages
+    assert first['cached_tokens'] == 0
+    # 换一篇论文只复用模板部分，重跑同一篇论文复用整个请求
+    assert other_paper['cached_tokens'] == pytest.approx(len(template) / 4, abs=2)
+    assert other_paper['cached_tokens'] < other_paper['prompt_tokens'] - 100
+    assert rerun['cached_tokens'] >= rerun['prompt_tokens'] * 0.9
+
+
+def test_usage_reads_anthropic_style_cache_fields():
+    usage = {'prompt_tokens': 1000, 'completion_tokens': 50, 'cache_read_input_tokens': 800}
+    assert read_usage(usage) == {'prompt_tokens': 1000, 'completion_tokens': 50, 'cached_tokens': 800}
+    assert read_usage(None) == {}
@@ -0,0 +1,59 @@
+"""
+Load tester reports against the fake API
+"""
+import json
+
+import image_generator
+import loadtest
+from cli import percentile
+from image_generator import ImageCache
+
+
+def test_image_stage_measures_image_latency(tmp_path, monkeypatch):
+    # 即使用户启用了图像缓存，负载测试也要测量真实的图像请求
+    cache = ImageCache(str(tmp_path / 'image_cache'), max_bytes=1024 * 1024 * 1024)
+    monkeypatch.setattr(image_generator, 'get_image_cache', lambda: cache)
+    report_path = tmp_path / 'report.json'
+
+    assert loadtest.main([
+        '--fake', '--latency', '0', '--image-latency', '0.2', '--concurrency', '1,2', '--runs', '4',
+        '--pages', '2', '--report', str(report_path)
+    ]) == 0
+
+    with open(report_path, encoding='utf-8') as f:
+        report = json.load(f)
+    for level in report['levels']:
+        assert level['succeeded'] == 4
+        assert 0.2 <= level['stages']['image']['p50_s'] < 1.0
+    assert cache.stats()['images'] == 0
+    cache.close()
+
+
+def test_report_counts_errors(tmp_path):
+    report_path = tmp_path / 'report.json'
+
+    assert loadtest.main([
+        '--fake', '--latency', '0', '--error-rate', '1', '--concurrency', '4', '--runs', '4', '--pages', '2',
+        '--report', str(report_path)
+    ]) == 0
+
+    with open(report_path, encoding='utf-8') as f:
+        [level] = json.load(f)['levels']
+    assert (level['runs'], level['succeeded'], level['error_rate']) == (4, 0, 1.0)
+    # 错误按失败的阶段和错误信息汇总
+    [(error, count)] = level['errors'].items()
+    assert error.startswith('llm: ') and count == 4
+    assert set(level['stages']) == set(loadtest.STAGES)
+    assert level['throughput_per_min'] == 0.0
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
+    assert percentile([3.0], 99) == 3.0 and percentile([], 50) == 0.0
+
+
+def test_saturation_is_where_throughput_stops_growing():
+    levels = [{'concurrency': c, 'throughput_per_min': t} for c, t in [(1, 10), (2, 19), (4, 36), (8, 38), (16, 39)]]
+    assert loadtest.find_saturation(levels) == 4
+    assert loadtest.find_saturation(levels[:3]) is None
@@ -0,0 +1,90 @@
+"""
+Structured logging: JSONL records carrying the job and stage they belong to
+"""
+import json
+import logging.handlers
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from log_setup import get_logger, log_context, setup_logging, shutdown_logging
+from tracing import bind_context
+
+logger = get_logger(__name__)
+
+
+class Buffer:
+    """记录转发给界面日志的 (任务编号, 消息)"""
+
+    def __init__(self):
+        self.lines = []
+
+    def append(self, job_id, message):
+        self.lines.append((job_id, message))
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / 'logs' / 'app.jsonl'
+    yield path
+    shutdown_logging()
+
+
+def read_entries(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_are_written_as_jsonl_with_context(log_file):
+    buffer = Buffer()
+    setup_logging(log_buffer=buffer, log_file=str(log_file), level='INFO')
+
+    logger.info("开始处理")
+    with log_context(job_id='job1'):
+        with log_context(stage='llm'):
+            logger.info("请求完成", extra={'duration_s': 1.5, 'model': 'kimi-k2-thinking'})
+        logger.debug("只写入文件")
+    shutdown_logging()
+
+    [first, second, third] = read_entries(log_file)
+    assert (first['level'], first['message'], first['logger']) == ('INFO', "开始处理", f"pdf2img.{__name__}")
+    assert 'job_id' not in first and 'stage' not in first
+    assert (second['job_id'], second['stage'], second['duration_s'], second['model']) == (
+        'job1', 'llm', 1.5, 'kimi-k2-thinking'
+    )
+    # 离开内层上下文后恢复外层的任务编号
+    assert (third['level'], third['job_id']) == ('DEBUG', 'job1') and 'stage' not in third
+    # 界面只显示 INFO 及以上的日志，按任务归类
+    assert buffer.lines == [(None, "开始处理"), ('job1', "请求完成")]
+
+
+def test_context_follows_work_into_worker_threads(log_file):
+    setup_logging(log_file=str(log_file))
+
+    def work(number):
+        logger.info(f"论文 {number}", extra={'thread_started': threading.current_thread() is not main_thread})
+
+    main_thread = threading.current_thread()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for job in ('a', 'b'):
+            with log_context(job_id=job, stage='extract'):
+                pool.submit(bind_context(work), job).result()
+        pool.submit(work, 'c').result()
+    shutdown_logging()
+
+    entries = {entry['message']: entry for entry in read_entries(log_file)}
+    assert [(entries[f"论文 {job}"].get('job_id'), entries[f"论文 {job}"].get('stage')) for job in 'abc'] == [
+        ('a', 'extract'), ('b', 'extract'), (None, None)
+    ]
+    assert all(entry['thread_started'] for entry in entries.values())
+
+
+def test_empty_log_file_disables_the_file(tmp_path):
+    setup_logging(log_file='')
+    logger.info("不写入文件")
+    shutdown_logging()
+
+    assert list(tmp_path.iterdir()) == []
+    handlers = logging.getLogger('pdf2img').handlers
+    assert not any(isinstance(handler, logging.handlers.QueueHandler) for handler in handlers)
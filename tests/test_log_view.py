@@ -0,0 +1,39 @@
+"""
+Memory bounds of the GUI log buffer
+"""
+import pytest
+
+pytest.importorskip('PySide6')
+
+from log_view import LogBuffer
+
+
+def test_job_lines_are_capped_per_job():
+    buffer = LogBuffer(max_lines=3)
+    for number in range(5):
+        buffer.append('job', f"line {number}")
+
+    assert [message for _, message in buffer.lines('job')] == ["line 2", "line 3", "line 4"]
+
+
+def test_least_recently_used_jobs_are_dropped():
+    buffer = LogBuffer(max_lines=10, max_job_lines=20)
+    for job in range(100):
+        for number in range(5):
+            buffer.append(f"job{job}", f"line {number}")
+
+    assert sum(len(buffer.lines(f"job{job}")) for job in range(100)) == 20
+    assert len(buffer.lines('job99')) == 5
+    assert buffer.lines('job0') == []
+
+
+def test_viewed_job_is_kept():
+    buffer = LogBuffer(max_lines=10, max_job_lines=10)
+    buffer.append('viewed', "started")
+    buffer.append('other', "line")
+    buffer.lines('viewed')
+    for number in range(9):
+        buffer.append('new', f"line {number}")
+
+    assert buffer.lines('other') == []
+    assert buffer.lines('viewed') == [('viewed', "started")]
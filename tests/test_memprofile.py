@@ -0,0 +1,81 @@
+"""
+Per-stage memory measurements and the JSON report
+"""
+import json
+import tracemalloc
+
+import pipeline
+from benchmarks.fixtures import make_pdf
+from job_store import JobStore
+from llm_client import LLMClient
+from memprofile import MB, MemoryProfiler, get_profiler, memory_stage, use_profiler
+
+
+def test_stage_reports_peak_retained_and_allocation_sites():
+    kept = []
+    with use_profiler(MemoryProfiler("test")) as profiler:
+        with memory_stage("alloc", size=8):
+            kept.append(bytearray(8 * MB))
+            temporary = bytearray(16 * MB)
+            del temporary
+
+    [record] = profiler.records
+    assert (record['name'], record['args']) == ("alloc", {'size': 8})
+    assert record['traced_peak'] >= 24 * MB
+    assert 8 * MB <= record['retained'] < 9 * MB
+    # 保留下来的分配指向本文件中的那一行
+    assert record['top_allocations'][0]['site'].startswith(__file__)
+    assert record['top_allocations'][0]['size'] >= 8 * MB
+    assert not tracemalloc.is_tracing()
+
+
+def test_outer_stage_includes_nested_stages():
+    kept = []
+    with use_profiler(MemoryProfiler("test")) as profiler:
+        with memory_stage("outer"):
+            kept.append(bytearray(4 * MB))
+            with memory_stage("inner"):
+                kept.append(bytearray(8 * MB))
+            with memory_stage("inner"):
+                kept.append(bytearray(8 * MB))
+
+    records = {record['name']: record for record in profiler.records}
+    assert records['outer']['retained'] >= 20 * MB
+    assert records['outer']['top_allocations'] is None
+    [inner, outer] = sorted(profiler.summary())
+    assert (inner[0], inner[1]) == ("inner", 2) and inner[3] >= 16 * MB
+    assert (outer[0], outer[1]) == ("outer", 1)
+    assert len(profiler.format_summary()) == 2
+
+
+def test_stages_are_free_without_a_profiler():
+    assert get_profiler() is None
+    with memory_stage("ignored", size=1) as args:
+        assert args == {'size': 1}
+    assert not tracemalloc.is_tracing()
+
+
+def test_batch_report_lists_every_stage(tmp_path, fake_api, monkeypatch):
+    monkeypatch.setattr(pipeline, 'OUTPUT_DIR', str(tmp_path / 'output'))
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    pdf = make_pdf(str(tmp_path / 'paper.pdf'), 3)
+    profiler = MemoryProfiler("batch")
+    LLMClient(api_key='test', base_url=fake_api.base_url)  # 在开始记录之前导入 openai，否则很慢
+
+    with use_profiler(profiler):
+        [record] = pipeline.run_batch(
+            [pdf], "Summarize the paper.", api_key='test', base_url=fake_api.base_url,
+            model_name='kimi-k2-thinking', nanobanana_model='nano-banana', jobs=1, store=store
+        )
+    report_path = profiler.write_report(str(tmp_path / 'reports' / 'memory.json'))
+    store.close()
+
+    assert 'error' not in record
+    with open(report_path, encoding='utf-8') as f:
+        report = json.load(f)
+    assert report['name'] == "batch" and report['peak_rss'] > 0
+    names = {stage['name'] for stage in report['stages']}
+    # PDF 提取在本进程中进行，才能统计到 pdf.read
+    assert {"pdf.read", "stage.llm", "stage.parse", "stage.image", "image.save"} <= names
+    assert {row['name'] for row in report['summary']} == names
+    assert all(stage['duration_s'] >= 0 and stage['rss_after'] for stage in report['stages'])
@@ -0,0 +1,47 @@
+"""
+Model router decisions from the attempts recorded in the job store
+"""
+from job_store import JobStore, make_key
+from model_router import ModelRouter
+
+CONTENT = "word " * 2000
+PROMPT = "Summarize the paper."
+
+
+def record_runs(store, model, durations, failures=0):
+    """记录某个模型的若干次成功请求；每次失败都在同一阶段上重试成功"""
+    meta = {'model': model, 'input_chars': len(CONTENT) + len(PROMPT)}
+    for number, duration in enumerate(durations):
+        key = make_key(model, number)
+        if number < failures:
+            store.fail_stage(key, 'llm', "HTTP 500", duration, meta)
+        store.save_stage(key, 'llm', "response", duration, meta)
+
+
+def test_failed_attempts_count_after_successful_retry(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    record_runs(store, 'fast-flaky', [1.0] * 6, failures=6)
+    record_runs(store, 'slow-steady', [1.5] * 6)
+    router = ModelRouter(['fast-flaky', 'slow-steady'], explore_rate=0.0)
+
+    decision = router.choose(CONTENT, PROMPT, store)
+
+    # 失败的尝试被重试成功覆盖后仍计入失败率，失败率 50% 时预计耗时翻倍，比稍慢但稳定的模型更慢
+    assert router._load_stats(store)['fast-flaky']['error_rate'] == 0.5
+    assert decision['model'] == 'slow-steady'
+    store.close()
+
+
+def test_history_is_kept_per_database(tmp_path):
+    router = ModelRouter(['model-a', 'model-b'], explore_rate=0.0)
+    first = JobStore(str(tmp_path / 'first.sqlite3'))
+    record_runs(first, 'model-a', [1.0] * 3)
+    record_runs(first, 'model-b', [5.0] * 3)
+    assert router.choose(CONTENT, PROMPT, first)['model'] == 'model-a'
+    first.close()
+
+    second = JobStore(str(tmp_path / 'second.sqlite3'))
+    record_runs(second, 'model-a', [5.0] * 3)
+    record_runs(second, 'model-b', [1.0] * 3)
+    assert router.choose(CONTENT, PROMPT, second)['model'] == 'model-b'
+    second.close()
@@ -0,0 +1,129 @@
+"""
+Batch pipeline runs against the fake API with the default configuration (model "auto")
+"""
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import model_router
+import pipeline
+from benchmarks.fixtures import make_pdf
+from config import MODEL_CANDIDATES
+from dedup import NearDuplicateIndex
+from job_store import JobStore
+
+
+@pytest.fixture
+def batch_env(tmp_path, monkeypatch):
+    """临时的输出目录、任务数据库和近似重复索引，路由器不带之前测试的试用记录"""
+    monkeypatch.setattr(pipeline, 'OUTPUT_DIR', str(tmp_path / 'output'))
+    monkeypatch.setattr(model_router, '_default_router', None)
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    index = NearDuplicateIndex(str(tmp_path / 'dedup.sqlite3'))
+    yield tmp_path, store, index
+    index.close()
+    store.close()
+
+
+def llm_requests(fake_api):
+    return sum(count for model, count in fake_api.model_requests.items() if not fake_api.is_image_model(model))
+
+
+def run(fake_api, paths, store, index):
+    return {
+        record['pdf']: record
+        for record in pipeline.run_batch(
+            paths, "Summarize the paper.", api_key='test', base_url=fake_api.base_url,
+            nanobanana_model='nano-banana', jobs=4, extract_jobs=2, store=store,
+            dedup_index=index, reuse_duplicates=True
+        )
+    }
+
+
+def test_auto_routing_reuses_duplicates(fake_api, batch_env):
+    tmp_path, store, index = batch_env
+    original = make_pdf(str(tmp_path / 'a.pdf'), 10, seed=1)
+    copy = str(tmp_path / 'a_copy.pdf')
+    shutil.copyfile(original, copy)
+    # 正文相同、文件内容不同的另一个版本
+    revised = str(tmp_path / 'a_revised.pdf')
+    shutil.copyfile(original, revised)
+    with open(revised, 'ab') as f:
+        f.write(b"\n% revised\n")
+    other = make_pdf(str(tmp_path / 'b.pdf'), 10, seed=2)
+
+    records = run(fake_api, [original, copy, revised, other], store, index)
+
+    assert all('error' not in record for record in records.values())
+    assert all(record['model'] in MODEL_CANDIDATES for record in records.values())
+    # 内容相同和近似重复的论文使用同一个模型，只有两篇论文真正发送了分析请求
+    assert records[original]['model'] == records[copy]['model'] == records[revised]['model']
+    assert sum(1 for path in (original, copy) if records[path].get('resumed')) == 1
+    assert sum(1 for record in records.values() if record.get('reused_llm')) == 1
+    assert llm_requests(fake_api) == 2
+
+
+def test_auto_routing_resumes_with_same_model(fake_api, batch_env):
+    tmp_path, store, index = batch_env
+    paths = [make_pdf(str(tmp_path / f'p{number}.pdf'), 5, seed=number) for number in range(4)]
+
+    first = run(fake_api, paths, store, index)
+    # 新进程中的路由器没有本次的试用记录，仍应选回已有响应的模型
+    model_router._default_router = None
+    second = run(fake_api, paths, store, index)
+
+    assert {path: record['model'] for path, record in first.items()} == \
+        {path: record['model'] for path, record in second.items()}
+    assert all(record.get('resumed') for record in second.values())
+    assert llm_requests(fake_api) == len(paths)
+
+
+def test_fanout_manifest_records_routed_models(fake_api, batch_env):
+    tmp_path, store, _ = batch_env
+    pdf = make_pdf(str(tmp_path / 'paper.pdf'), 5)
+    templates = {'first': "Summarize the paper.", 'second': "Describe the method.", 'third': "List the results."}
+
+    result = pipeline.run_fanout(
+        pdf, list(templates), api_key='test', base_url=fake_api.base_url, nanobanana_model='nano-banana',
+        templates=templates, store=store
+    )
+
+    with open(os.path.join(result['job_dir'], 'job.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    for name in templates:
+        assert manifest['templates'][name]['model'] == result['results'][name]['model']
+        assert manifest['templates'][name]['model'] in MODEL_CANDIDATES
+    # 顶层只在所有模板使用同一个模型时记录该模型
+    models = {template['model'] for template in manifest['templates'].values()}
+    assert manifest['model'] == (models.pop() if len(models) == 1 else 'auto')
+
+
+def test_concurrent_job_dirs_are_distinct(tmp_path, monkeypatch):
+    # 其他 worker 进程在检查之后、创建之前建好了同名目录
+    monkeypatch.setattr(os.path, 'exists', lambda path: False)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        job_dirs = list(executor.map(lambda _: pipeline.create_job_dir('paper.pdf', str(tmp_path)), range(8)))
+
+    assert len(set(job_dirs)) == 8
+    assert all(os.path.isdir(job_dir) for job_dir in job_dirs)
+
+
+def test_latency_excludes_waiting_in_the_batch(fake_api, batch_env, monkeypatch):
+    tmp_path, store, _ = batch_env
+    monkeypatch.setattr(fake_api, 'latency', 0.3)
+    paths = [make_pdf(str(tmp_path / f'p{number}.pdf'), 3, seed=number) for number in range(4)]
+
+    records = pipeline.run_batch(
+        paths, "Summarize the paper.", api_key='test', base_url=fake_api.base_url, model_name='kimi-k2-thinking',
+        nanobanana_model='nano-banana', jobs=1, extract_jobs=1, store=store
+    )
+
+    # 一次只处理一篇：后面的论文完成得更晚，但各自的耗时相近
+    finished = sorted(record['batch_elapsed_s'] for record in records)
+    latencies = [record['latency_s'] for record in records]
+    assert finished[-1] > 3 * finished[0]
+    assert max(latencies) < finished[0] + 0.3
+    assert all(record['latency_s'] >= record['network_s'] for record in records)
@@ -0,0 +1,66 @@
+"""
+Background PDF prefetching
+"""
+import threading
+
+from benchmarks.fixtures import make_pdf
+from prefetch import PdfPrefetcher
+
+
+def test_take_releases_the_text(tmp_path):
+    pdf = make_pdf(str(tmp_path / 'paper.pdf'), 3)
+    prefetcher = PdfPrefetcher()
+    prefetcher.prefetch(pdf)
+
+    doc_hash, content = prefetcher.take(pdf, timeout=30)
+
+    assert content and len(doc_hash) == 64
+    assert prefetcher.take(pdf) is None
+    prefetcher.shutdown()
+
+
+def test_info_is_not_queued_behind_extraction(tmp_path, monkeypatch):
+    pdfs = [make_pdf(str(tmp_path / f'paper{number}.pdf'), 3, seed=number) for number in range(4)]
+    prefetcher = PdfPrefetcher(max_workers=1)
+    release = threading.Event()
+    monkeypatch.setattr(prefetcher, '_extract', lambda path: release.wait(30))
+    infos = {}
+    all_info = threading.Event()
+
+    def on_info(path, info):
+        infos[path] = info
+        if len(infos) == len(pdfs):
+            all_info.set()
+
+    for pdf in pdfs:
+        prefetcher.prefetch(pdf, on_info=on_info)
+
+    # 文本提取全部被阻塞时，各文件的页数仍然立即可用
+    assert all_info.wait(10)
+    release.set()
+    prefetcher.shutdown()
+
+
+def test_when_ready_after_take_and_eviction(tmp_path):
+    pdfs = [make_pdf(str(tmp_path / f'paper{number}.pdf'), 3, seed=number) for number in range(3)]
+    prefetcher = PdfPrefetcher(max_entries=1)
+    prefetcher.prefetch(pdfs[0])
+    assert prefetcher.take(pdfs[0], timeout=30) is not None
+    # 第三个文件把第二个文件挤出预读取结果
+    prefetcher.prefetch(pdfs[1])
+    prefetcher.prefetch(pdfs[2])
+    ready = {}
+    done = threading.Event()
+
+    def callback(path, doc_hash, content):
+        ready[path] = (doc_hash, content)
+        if len(ready) == len(pdfs):
+            done.set()
+
+    # 模板或模型改变后重新预估：已被取走或丢弃的文件也要得到回调
+    for pdf in pdfs:
+        prefetcher.when_ready(pdf, callback)
+
+    assert done.wait(30)
+    assert ready == {pdf: prefetcher._extract(pdf) for pdf in pdfs}
+    prefetcher.shutdown()
@@ -0,0 +1,140 @@
+"""
+HTTP service against the fake API
+"""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip('aiohttp')
+from aiohttp import FormData
+from aiohttp.test_utils import TestClient, TestServer
+
+from benchmarks.fixtures import make_pdf
+from fake_api import FakeAPIServer
+from job_store import JobStore
+from server import QUEUE_DEPTH_HEADER, JobManager, create_app
+
+MODEL = 'kimi-k2-thinking'
+AUTH = {'Authorization': "Bearer test"}
+
+
+@pytest.fixture
+def make_manager(tmp_path):
+    """按参数创建 JobManager，使用临时的任务数据库、上传和输出目录"""
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+
+    def make(server, **options):
+        return JobManager(
+            base_url=server.base_url, model_name=MODEL, nanobanana_model='nano-banana', store=store,
+            upload_dir=str(tmp_path / 'uploads'), output_dir=str(tmp_path / 'output'), **options
+        )
+
+    yield make
+    store.close()
+
+
+def run_client(manager, scenario):
+    async def main():
+        async with TestClient(TestServer(create_app(manager))) as client:
+            return await scenario(client)
+
+    return asyncio.run(main())
+
+
+def pdf_form(pdf):
+    form = FormData()
+    with open(pdf, 'rb') as f:
+        form.add_field('file', f.read(), filename='paper.pdf', content_type='application/pdf')
+    form.add_field('template', '2D扁平')
+    return form
+
+
+async def read_events(response):
+    events = []
+    async for line in response.content:
+        if line.startswith(b'data: '):
+            events.append(json.loads(line[len(b'data: '):]))
+    return events
+
+
+async def wait_until(client, path, predicate, timeout=30):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        async with client.get(path) as response:
+            body = await response.json()
+        if predicate(body):
+            return body
+        assert loop.time() < deadline
+        await asyncio.sleep(0.05)
+
+
+def test_submit_stream_and_download(tmp_path, make_manager):
+    pdf = make_pdf(str(tmp_path / 'paper.pdf'), 3)
+
+    async def scenario(client):
+        async with client.post('/jobs', data=pdf_form(pdf), headers=AUTH) as response:
+            assert response.status == 202
+            assert response.headers[QUEUE_DEPTH_HEADER] in ('0', '1')
+            job = await response.json()
+            assert response.headers['Location'] == f"/jobs/{job['id']}"
+
+        async with client.get(f"/jobs/{job['id']}/events") as response:
+            assert response.headers['Content-Type'] == 'text/event-stream'
+            events = await read_events(response)
+        async with client.get(f"/jobs/{job['id']}") as response:
+            status = await response.json()
+
+        async with client.get(f"/jobs/{job['id']}/image") as response:
+            assert response.status == 200
+            image = await response.read()
+        return events, status, image
+
+    with FakeAPIServer() as server:
+        events, status, image = run_client(make_manager(server), scenario)
+
+    # 事件流推送到任务结束，日志不重复
+    assert events[-1]['status'] == 'done' and events[-1]['has_image']
+    logs = [line for event in events for line in event['log']]
+    assert logs == status['log'] and logs[-1] == "✓ 全部处理完成"
+    assert status['status'] == 'done' and set(status['stages']) == {'extract', 'llm', 'parse', 'image'}
+    assert image.startswith(b'\x89PNG')
+
+
+def test_full_queue_is_rejected_with_retry_after(tmp_path, make_manager):
+    pdf = make_pdf(str(tmp_path / 'paper.pdf'), 3)
+
+    async def scenario(client):
+        async with client.post('/jobs', data=pdf_form(pdf), headers=AUTH) as response:
+            assert response.status == 202
+            first = await response.json()
+        await wait_until(client, '/health', lambda body: body['running'] == 1)
+        async with client.post('/jobs', data=pdf_form(pdf), headers=AUTH) as response:
+            assert response.status == 202
+            second = await response.json()
+        async with client.post('/jobs', data=pdf_form(pdf), headers=AUTH) as response:
+            rejected = response.status, response.headers.get(QUEUE_DEPTH_HEADER), response.headers.get('Retry-After')
+        for job in (first, second):
+            await wait_until(client, f"/jobs/{job['id']}", lambda body: body['status'] in ('done', 'failed'))
+        return rejected
+
+    with FakeAPIServer(latency=0.5) as server:
+        rejected = run_client(make_manager(server, workers=1, max_queue=1), scenario)
+
+    assert rejected == (429, '1', '1')
+
+
+@pytest.mark.parametrize('share_key, status', [(False, 400), (True, 202)])
+def test_server_key_is_used_only_when_shared(tmp_path, make_manager, share_key, status):
+    pdf = make_pdf(str(tmp_path / 'paper.pdf'), 3)
+
+    async def scenario(client):
+        async with client.post('/jobs', data=pdf_form(pdf)) as response:
+            body = await response.json()
+        if response.status == 202:
+            await wait_until(client, f"/jobs/{body['id']}", lambda job: job['status'] in ('done', 'failed'))
+        return response.status
+
+    with FakeAPIServer() as server:
+        assert run_client(make_manager(server, api_key='server-key', share_key=share_key), scenario) == status
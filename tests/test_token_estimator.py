@@ -0,0 +1,88 @@
+"""
+Token, cost and latency estimates made before sending a request
+"""
+import pytest
+
+import token_estimator
+from config import MODEL_PRICING
+from job_store import JobStore
+from token_estimator import (
+    estimate_request, fit_latency, format_estimate, heuristic_token_count, load_history, summarize_estimates
+)
+
+MODEL = 'kimi-k2-thinking'
+
+
+@pytest.fixture(autouse=True)
+def without_tiktoken(monkeypatch):
+    # 按字符估算，结果不依赖是否安装了 tiktoken
+    monkeypatch.setattr(token_estimator, '_get_encoding', lambda: None)
+
+
+def test_heuristic_counts_cjk_characters_one_by_one():
+    assert heuristic_token_count("abcdefgh") == 2
+    assert heuristic_token_count("abcde") == 2
+    assert heuristic_token_count("论文摘要") == 4
+    assert heuristic_token_count("") == 0
+
+
+def test_fit_recovers_a_linear_latency():
+    samples = [(chars, 2.0 + 0.001 * chars) for chars in (1000, 5000, 20000, 50000)]
+    base, per_char = fit_latency(samples)
+    assert base == pytest.approx(2.0) and per_char == pytest.approx(0.001)
+    assert fit_latency(samples[:2]) is None
+
+
+def test_fit_falls_back_to_median_rate():
+    # 输入长度相同时无法拟合斜率；负斜率也不可信
+    assert fit_latency([(1000, 1.0), (1000, 2.0), (1000, 3.0)]) == (0.0, pytest.approx(0.002))
+    assert fit_latency([(1000, 4.0), (2000, 3.0), (4000, 2.0)]) == (0.0, pytest.approx(0.0015))
+
+
+def test_estimate_uses_prices_limits_and_history():
+    content = "word " * 1000
+    estimate = estimate_request(content, "Summarize the paper.", MODEL, 'nano-banana')
+    input_price, output_price = MODEL_PRICING[MODEL]
+
+    assert not estimate['exact'] and not estimate['over_limit']
+    assert estimate['output_tokens'] == token_estimator.DEFAULT_OUTPUT_TOKENS
+    assert estimate['cost'] == pytest.approx(
+        (estimate['input_tokens'] * input_price + estimate['output_tokens'] * output_price) / 1_000_000
+    )
+    assert estimate['latency_s'] is None
+    assert estimate_request(content, "Summarize.", 'unpriced-model')['cost'] is None
+    assert estimate_request("论" * 300000, "Summarize.", MODEL)['over_limit']
+
+    history = {'llm_fit': (2.0, 0.001), 'output_tokens': 800, 'image_s': 10.0}
+    with_history = estimate_request(content, "Summarize the paper.", MODEL, 'nano-banana', history)
+    assert with_history['output_tokens'] == 800
+    assert 12.0 + 0.001 * len(content) <= with_history['latency_s'] < 12.0 + 0.001 * (len(content) + 1000)
+
+
+def test_history_only_uses_runs_of_the_same_models(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    for number, chars in enumerate((1000, 5000, 20000)):
+        store.save_stage(f'llm{number}', 'llm', "x" * 4000, 2.0 + 0.001 * chars, {'model': MODEL, 'input_chars': chars})
+        store.save_stage(f'image{number}', 'image', "poster.png", 10.0 + number, {'model': 'nano-banana'})
+    store.save_stage('other', 'llm', "x", 100.0, {'model': 'gemini-3-pro', 'input_chars': 1000})
+
+    history = load_history(store, MODEL, 'nano-banana')
+
+    assert (history['llm_samples'], history['image_samples']) == (3, 3)
+    assert history['llm_fit'] == (pytest.approx(2.0), pytest.approx(0.001))
+    assert (history['output_tokens'], history['image_s']) == (1000, 11.0)
+    assert load_history(store, 'deepseek-v3.1', 'nano-banana')['llm_fit'] is None
+    assert load_history(None)['llm_samples'] == 0
+    store.close()
+
+
+def test_summary_is_unknown_when_any_estimate_is():
+    estimates = [
+        {'input_tokens': 100, 'exact': False, 'over_limit': False, 'cost': 0.01, 'latency_s': 5.0},
+        {'input_tokens': 200, 'exact': False, 'over_limit': True, 'cost': 0.02, 'latency_s': None},
+    ]
+    summary = summarize_estimates(estimates)
+
+    assert (summary['count'], summary['input_tokens'], summary['over_limit']) == (2, 300, 1)
+    assert summary['cost'] == pytest.approx(0.03) and summary['latency_s'] is None
+    assert format_estimate(summary) == "输入约 300 tokens, 费用约 $0.0300, 预计耗时未知 (历史记录不足)"
@@ -0,0 +1,63 @@
+"""
+Folder watching with polling scans
+"""
+import os
+import threading
+import time
+
+from benchmarks.fixtures import make_pdf
+from watcher import FolderWatcher
+
+
+def start_watcher(directory, reported, **options):
+    watcher = FolderWatcher(str(directory), lambda path, first_seen: reported.append(path), settle_s=0.2,
+                            poll_s=0.05, use_watchdog=False, **options)
+    stop = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(stop,), daemon=True)
+    thread.start()
+    return watcher, stop, thread
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_existing_files_are_skipped_after_they_settle(tmp_path):
+    complete = make_pdf(str(tmp_path / 'complete.pdf'), 2)
+    # 开始监听时仍在写入的文件
+    partial = str(tmp_path / 'partial.pdf')
+    with open(make_pdf(str(tmp_path / 'source.pdf'), 2), 'rb') as f:
+        data = f.read()
+    os.remove(tmp_path / 'source.pdf')
+    with open(partial, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    reported = []
+
+    watcher, stop, thread = start_watcher(tmp_path, reported, skip_existing=True)
+    time.sleep(0.1)
+    with open(partial, 'ab') as f:
+        f.write(data[len(data) // 2:])
+    wait_for(lambda: partial in watcher._seen and complete in watcher._seen)
+    new = make_pdf(str(tmp_path / 'new.pdf'), 2)
+    wait_for(lambda: reported)
+    stop.set()
+    thread.join()
+
+    assert reported == [new]
+
+
+def test_removed_files_are_forgotten(tmp_path):
+    reported = []
+    watcher, stop, thread = start_watcher(tmp_path, reported)
+    paths = [make_pdf(str(tmp_path / f'paper{number}.pdf'), 2, seed=number) for number in range(3)]
+    wait_for(lambda: len(reported) == 3)
+    for path in paths:
+        os.remove(path)
+    wait_for(lambda: not watcher._seen)
+    stop.set()
+    thread.join()
+
+    assert sorted(reported) == sorted(paths)
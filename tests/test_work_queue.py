@@ -0,0 +1,164 @@
+"""
+Work queue semantics for both backends, and several worker processes sharing one queue
+
+The Redis backend is tested against TEST_REDIS_URL when it is set, otherwise against
+fakeredis in this process (the multi-process tests then only run on SQLite).
+"""
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+
+import pytest
+
+from benchmarks.fixtures import make_pdf
+from fake_api import FakeAPIServer
+from pipeline import run_worker
+from work_queue import open_queue, STATUS_DONE, STATUS_FAILED, STATUS_LEASED, STATUS_QUEUED
+
+REDIS_URL = os.getenv('TEST_REDIS_URL')
+MODEL = 'kimi-k2-thinking'
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def queue_spec(request, tmp_path, monkeypatch):
+    """(队列 URL, 队列名, 是否可供其他进程使用)"""
+    if request.param == 'sqlite':
+        yield f"sqlite:///{tmp_path / 'queue.sqlite3'}", 'pipeline', True
+        return
+    redis = pytest.importorskip('redis')
+    name = f"test-{uuid.uuid4().hex}"
+    if REDIS_URL:
+        yield REDIS_URL, name, True
+        client = redis.Redis.from_url(REDIS_URL)
+        client.delete(*client.keys(f"{{{name}}}:*") or [f"{{{name}}}:queued"])
+        return
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, 'from_url', lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    yield 'redis://fake', name, False
+
+
+def make_payload(pdf):
+    return {'pdf': pdf, 'prompt': "Summarize the paper.", 'template': 'test', 'model': MODEL,
+            'image_model': 'nano-banana'}
+
+
+def test_expired_lease_is_delivered_again(queue_spec):
+    queue = open_queue(*queue_spec[:2])
+    task_id = queue.put({'pdf': 'a.pdf'})
+
+    first = queue.lease('worker-1', lease_s=0.2)
+    assert first['id'] == task_id and first['attempts'] == 1
+    assert queue.lease('worker-2', lease_s=0.2) is None
+    time.sleep(0.3)
+    second = queue.lease('worker-2', lease_s=30)
+
+    assert second['id'] == task_id and second['attempts'] == 2
+    # 过期的租约不能再续约或提交
+    assert not queue.heartbeat(first)
+    assert not queue.complete(first, {'image_path': 'stale.png'})
+    assert queue.heartbeat(second)
+    assert queue.complete(second, {'image_path': 'a.png'})
+    assert queue.stats() == {STATUS_QUEUED: 0, STATUS_LEASED: 0, STATUS_DONE: 1, STATUS_FAILED: 0}
+    [result] = queue.results()
+    assert (result['status'], result['attempts'], result['worker'], result['result']) == \
+        (STATUS_DONE, 2, 'worker-2', {'image_path': 'a.png'})
+    queue.close()
+
+
+def test_failed_task_is_retried_until_max_attempts(queue_spec):
+    queue = open_queue(*queue_spec[:2])
+    queue.put({'pdf': 'a.pdf'})
+
+    for attempt in range(1, queue.max_attempts + 1):
+        task = queue.lease('worker', lease_s=30)
+        assert task['attempts'] == attempt
+        assert queue.fail(task, "HTTP 500")
+
+    assert queue.lease('worker', lease_s=30) is None
+    [result] = queue.results()
+    assert (result['status'], result['error']) == (STATUS_FAILED, "HTTP 500")
+    queue.close()
+
+
+def test_worker_logs_task_progress(queue_spec, tmp_path):
+    queue = open_queue(*queue_spec[:2])
+    queue.put(make_payload(make_pdf(str(tmp_path / 'paper.pdf'), 3)))
+    lines = []
+
+    with FakeAPIServer() as server:
+        records = run_worker(queue, api_key='test', base_url=server.base_url, worker_id='w', poll_s=0.05,
+                             exit_when_empty=True, output_dir=str(tmp_path / 'output'), log=lines.append)
+
+    assert 'error' not in records[0]
+    # 除开始和完成两行外，还有 process_task 各阶段的进度
+    assert len(lines) > 2 and all(line.startswith('[w] ') for line in lines)
+    queue.close()
+
+
+def worker_process(url, name, base_url, output_dir, lease_s):
+    queue = open_queue(url, name)
+    run_worker(queue, api_key='test', base_url=base_url, lease_s=lease_s, poll_s=0.05, exit_when_empty=True,
+               output_dir=output_dir)
+    queue.close()
+
+
+def start_worker(queue_spec, server, tmp_path, lease_s=30):
+    process = multiprocessing.get_context('spawn').Process(
+        target=worker_process, args=(queue_spec[0], queue_spec[1], server.base_url, str(tmp_path / 'output'), lease_s)
+    )
+    process.start()
+    return process
+
+
+def llm_requests(server):
+    return sum(count for model, count in server.model_requests.items() if not server.is_image_model(model))
+
+
+def test_each_task_processed_once_by_several_processes(queue_spec, tmp_path):
+    if not queue_spec[2]:
+        pytest.skip("fakeredis 不能在进程之间共享，设置 TEST_REDIS_URL 后测试")
+    queue = open_queue(*queue_spec[:2])
+    pdf = make_pdf(str(tmp_path / 'paper.pdf'), 3)
+    task_ids = {queue.put(make_payload(pdf)) for _ in range(12)}
+
+    with FakeAPIServer(latency=0.1) as server:
+        workers = [start_worker(queue_spec, server, tmp_path) for _ in range(4)]
+        for process in workers:
+            process.join(120)
+            assert process.exitcode == 0
+
+        results = queue.results()
+        assert {result['id'] for result in results} == task_ids
+        assert all(result['status'] == STATUS_DONE and result['attempts'] == 1 for result in results)
+        # 没有任务被两个 worker 同时处理
+        assert llm_requests(server) == len(task_ids)
+    queue.close()
+
+
+def test_lease_of_killed_worker_is_reclaimed(queue_spec, tmp_path):
+    if not queue_spec[2]:
+        pytest.skip("fakeredis 不能在进程之间共享，设置 TEST_REDIS_URL 后测试")
+    queue = open_queue(*queue_spec[:2])
+    task_id = queue.put(make_payload(make_pdf(str(tmp_path / 'paper.pdf'), 3)))
+
+    with FakeAPIServer(latency=1.0, image_latency=0.0) as server:
+        killed = start_worker(queue_spec, server, tmp_path, lease_s=1.0)
+        deadline = time.monotonic() + 60
+        while queue.stats()[STATUS_LEASED] == 0:
+            assert time.monotonic() < deadline and killed.is_alive()
+            time.sleep(0.05)
+        killed.kill()
+        killed.join()
+
+        survivor = start_worker(queue_spec, server, tmp_path, lease_s=1.0)
+        survivor.join(120)
+        assert survivor.exitcode == 0
+
+    [result] = queue.results()
+    assert (result['id'], result['status'], result['attempts']) == (task_id, STATUS_DONE, 2)
+    assert result['worker'] == f"{socket.gethostname()}:{survivor.pid}"
+    queue.close()
@@ -0,0 +1,239 @@
+"""
+Token Estimator Module
+Counts the tokens of a request locally and estimates its cost and latency before sending it
+"""
+import statistics
+import threading
+
+from llm_client import build_messages, message_text, default_model
+from config import (
+    NANO_BANANA_MODEL, MODEL_CONTEXT_LIMITS, DEFAULT_CONTEXT_LIMIT,
+    MODEL_PRICING, IMAGE_PRICING
+)
+
+# 没有 tiktoken 时的估算：英文约 4 个字符一个 token，中日韩文字约一个字一个 token
+CHARS_PER_TOKEN = 4
+# 没有历史记录时假设的分析模型输出长度
+DEFAULT_OUTPUT_TOKENS = 1500
+# 拟合耗时至少需要的历史记录数
+MIN_SAMPLES = 3
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """第一次使用时加载 tiktoken 编码，未安装或加载失败时返回 None"""
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            _encoding_loaded = True
+            try:
+                import tiktoken  # 可选依赖，导入和加载词表都比较慢
+                _encoding = tiktoken.get_encoding('o200k_base')
+            except Exception:
+                _encoding = None
+    return _encoding
+
+
+def _is_cjk(char):
+    code = ord(char)
+    return (0x3040 <= code <= 0x30ff or 0x3400 <= code <= 0x4dbf or 0x4e00 <= code <= 0x9fff
+            or 0xac00 <= code <= 0xd7af or 0xf900 <= code <= 0xfaff or 0xff00 <= code <= 0xffef)
+
+
+def heuristic_token_count(text):
+    """
+    Approximate token count without a tokenizer
+
+    Args:
+        text (str): Text to count
+
+    Returns:
+        int: Estimated number of tokens
+    """
+    cjk = sum(1 for char in text if _is_cjk(char))
+    other = len(text) - cjk
+    return cjk + -(-other // CHARS_PER_TOKEN)
+
+
+def count_tokens(text):
+    """
+    Count tokens with tiktoken if it is installed, otherwise estimate them
+
+    The analysis models use their own tokenizers, so even the tiktoken count is an
+    approximation; it is usually within about 10-20% for English text.
+
+    Args:
+        text (str): Text to count
+
+    Returns:
+        tuple: (number of tokens, whether tiktoken was used)
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=())), True
+    return heuristic_token_count(text), False
+
+
+def context_limit(model_name):
+    """返回模型的上下文长度 (tokens)"""
+    return MODEL_CONTEXT_LIMITS.get(model_name, DEFAULT_CONTEXT_LIMIT)
+
+
+def fit_latency(samples):
+    """
+    Fit duration = base + per_char * input_chars to recorded runs
+
+    Args:
+        samples (list): (input_chars, duration_s) pairs
+
+    Returns:
+        tuple: (base seconds, seconds per input character), or None without enough history
+    """
+    if len(samples) < MIN_SAMPLES:
+        return None
+    xs = [x for x, _ in samples]
+    ys = [y for _, y in samples]
+    mean_x = statistics.fmean(xs)
+    mean_y = statistics.fmean(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x > 0:
+        per_char = sum((x - mean_x) * (y - mean_y) for x, y in samples) / var_x
+        if per_char >= 0:
+            return max(0.0, mean_y - per_char * mean_x), per_char
+    # 输入长度都差不多或拟合出负斜率时，按每字符耗时的中位数估算
+    rates = [y / x for x, y in samples if x > 0]
+    return 0.0, statistics.median(rates) if rates else 0.0
+
+
+def load_history(store, model_name=None, nanobanana_model=None, limit=500):
+    """
+    Summarize recorded runs of the analysis and image models
+
+    Args:
+        store (JobStore): Job store with earlier runs, None returns an empty history
+        model_name (str): Name of the analysis model
+        nanobanana_model (str): Name of the image model
+        limit (int): Number of recent runs looked at per stage
+
+    Returns:
+        dict: llm_fit, llm_samples, output_tokens, image_s and image_samples
+    """
+    model_name = default_model(model_name)
+    nanobanana_model = nanobanana_model or NANO_BANANA_MODEL
+    history = {'llm_fit': None, 'llm_samples': 0, 'output_tokens': None, 'image_s': None, 'image_samples': 0}
+    if store is None:
+        return history
+
+    llm_runs = [
+        run for run in store.stage_history('llm', limit)
+        if run['meta'].get('model') == model_name and run['meta'].get('input_chars')
+    ]
+    history['llm_samples'] = len(llm_runs)
+    history['llm_fit'] = fit_latency([(run['meta']['input_chars'], run['duration_s']) for run in llm_runs])
+    if llm_runs:
+        history['output_tokens'] = int(statistics.median(
+            -(-run['output_chars'] // CHARS_PER_TOKEN) for run in llm_runs
+        ))
+
+    image_runs = [run['duration_s'] for run in store.stage_history('image', limit)
+                  if run['meta'].get('model') == nanobanana_model]
+    history['image_samples'] = len(image_runs)
+    if image_runs:
+        history['image_s'] = statistics.median(image_runs)
+    return history
+
+
+def estimate_request(pdf_content, prompt, model_name=None, nanobanana_model=None, history=None):
+    """
+    Estimate tokens, cost and latency of processing one PDF
+
+    Args:
+        pdf_content (str): Extracted PDF text
+        prompt (str): Prompt sent together with the PDF text
+        model_name (str): Name of the analysis model
+        nanobanana_model (str): Name of the image model
+        history (dict): Result of load_history, None estimates without latency
+
+    Returns:
+        dict: input_tokens, exact, context_limit, over_limit, output_tokens, cost (None if the
+        model has no price) and latency_s (None without history)
+    """
+    model_name = default_model(model_name)
+    nanobanana_model = nanobanana_model or NANO_BANANA_MODEL
+    history = history or {}
+    full_prompt = message_text(build_messages(pdf_content, prompt, cache_hints=False))
+    input_tokens, exact = count_tokens(full_prompt)
+    limit = context_limit(model_name)
+    output_tokens = history.get('output_tokens') or DEFAULT_OUTPUT_TOKENS
+
+    cost = None
+    if model_name in MODEL_PRICING:
+        input_price, output_price = MODEL_PRICING[model_name]
+        cost = (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+        cost += IMAGE_PRICING.get(nanobanana_model, 0.0)
+
+    latency_s = None
+    if history.get('llm_fit') is not None:
+        base, per_char = history['llm_fit']
+        latency_s = base + per_char * len(full_prompt) + (history.get('image_s') or 0.0)
+
+    return {
+        'input_tokens': input_tokens,
+        'exact': exact,
+        'context_limit': limit,
+        'over_limit': input_tokens > limit,
+        'output_tokens': output_tokens,
+        'cost': cost,
+        'latency_s': latency_s,
+    }
+
+
+def summarize_estimates(estimates):
+    """
+    Add up the estimates of several PDFs
+
+    Args:
+        estimates (list): Results of estimate_request
+
+    Returns:
+        dict: count, input_tokens, exact, over_limit (count), cost and latency_s totals;
+        cost and latency_s are None if any estimate lacks them
+    """
+    def total(field):
+        values = [estimate[field] for estimate in estimates]
+        return None if not values or any(value is None for value in values) else sum(values)
+
+    return {
+        'count': len(estimates),
+        'input_tokens': sum(estimate['input_tokens'] for estimate in estimates),
+        'exact': all(estimate['exact'] for estimate in estimates),
+        'over_limit': sum(1 for estimate in estimates if estimate['over_limit']),
+        'cost': total('cost'),
+        'latency_s': total('latency_s'),
+    }
+
+
+def format_estimate(estimate, latency=True):
+    """
+    One-line description of an estimate or a summary of estimates
+
+    Args:
+        estimate (dict): Result of estimate_request or summarize_estimates
+        latency (bool): Include the expected latency
+
+    Returns:
+        str: Text such as "输入约 12,345 tokens, 费用约 $0.0123, 预计耗时 45s"
+    """
+    prefix = "输入" if estimate['exact'] else "输入约"
+    parts = [f"{prefix} {estimate['input_tokens']:,} tokens"]
+    if 'context_limit' in estimate:
+        parts[0] += f" / 上限 {estimate['context_limit']:,}"
+    parts.append(f"费用约 ${estimate['cost']:.4f}" if estimate['cost'] is not None else "费用未知 (未配置价格)")
+    if latency and estimate['latency_s'] is not None:
+        parts.append(f"预计耗时 {estimate['latency_s']:.0f}s")
+    elif latency:
+        parts.append("预计耗时未知 (历史记录不足)")
+    return ", ".join(parts)
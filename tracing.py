@@ -0,0 +1,181 @@
+"""
+Tracing Module
+Lightweight timing spans for pipeline stages, exportable as Chrome trace-event JSON
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 当前生效的 Tracer；未设置时 span() 不做任何记录
+_current_tracer = contextvars.ContextVar('current_tracer', default=None)
+
+
+class Tracer:
+    def __init__(self, name="pipeline"):
+        """
+        Collect timing spans from any thread
+
+        Args:
+            name (str): Process name shown in the trace viewer
+        """
+        self.name = name
+        self.spans = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, **args):
+        """
+        Time the enclosed block
+
+        Args:
+            name (str): Span name, e.g. "llm.request"
+            **args: Extra values shown with the span (sizes, model names...)
+        """
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add_span(name, start, time.perf_counter() - start, **args)
+
+    def add_span(self, name, start, duration, **args):
+        """
+        Record a span measured elsewhere (e.g. in a worker process)
+
+        Args:
+            name (str): Span name
+            start (float): time.perf_counter() value at the start of the span
+            duration (float): Duration in seconds
+            **args: Extra values shown with the span
+        """
+        with self._lock:
+            self.spans.append({
+                'name': name,
+                'start': start - self._origin,
+                'duration': duration,
+                'tid': threading.get_ident(),
+                'args': args
+            })
+
+    def to_chrome_trace(self):
+        """
+        Convert the spans to the Chrome trace-event format (chrome://tracing, Perfetto)
+
+        Returns:
+            dict: Trace document with complete ("X") events in microseconds
+        """
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': self.name}}]
+        for span in spans:
+            events.append({
+                'name': span['name'],
+                'cat': span['name'].split('.')[0],
+                'ph': 'X',
+                'ts': round(span['start'] * 1e6, 1),
+                'dur': round(span['duration'] * 1e6, 1),
+                'pid': pid,
+                'tid': span['tid'],
+                'args': {key: str(value) for key, value in span['args'].items()}
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        """
+        Write the spans as Chrome trace-event JSON
+
+        Args:
+            path (str): Destination file
+
+        Returns:
+            str: The path written
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f, ensure_ascii=False)
+        return path
+
+    def summary(self):
+        """
+        Aggregate the spans by name
+
+        Returns:
+            list: (name, count, total seconds, max seconds), slowest total first
+        """
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                count, total, longest = totals.get(span['name'], (0, 0.0, 0.0))
+                totals[span['name']] = (count + 1, total + span['duration'], max(longest, span['duration']))
+        rows = [(name, count, total, longest) for name, (count, total, longest) in totals.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def format_summary(self):
+        """
+        Human readable version of summary()
+
+        Returns:
+            list: One line per span name
+        """
+        return [
+            f"{name:<18} x{count:<4} 合计 {total * 1000:9.1f} ms   最长 {longest * 1000:9.1f} ms"
+            for name, count, total, longest in self.summary()
+        ]
+
+
+@contextmanager
+def use_tracer(tracer):
+    """
+    Make a tracer current for the enclosed block (and for functions wrapped with bind_context)
+
+    Args:
+        tracer (Tracer): Tracer receiving the spans, or None to disable tracing
+    """
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
+
+
+def get_tracer():
+    """返回当前生效的 Tracer，没有则返回 None"""
+    return _current_tracer.get()
+
+
+@contextmanager
+def span(name, **args):
+    """
+    Time the enclosed block with the current tracer; does nothing when tracing is off
+
+    Args:
+        name (str): Span name
+        **args: Extra values shown with the span
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield args
+        return
+    with tracer.span(name, **args) as span_args:
+        yield span_args
+
+
+def bind_context(func):
+    """
+    Bind the caller's tracer to a function submitted to a thread pool
+
+    Args:
+        func (callable): Function to run in another thread
+
+    Returns:
+        callable: Wrapper running func in a copy of the current context
+    """
+    context = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,268 @@
+"""
+Watcher Module
+Watches a folder and runs the pipeline on every new PDF once it has been completely written
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_client import LLMClient
+from job_store import hash_file
+from pipeline import find_pdfs, process_task
+from tracing import span, bind_context
+from log_setup import log_context
+
+
+def _noop_log(message):
+    pass
+
+
+def looks_complete(pdf_file_path):
+    """PDF 文件以 %%EOF 结尾，写到一半的文件通常还没有这个标记"""
+    try:
+        with open(pdf_file_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 1024))
+            return b'%%EOF' in f.read()
+    except OSError:
+        return False
+
+
+class FolderWatcher:
+    def __init__(self, directory, on_ready, recursive=False, settle_s=2.0, poll_s=1.0, rescan_s=60.0,
+                 use_watchdog=True, skip_existing=False, log=None):
+        """
+        Report PDFs in a folder once their size and modification time stop changing
+
+        File system events come from watchdog (inotify/FSEvents/...) when it is installed;
+        otherwise, or with use_watchdog=False, the folder is scanned every poll_s seconds.
+
+        Args:
+            directory (str): Folder to watch
+            on_ready (callable): Called as on_ready(path, first_seen) from the watcher thread,
+                first_seen is the time.time() the file was first noticed
+            recursive (bool): Whether to watch subdirectories
+            settle_s (float): Seconds a file must stay unchanged before it is reported
+            poll_s (float): Seconds between checks of files that are still being written
+            rescan_s (float): Seconds between full scans when watchdog events are used, catching missed events
+            use_watchdog (bool): Use watchdog events if the package is installed
+            skip_existing (bool): Ignore PDFs already in the folder when watching starts
+            log (callable): Callback receiving progress messages
+        """
+        self.directory = directory
+        self.on_ready = on_ready
+        self.recursive = recursive
+        self.settle_s = settle_s
+        self.poll_s = poll_s
+        self.rescan_s = rescan_s
+        self.use_watchdog = use_watchdog
+        self.skip_existing = skip_existing
+        self.log = log or _noop_log
+        # 文件停止变化后仍没有 %%EOF 时最多再等待的时间，之后交给提取阶段报告错误
+        self.max_wait_s = max(30.0, settle_s * 10)
+        self._pending = {}  # path -> [size, mtime_ns, last_change, first_seen, skip]
+        # 已报告 (或按 skip_existing 跳过) 的文件；扫描时去掉已不在文件夹中的文件，不会无限增长
+        self._seen = {}  # path -> (size, mtime_ns)
+        self._events = queue.Queue()
+
+    def _start_observer(self):
+        """启动 watchdog 监听，未安装时返回 None"""
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+
+        events = self._events
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                for path in (event.src_path, getattr(event, 'dest_path', '')):
+                    if path and str(path).lower().endswith('.pdf'):
+                        events.put(os.fspath(path))
+
+        observer = Observer()
+        observer.schedule(Handler(), self.directory, recursive=self.recursive)
+        observer.start()
+        return observer
+
+    def _track(self, path, now, skip=False):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        if self._seen.get(path) == (stat.st_size, stat.st_mtime_ns) or path in self._pending:
+            return
+        self._pending[path] = [stat.st_size, stat.st_mtime_ns, now, now, skip]
+
+    def _scan(self, now, skip=False):
+        paths = find_pdfs(self.directory, recursive=self.recursive)
+        for path in paths:
+            self._track(path, now, skip)
+        # 删除或移走的文件不再记录；之后再放入同名文件时按新文件处理
+        listed = set(paths)
+        for path in [path for path in self._seen if path not in listed]:
+            del self._seen[path]
+
+    def _check_pending(self, now):
+        """报告已经停止变化的文件"""
+        for path, entry in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._pending[path]  # 已被删除或移走
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (entry[0], entry[1]):
+                entry[0], entry[1], entry[2] = stat.st_size, stat.st_mtime_ns, now
+                continue
+            unchanged_s = now - entry[2]
+            if stat.st_size == 0 or unchanged_s < self.settle_s:
+                continue
+            if not looks_complete(path) and unchanged_s < self.max_wait_s:
+                continue
+            del self._pending[path]
+            self._seen[path] = (stat.st_size, stat.st_mtime_ns)
+            if entry[4]:
+                continue  # 开始监听时已存在的文件，写完后记为已处理
+            first_seen = time.time() - (time.monotonic() - entry[3])
+            try:
+                self.on_ready(path, first_seen)
+            except Exception as e:
+                self.log(f"✗ {path}: {str(e)}")
+
+    def run(self, stop_event=None):
+        """
+        Watch until stop_event is set
+
+        Args:
+            stop_event (threading.Event): Set to stop watching
+        """
+        stop_event = stop_event or threading.Event()
+        if self.skip_existing:
+            # 已存在的文件可能仍在写入，与新文件一样等它停止变化，再记为已处理
+            self._scan(time.monotonic(), skip=True)
+
+        observer = self._start_observer() if self.use_watchdog else None
+        if observer is not None:
+            self.log(f"正在监听文件夹 (watchdog): {self.directory}")
+        else:
+            self.log(f"正在监听文件夹 (每 {self.poll_s:g}s 扫描一次): {self.directory}")
+
+        last_scan = None
+        try:
+            while not stop_event.is_set():
+                now = time.monotonic()
+                if observer is None or last_scan is None or now - last_scan >= self.rescan_s:
+                    self._scan(now)
+                    last_scan = now
+                self._check_pending(now)
+
+                if observer is None:
+                    stop_event.wait(self.poll_s)
+                    continue
+                # 等待下一个事件；超时后回到循环开头检查正在写入的文件
+                try:
+                    path = self._events.get(timeout=self.poll_s)
+                except queue.Empty:
+                    continue
+                now = time.monotonic()
+                while True:
+                    self._track(path, now)
+                    try:
+                        path = self._events.get_nowait()
+                    except queue.Empty:
+                        break
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+
+def run_watch(directory, prompt, template_name=None, api_key=None, base_url=None, model_name=None,
+              nanobanana_model=None, jobs=2, recursive=False, settle_s=2.0, poll_s=1.0, use_watchdog=True,
+              skip_existing=False, output_dir=None, log=None, store=None, stop_event=None):
+    """
+    Process every PDF that appears in a folder until stopped
+
+    Files with the same content as one already handled are skipped; with a job store,
+    PDFs finished before a restart are not sent again.
+
+    Args:
+        directory (str): Folder to watch
+        prompt (str): Prompt sent together with each PDF's text
+        template_name (str): Label used for the image filename and manifest
+        api_key (str): API key for the service
+        base_url (str): Base URL for the API
+        model_name (str): Name of the analysis model
+        nanobanana_model (str): Name of the image model
+        jobs (int): Maximum number of PDFs processed at once
+        recursive (bool): Whether to watch subdirectories
+        settle_s (float): Seconds a file must stay unchanged before it is processed
+        poll_s (float): Seconds between checks of files that are still being written
+        use_watchdog (bool): Use watchdog events if the package is installed
+        skip_existing (bool): Ignore PDFs already in the folder when watching starts
+        output_dir (str): Parent directory of the job output directories, defaults to OUTPUT_DIR
+        log (callable): Callback receiving progress messages
+        store (JobStore): Job store used to skip stages finished by earlier runs
+        stop_event (threading.Event): Set to stop watching; running jobs are finished first
+
+    Returns:
+        list: One record per processed PDF with doc_hash, latency_s and image_path or error
+    """
+    log = log or _noop_log
+    client = LLMClient(api_key=api_key, base_url=base_url)
+    label = template_name or "custom"
+    hashes = set()  # 已处理或正在处理的文件内容
+    hashes_lock = threading.Lock()
+    records = []
+
+    def process(record, first_seen):
+        pdf = record['pdf']
+        try:
+            with span("paper", pdf=os.path.basename(pdf)), log_context(job_id=record['doc_hash'][:12]):
+                result = process_task(client, {
+                    'pdf': pdf,
+                    'doc_hash': record['doc_hash'],
+                    'prompt': prompt,
+                    'template': label,
+                    'model': model_name,
+                    'image_model': nanobanana_model
+                }, store, output_dir)
+            record['image_path'] = result['image_path']
+        except Exception as e:
+            record['error'] = str(e)
+            with hashes_lock:
+                hashes.discard(record['doc_hash'])  # 失败后重新放入同一文件时再试
+        # 从发现文件到生成图像的时间
+        record['latency_s'] = time.time() - first_seen
+        if 'error' in record:
+            log(f"✗ {os.path.basename(pdf)}: {record['error']}")
+        else:
+            log(f"✓ {os.path.basename(pdf)} -> {record['image_path']} ({record['latency_s']:.1f}s)")
+        records.append(record)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        def on_ready(path, first_seen):
+            doc_hash = hash_file(path)
+            with hashes_lock:
+                if doc_hash in hashes:
+                    log(f"↺ {os.path.basename(path)}: 内容与已处理的文件相同，跳过")
+                    return
+                hashes.add(doc_hash)
+            log(f"发现新文件: {os.path.basename(path)}")
+            executor.submit(bind_context(process), {'pdf': path, 'doc_hash': doc_hash}, first_seen)
+
+        watcher = FolderWatcher(
+            directory, on_ready, recursive=recursive, settle_s=settle_s, poll_s=poll_s,
+            use_watchdog=use_watchdog, skip_existing=skip_existing, log=log
+        )
+        try:
+            watcher.run(stop_event)
+        except KeyboardInterrupt:
+            log("停止监听，等待正在处理的任务完成...")
+            raise
+    return records
@@ -0,0 +1,415 @@
+"""
+Work Queue Module
+Shared queue of pipeline jobs for running workers on several processes or machines.
+A worker leases a task, renews the lease with heartbeats while it runs and acknowledges
+it at the end; a task whose lease expires (crashed or stuck worker) is delivered again.
+
+Backends:
+    sqlite:///path/to/queue.sqlite3   本机上的 SQLite 文件，供同一台机器上的多个进程使用
+    redis://host:6379/0               Redis 兼容服务 (需要 redis 包)，用于多机部署
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import WORK_QUEUE_URL
+
+STATUS_QUEUED = 'queued'
+STATUS_LEASED = 'leased'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+def open_queue(url=None, name='pipeline'):
+    """
+    Open a work queue from a URL
+
+    Args:
+        url (str): sqlite:///path, redis://..., or a plain SQLite file path; defaults to WORK_QUEUE_URL
+        name (str): Queue name, lets several queues share one Redis database
+
+    Returns:
+        SqliteWorkQueue or RedisWorkQueue: The opened queue
+    """
+    url = url or WORK_QUEUE_URL
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisWorkQueue(url, name)
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    return SqliteWorkQueue(url)
+
+
+class SqliteWorkQueue:
+    def __init__(self, path, max_attempts=3):
+        """
+        Work queue stored in a SQLite file, safe to share between processes on one machine
+
+        Single-host only: SQLite locking is unreliable on network filesystems (NFS, SMB), so
+        workers on several machines must use the Redis backend instead of a shared file.
+
+        Args:
+            path (str): Path to the database file
+            max_attempts (int): Deliveries of a task before it is marked failed
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # 自行管理事务，领取任务时用 BEGIN IMMEDIATE 加写锁
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_token TEXT,
+                worker TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, created_at)")
+
+    def put(self, payload):
+        """
+        Add a task to the queue
+
+        Args:
+            payload (dict): JSON-serializable task description
+
+        Returns:
+            str: Task ID
+        """
+        task_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO tasks (id, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (task_id, json.dumps(payload, ensure_ascii=False), STATUS_QUEUED, now, now)
+            )
+        return task_id
+
+    def lease(self, worker_id, lease_s=60):
+        """
+        Take the oldest available task, including tasks whose lease has expired
+
+        Args:
+            worker_id (str): Name of the worker, recorded for status output
+            lease_s (float): Seconds until the task is delivered again unless renewed
+
+        Returns:
+            dict: id, payload, attempts and lease token, or None if nothing is available
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 租约过期且已达最大尝试次数的任务不再投递
+                self._conn.execute(
+                    "UPDATE tasks SET status = ?, error = COALESCE(error, ?), updated_at = ? "
+                    "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                    (STATUS_FAILED, "租约过期次数过多", now, STATUS_LEASED, now, self.max_attempts)
+                )
+                row = self._conn.execute(
+                    "SELECT id, payload, attempts FROM tasks "
+                    "WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (STATUS_QUEUED, STATUS_LEASED, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE tasks SET status = ?, attempts = attempts + 1, lease_token = ?, worker = ?, "
+                    "lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (STATUS_LEASED, token, worker_id, now + lease_s, now, row[0])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {'id': row[0], 'payload': json.loads(row[1]), 'attempts': row[2] + 1, 'token': token}
+
+    def _update_leased(self, task, sql, params):
+        # 只有仍持有租约的 worker 才能修改任务，过期后被重新投递的任务归新的 worker
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE tasks SET {sql}, updated_at = ? WHERE id = ? AND lease_token = ? AND status = ?",
+                (*params, time.time(), task['id'], task['token'], STATUS_LEASED)
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, task, lease_s=60):
+        """
+        Extend the lease of a running task
+
+        Args:
+            task (dict): Task returned by lease
+            lease_s (float): New lease length from now
+
+        Returns:
+            bool: False if the lease was lost and the task may be running elsewhere
+        """
+        return self._update_leased(task, "lease_expires = ?", (time.time() + lease_s,))
+
+    def complete(self, task, result):
+        """
+        Acknowledge a finished task
+
+        Args:
+            task (dict): Task returned by lease
+            result (dict): JSON-serializable result
+
+        Returns:
+            bool: False if the lease was lost before completion
+        """
+        return self._update_leased(
+            task, "status = ?, result = ?, error = NULL", (STATUS_DONE, json.dumps(result, ensure_ascii=False))
+        )
+
+    def fail(self, task, error, retry=True):
+        """
+        Report a failed attempt; the task is queued again until max_attempts is reached
+
+        Args:
+            task (dict): Task returned by lease
+            error (str): Error message
+            retry (bool): Whether another attempt may succeed
+
+        Returns:
+            bool: False if the lease was lost
+        """
+        status = STATUS_QUEUED if retry and task['attempts'] < self.max_attempts else STATUS_FAILED
+        return self._update_leased(task, "status = ?, error = ?, lease_token = NULL", (status, str(error)))
+
+    def stats(self):
+        """
+        Count tasks by status
+
+        Returns:
+            dict: status -> number of tasks
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        counts = {status: 0 for status in (STATUS_QUEUED, STATUS_LEASED, STATUS_DONE, STATUS_FAILED)}
+        counts.update(dict(rows))
+        return counts
+
+    def results(self):
+        """
+        Finished and failed tasks
+
+        Returns:
+            list: Dicts with id, status, payload, attempts, worker, result and error
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, status, payload, attempts, worker, result, error FROM tasks "
+                "WHERE status IN (?, ?) ORDER BY updated_at",
+                (STATUS_DONE, STATUS_FAILED)
+            ).fetchall()
+        return [
+            {'id': row[0], 'status': row[1], 'payload': json.loads(row[2]), 'attempts': row[3], 'worker': row[4],
+             'result': json.loads(row[5]) if row[5] else None, 'error': row[6]}
+            for row in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Redis 脚本只能访问通过 KEYS 传入的键 (Redis Cluster 据此路由)，因此任务的各字段分别存放在
+# 以任务 ID 为字段的几个哈希中，而不是每个任务一个哈希。键名带相同的 hash tag，位于同一个槽位。
+_REDIS_KEY_NAMES = ('queued', 'leased', 'finished', 'payload', 'status', 'attempts', 'token', 'worker', 'result',
+                    'error', 'updated')
+
+# 领取任务：先回收租约过期的任务，再从队列头取一个任务并登记租约
+_REDIS_LEASE = """
+local now = tonumber(ARGV[1])
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('HSET', KEYS[11], id, ARGV[1])
+    if (tonumber(redis.call('HGET', KEYS[6], id)) or 0) >= tonumber(ARGV[5]) then
+        redis.call('HSET', KEYS[5], id, 'failed')
+        redis.call('HSET', KEYS[10], id, '租约过期次数过多')
+        redis.call('RPUSH', KEYS[3], id)
+    else
+        redis.call('HSET', KEYS[5], id, 'queued')
+        redis.call('RPUSH', KEYS[1], id)
+    end
+end
+local id = redis.call('LPOP', KEYS[1])
+if not id then
+    return nil
+end
+local attempts = redis.call('HINCRBY', KEYS[6], id, 1)
+redis.call('HSET', KEYS[5], id, 'leased')
+redis.call('HSET', KEYS[7], id, ARGV[2])
+redis.call('HSET', KEYS[8], id, ARGV[3])
+redis.call('HSET', KEYS[11], id, ARGV[1])
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[4]), id)
+return {id, redis.call('HGET', KEYS[4], id), attempts}
+"""
+
+# 修改仍持有租约的任务：ARGV[3] 为 heartbeat / done / queued / failed
+_REDIS_UPDATE = """
+local id = ARGV[1]
+if redis.call('HGET', KEYS[7], id) ~= ARGV[2] or redis.call('HGET', KEYS[5], id) ~= 'leased' then
+    return 0
+end
+if ARGV[3] == 'heartbeat' then
+    redis.call('ZADD', KEYS[2], tonumber(ARGV[4]), id)
+    return 1
+end
+redis.call('ZREM', KEYS[2], id)
+redis.call('HSET', KEYS[5], id, ARGV[3])
+redis.call('HSET', KEYS[11], id, ARGV[4])
+redis.call('HDEL', KEYS[7], id)
+if ARGV[3] == 'done' then
+    redis.call('HSET', KEYS[9], id, ARGV[5])
+    redis.call('HDEL', KEYS[10], id)
+    redis.call('RPUSH', KEYS[3], id)
+elseif ARGV[3] == 'queued' then
+    redis.call('HSET', KEYS[10], id, ARGV[5])
+    redis.call('RPUSH', KEYS[1], id)
+else
+    redis.call('HSET', KEYS[10], id, ARGV[5])
+    redis.call('RPUSH', KEYS[3], id)
+end
+return 1
+"""
+
+
+class RedisWorkQueue:
+    def __init__(self, url, name='pipeline', max_attempts=3):
+        """
+        Work queue in a Redis-compatible server, shared by workers on any number of machines
+
+        Args:
+            url (str): Redis URL, e.g. redis://host:6379/0
+            name (str): Hash tag of the keys used by this queue
+            max_attempts (int): Deliveries of a task before it is marked failed
+        """
+        try:
+            import redis
+        except ImportError:
+            raise Exception("使用 Redis 队列需要安装 redis 包: pip install redis")
+
+        self.max_attempts = max_attempts
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._key = {kind: f"{{{name}}}:{kind}" for kind in _REDIS_KEY_NAMES}
+        self._keys = [self._key[kind] for kind in _REDIS_KEY_NAMES]
+        self._lease_script = self._redis.register_script(_REDIS_LEASE)
+        self._update_script = self._redis.register_script(_REDIS_UPDATE)
+
+    def put(self, payload):
+        """Add a task to the queue, see SqliteWorkQueue.put"""
+        task_id = uuid.uuid4().hex
+        pipe = self._redis.pipeline()
+        pipe.hset(self._key['payload'], task_id, json.dumps(payload, ensure_ascii=False))
+        pipe.hset(self._key['status'], task_id, STATUS_QUEUED)
+        pipe.hset(self._key['attempts'], task_id, 0)
+        pipe.hset(self._key['updated'], task_id, time.time())
+        pipe.rpush(self._key['queued'], task_id)
+        pipe.execute()
+        return task_id
+
+    def lease(self, worker_id, lease_s=60):
+        """Take the oldest available task, see SqliteWorkQueue.lease"""
+        token = uuid.uuid4().hex
+        row = self._lease_script(keys=self._keys, args=[time.time(), token, worker_id, lease_s, self.max_attempts])
+        if row is None:
+            return None
+        return {'id': row[0], 'payload': json.loads(row[1]), 'attempts': int(row[2]), 'token': token}
+
+    def _update_leased(self, task, action, value='', extra=''):
+        return self._update_script(keys=self._keys, args=[task['id'], task['token'], action, value, extra]) == 1
+
+    def heartbeat(self, task, lease_s=60):
+        """Extend the lease of a running task, see SqliteWorkQueue.heartbeat"""
+        return self._update_leased(task, 'heartbeat', time.time() + lease_s)
+
+    def complete(self, task, result):
+        """Acknowledge a finished task, see SqliteWorkQueue.complete"""
+        return self._update_leased(task, STATUS_DONE, time.time(), json.dumps(result, ensure_ascii=False))
+
+    def fail(self, task, error, retry=True):
+        """Report a failed attempt, see SqliteWorkQueue.fail"""
+        status = STATUS_QUEUED if retry and task['attempts'] < self.max_attempts else STATUS_FAILED
+        return self._update_leased(task, status, time.time(), str(error))
+
+    def stats(self):
+        """Count tasks by status, see SqliteWorkQueue.stats"""
+        counts = {status: 0 for status in (STATUS_QUEUED, STATUS_LEASED, STATUS_DONE, STATUS_FAILED)}
+        for status in self._redis.hvals(self._key['status']):
+            if status in counts:
+                counts[status] += 1
+        return counts
+
+    def results(self):
+        """Finished and failed tasks, see SqliteWorkQueue.results"""
+        task_ids = self._redis.lrange(self._key['finished'], 0, -1)
+        if not task_ids:
+            return []
+        fields = ('status', 'payload', 'attempts', 'worker', 'result', 'error')
+        pipe = self._redis.pipeline()
+        for field in fields:
+            pipe.hmget(self._key[field], task_ids)
+        columns = dict(zip(fields, pipe.execute()))
+        return [
+            {'id': task_id, 'status': columns['status'][i], 'payload': json.loads(columns['payload'][i]),
+             'attempts': int(columns['attempts'][i] or 0), 'worker': columns['worker'][i],
+             'result': json.loads(columns['result'][i]) if columns['result'][i] else None,
+             'error': columns['error'][i]}
+            for i, task_id in enumerate(task_ids)
+        ]
+
+    def close(self):
+        self._redis.close()
+
+
+class Heartbeat:
+    def __init__(self, queue, task, lease_s):
+        """
+        Renew a task's lease in the background while it is being processed
+
+        Args:
+            queue: Work queue the task came from
+            task (dict): Task returned by lease
+            lease_s (float): Lease length; renewed every third of it
+        """
+        self.queue = queue
+        self.task = task
+        self.lease_s = lease_s
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_s / 3):
+            try:
+                if not self.queue.heartbeat(self.task, self.lease_s):
+                    self.lost = True
+                    return
+            except Exception:
+                # 暂时无法连接队列时继续重试，租约到期前恢复即可
+                continue
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()